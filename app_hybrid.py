@@ -10,12 +10,16 @@ import os
 import time
 from datetime import datetime
 from dotenv import load_dotenv
-from src.data_processor import DataProcessor
-from src.embeddings import EmbeddingModel
+from src.embeddings import BackgroundEmbeddingModel
+from src.embedding_cache import EmbeddingCache
+from src.batching_encoder import MicroBatchEncoder
 from src.vector_store import VectorStore
+from src.index_manifest import IndexManifest, IndexModelMismatchError, sync_vector_store
 from src.chatbot import HealthcareChatbot
 from src.neo4j_client import Neo4jClient
 from src.hybrid_context import HybridContextBuilder
+from src.intent_classifier import IntentClassifier
+from src.local_intent_classifier import LocalIntentClassifier
 from src.date_tools import DateTools
 
 # Sayfa yapılandırması
@@ -28,6 +32,85 @@ st.set_page_config(
 # .env dosyasını yükle
 load_dotenv()
 
+def corpus_params_from_env() -> dict:
+    """
+    Index'e girmeden önceki corpus aşamalarının ayarları
+    
+    DEDUP_THRESHOLD=0: near-duplicate birleştirme yok, PASSAGE_MAX_TOKENS=0: cevaplar bölünmez
+    """
+    params = {}
+    dedup_threshold = float(os.getenv("DEDUP_THRESHOLD", "0"))
+    if dedup_threshold > 0:
+        params['dedup_threshold'] = dedup_threshold
+    max_tokens = int(os.getenv("PASSAGE_MAX_TOKENS", "0"))
+    if max_tokens > 0:
+        params['passage_max_tokens'] = max_tokens
+        params['passage_overlap'] = int(os.getenv("PASSAGE_OVERLAP", "32"))
+        if not 0 <= params['passage_overlap'] < max_tokens:
+            raise ValueError("PASSAGE_OVERLAP, 0 ile PASSAGE_MAX_TOKENS arasında olmalı")
+    return params
+
+def sync_or_build_index(embedding_model, data_path: str, vector_store_kwargs: dict, corpus_params: dict) -> VectorStore:
+    """
+    CSV'yi okuyup kayıtlı index'i senkronize eder, index yoksa sıfırdan kurar
+    
+    Embedding modelinin yüklenmesini bekler (boyut ve encode için).
+    """
+    from src.data_processor import DataProcessor
+    
+    data_processor = DataProcessor(data_path)
+    documents = data_processor.prepare_documents()
+    documents = data_processor.apply_corpus_params(documents, corpus_params, embedding_model.model_name)
+    
+    # Vector store (index tipi sadece ilk kurulumda kullanılır; kayıtlı index kendi tipini yükler)
+    vector_store = VectorStore(dimension=embedding_model.get_dimension(), **vector_store_kwargs)
+    
+    # Corpus ayarları (dedup / pasaj) değiştiyse doküman şeması da değişir: index sıfırdan kurulur.
+    # Manifest'siz eski index ham corpus ile kurulmuştur (corpus ayarı yok).
+    manifest = IndexManifest.load()
+    built_params = manifest.corpus_params if manifest is not None else {}
+    corpus_changed = built_params != corpus_params
+    
+    # Kaydedilmiş index var mı kontrol et
+    if not corpus_changed and vector_store.load():
+        # Manifest ile karşılaştır: sadece değişen satırları yeniden embed et
+        try:
+            sync = sync_vector_store(
+                vector_store, embedding_model, documents,
+                source_path=data_path, corpus_params=corpus_params
+            )
+        except IndexModelMismatchError as e:
+            st.error(f"❌ {e}")
+            st.stop()
+        
+        if sync['changed'] or sync['deleted']:
+            st.info(f"Knowledge base updated: {sync['changed']} changed, {sync['deleted']} removed")
+    else:
+        if corpus_changed:
+            st.info("Corpus settings changed: Rebuilding embeddings... (This may take a few minutes)")
+        else:
+            st.info("First time setup: Creating embeddings... (This may take a few minutes)")
+        
+        # Tüm dokümanlar için embedding oluştur
+        texts = [doc['text'] for doc in documents]
+        embeddings = embedding_model.encode(texts)
+        
+        # Vector store'a ekle ve kaydet
+        vector_store.add_documents(embeddings, documents)
+        vector_store.save()
+        IndexManifest.from_documents(
+            documents,
+            embedding_model.cache_namespace,
+            embedding_model.get_dimension(),
+            vector_store.config,
+            source_path=data_path,
+            corpus_params=corpus_params
+        ).save()
+        
+        st.success("✓ Embeddings created and saved!")
+    
+    return vector_store
+
 @st.cache_resource
 def initialize_system():
     """Sistemi başlatır (tek sefer çalışır)"""
@@ -38,6 +121,16 @@ def initialize_system():
         st.error("⚠️ .env dosyasında OPENAI_API_KEY tanımlı değil!")
         st.stop()
     
+    # Embedding model arka planda yüklenir (torch import + model yükleme en yavaş adım);
+    # PERSONAL sorular embedding gerektirmediği için model beklenmeden cevaplanır.
+    # Kalıcı cache: rebuild ve tekrar eden sorgular transformer'a gitmez
+    embedding_cache = EmbeddingCache(os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache.sqlite"))
+    embedding_model = BackgroundEmbeddingModel(
+        cache=embedding_cache,
+        backend=os.getenv("EMBEDDING_BACKEND", "torch"),
+        onnx_quantization=os.getenv("EMBEDDING_ONNX_QUANTIZATION", "avx2")
+    )
+    
     # Neo4j connection
     neo4j_uri = os.getenv("NEO4J_URI", "bolt://localhost:7687")
     neo4j_user = os.getenv("NEO4J_USER", "neo4j")
@@ -48,7 +141,13 @@ def initialize_system():
         st.stop()
     
     try:
-        neo4j_client = Neo4jClient(neo4j_uri, neo4j_user, neo4j_password)
+        neo4j_client = Neo4jClient(
+            neo4j_uri,
+            neo4j_user,
+            neo4j_password,
+            cache_ttl=float(os.getenv("NEO4J_CACHE_TTL", "300")),
+            query_timeout=float(os.getenv("NEO4J_QUERY_TIMEOUT", "5"))
+        )
         if not neo4j_client.verify_connection():
             st.error("❌ Neo4j bağlantısı kurulamadı!")
             st.stop()
@@ -58,35 +157,65 @@ def initialize_system():
         st.error(f"❌ Neo4j hatası: {e}")
         st.stop()
     
-    # Data processor
-    data_processor = DataProcessor()
-    documents = data_processor.prepare_documents()
+    # Hızlı yol: index + manifest güncel (aynı model, CSV değişmemiş) -> CSV hiç okunmaz
+    data_path = "data/medquad.csv"
+    vector_store_kwargs = {
+        'index_type': os.getenv("FAISS_INDEX_TYPE", "flat"),
+        'storage': os.getenv("FAISS_STORAGE", "float"),
+        'rerank_factor': int(os.getenv("FAISS_RERANK_FACTOR", "0"))
+    }
     
-    # Embedding model
-    embedding_model = EmbeddingModel()
+    corpus_params = corpus_params_from_env()
     
-    # Vector store
-    vector_store = VectorStore(dimension=embedding_model.get_dimension())
+    vector_store = None
+    manifest = IndexManifest.load()
+    if manifest is not None and manifest.is_current(embedding_model.cache_namespace, data_path, corpus_params):
+        manifest.refresh_source_stat(data_path)
+        vector_store = VectorStore(dimension=manifest.dimension, **vector_store_kwargs)
+        if not vector_store.load():
+            vector_store = None
     
-    # Kaydedilmiş index var mı kontrol et
-    if not vector_store.load():
-        st.info("First time setup: Creating embeddings... (This may take a few minutes)")
-        
-        # Tüm dokümanlar için embedding oluştur
-        texts = [doc['text'] for doc in documents]
-        embeddings = embedding_model.encode(texts)
-        
-        # Vector store'a ekle ve kaydet
-        vector_store.add_documents(embeddings, documents)
-        vector_store.save()
-        
-        st.success("✓ Embeddings created and saved!")
+    if vector_store is None:
+        vector_store = sync_or_build_index(embedding_model, data_path, vector_store_kwargs, corpus_params)
     
     # Chatbot (gpt-4o-mini: ucuz ve hızlı)
     chatbot = HealthcareChatbot(api_key, model="gpt-4o-mini")
     
-    # Hybrid context builder
-    hybrid_builder = HybridContextBuilder(neo4j_client, vector_store, embedding_model)
+    # Hybrid context builder (eşzamanlı oturumların sorguları tek forward pass'te encode edilir)
+    query_encoder = MicroBatchEncoder(
+        embedding_model,
+        max_batch_size=int(os.getenv("EMBEDDING_MAX_BATCH", "32")),
+        max_wait_ms=float(os.getenv("EMBEDDING_MAX_WAIT_MS", "5")),
+        request_timeout=float(os.getenv("EMBEDDING_REQUEST_TIMEOUT", "60"))
+    )
+    
+    # Intent: local embedding classifier, güven eşiğin altındaysa LLM
+    local_classifier = None
+    if os.getenv("LOCAL_INTENT_CLASSIFIER", "false").lower() == "true":
+        local_classifier = LocalIntentClassifier(query_encoder)
+        local_classifier.start_background_training()
+    intent_classifier = IntentClassifier(
+        api_key,
+        local_classifier=local_classifier,
+        confidence_threshold=float(os.getenv("INTENT_CONFIDENCE_THRESHOLD", "0.8")),
+        embedder=query_encoder
+    )
+    if os.getenv("CLASSIFICATION_CACHE", "true").lower() == "true":
+        intent_classifier.enable_cache(
+            os.getenv("CLASSIFICATION_CACHE_PATH", "classification_cache.sqlite"),
+            ttl_seconds=float(os.getenv("CLASSIFICATION_CACHE_TTL_HOURS", "168")) * 3600,
+            similarity_threshold=float(os.getenv("CLASSIFICATION_PARAPHRASE_THRESHOLD", "0.95"))
+        )
+    hybrid_builder = HybridContextBuilder(
+        neo4j_client,
+        vector_store,
+        query_encoder,
+        intent_classifier,
+        speculative=os.getenv("SPECULATIVE_RETRIEVAL", "false").lower() == "true",
+        neo4j_concurrency=int(os.getenv("NEO4J_MAX_CONCURRENCY", "5")),
+        neo4j_timeout=float(os.getenv("NEO4J_QUERY_TIMEOUT", "5")),
+        neo4j_single_query=os.getenv("NEO4J_SINGLE_QUERY", "false").lower() == "true"
+    )
     
     return neo4j_client, hybrid_builder, chatbot, DateTools()
 
@@ -312,7 +441,7 @@ for message in st.session_state.messages:
                     
                     if show_context:
                         with st.expander("📄 View Full Answer"):
-                            st.text(doc.get('answer', 'N/A'))
+                            st.text(hybrid_builder.full_answer(doc))
                     
                     st.divider()
         
@@ -399,14 +528,40 @@ if prompt := st.chat_input("Ask your health question..."):
                 if needed:
                     result_data['required_data'] = needed
             
+            classification = context.get('classification', {})
+            result_data['classifier'] = classification.get('source', 'llm')
+            if classification.get('confidence') is not None:
+                result_data['local_confidence'] = f"{classification['confidence']:.2f}"
+            result_data['llm_call_rate'] = f"{hybrid_builder.intent_classifier.llm_call_rate():.0%}"
+            cache_stats = hybrid_builder.intent_classifier.cache_stats()
+            if cache_stats is not None:
+                result_data['classification_cache_hit_rate'] = f"{cache_stats['hit_rate']:.0%}"
+            step_labels = {'cache': ' (cache)', 'cache_paraphrase': ' (cache, paraphrase)', 'local': ' (local)', 'fallback': ' (keyword fallback)'}
+            
             execution_trace.append({
-                'step': '1. LLM Intent Classification',
+                'step': '1. Intent Classification' + step_labels.get(result_data['classifier'], ' (LLM)'),
                 'function': 'IntentClassifier.classify_with_data()',
                 'parameters': {'question': prompt},
                 'result': result_data,
                 'duration': f"{step_time*1000:.2f}ms"
             })
             
+            # Spekülatif retrieval: classification ile örtüşen ve boşa giden iş
+            speculation = context.get('speculation')
+            if speculation:
+                stage_results = {
+                    name: f"{stage['status']} (overlap {stage['overlap_ms']:.0f}ms, "
+                          f"wait {stage['wait_ms']:.0f}ms, wasted {stage['wasted_ms']:.0f}ms)"
+                    for name, stage in speculation['stages'].items()
+                }
+                execution_trace.append({
+                    'step': '1b. Speculative Retrieval',
+                    'function': 'HybridContextBuilder._build_context_speculative()',
+                    'parameters': {'classification_ms': f"{speculation['classification_ms']:.0f}"},
+                    'result': {**stage_results, 'wasted_ms': f"{speculation['wasted_ms']:.0f}"},
+                    'duration': f"{speculation['classification_ms']:.2f}ms"
+                })
+            
             # Step 2: Personal Data Retrieval (if personal or hybrid)
             if context['intent'] in ["PERSONAL", "HYBRID"]:
                 step_start = time.perf_counter()
@@ -422,6 +577,8 @@ if prompt := st.chat_input("Ask your health question..."):
                     queries_made.append(f"get_user_conditions() → {len(personal_data['conditions'])} results")
                 if personal_data.get('test_results'):
                     queries_made.append(f"get_user_test_results() → {len(personal_data['test_results'])} results")
+                if personal_data.get('unavailable'):
+                    queries_made.append(f"⚠️ unavailable (timeout/error): {', '.join(personal_data['unavailable'])}")
                 
                 execution_trace.append({
                     'step': '2. Neo4j Query (Personal Data)',
@@ -450,7 +607,8 @@ if prompt := st.chat_input("Ask your health question..."):
                     'parameters': params,
                     'result': {
                         'documents_found': knowledge_count,
-                        'top_score': f"{context['knowledge'][0].get('similarity_score', 0):.4f}" if context['knowledge'] else 'N/A'
+                        'top_score': f"{context['knowledge'][0].get('similarity_score', 0):.4f}" if context['knowledge'] else 'N/A',
+                        'retrieval_cache_hit_rate': f"{hybrid_builder.cache_stats()['retrieval']['hit_rate']:.0%}"
                     },
                     'duration': f"{step_time*1000:.2f}ms"
                 })
@@ -651,7 +809,7 @@ if prompt := st.chat_input("Ask your health question..."):
                         with st.container():
                             st.markdown(f"**Q:** _{doc.get('question', 'N/A')}_")
                             with st.expander("📄 View Full Answer"):
-                                st.text(doc.get('answer', 'N/A'))
+                                st.text(hybrid_builder.full_answer(doc))
                         
                         st.divider()
             
@@ -0,0 +1,180 @@
+"""
+Patient profile query benchmark
+
+Sentetik hastalar (tür başına N kayıt) oluşturur ve karşılaştırır:
+- eski get_user_complete_profile (zincirli OPTIONAL MATCH) - sadece küçük N'lerde,
+  ara satır sayısı randevu × not × ilaç × hastalık × test olduğu için
+- yeni get_user_complete_profile (CALL {} subquery'leri)
+- export_user_graph (streaming export)
+- get_user_personal_data (tek sorgu) vs per-slice get_user_* (sonuçlar aynı olmalı)
+
+Sentetik veriler "bench_" önekli id'lerle yazılır ve sonunda silinir.
+
+Kullanım:
+    python benchmark_profile.py --sizes 5,10,20,100,300 --legacy-max 20 --repeat 3
+"""
+import argparse
+import os
+import time
+from datetime import date, timedelta
+from dotenv import load_dotenv
+from src.neo4j_client import Neo4jClient
+
+LEGACY_PROFILE_QUERY = """
+MATCH (u:User {id: $user_id})
+OPTIONAL MATCH (u)-[:HAS_APPOINTMENT]->(a:Appointment)-[:WITH_DOCTOR]->(d:Doctor)
+OPTIONAL MATCH (a)-[:HAS_NOTES]->(n:AppointmentNote)
+OPTIONAL MATCH (u)-[:TAKES_MEDICATION]->(m:Medication)
+OPTIONAL MATCH (u)-[:HAS_CONDITION]->(c:Condition)
+OPTIONAL MATCH (c)-[:TREATED_WITH]->(m2:Medication)
+OPTIONAL MATCH (u)-[:HAS_TEST_RESULT]->(t:TestResult)
+RETURN u,
+       collect(DISTINCT a) as appointments,
+       collect(DISTINCT d) as doctors,
+       collect(DISTINCT n) as notes,
+       collect(DISTINCT m) as medications,
+       collect(DISTINCT c) as conditions,
+       collect(DISTINCT t) as test_results
+"""
+
+SEED_QUERY = """
+CREATE (u:User {id: $user_id, name: $user_id, age: 50, created_at: datetime()})
+WITH u
+UNWIND range(0, $n - 1) AS i
+MERGE (d:Doctor {id: 'bench_doctor_' + toString(i % 10)})
+  ON CREATE SET d.name = 'Bench Doctor ' + toString(i % 10), d.specialty = 'Internal Medicine'
+CREATE (a:Appointment {
+    id: $user_id + '_apt_' + toString(i),
+    date: date($start) + duration({days: i}),
+    time: '09:00',
+    status: 'scheduled',
+    location: 'Bench Clinic'
+})
+CREATE (u)-[:HAS_APPOINTMENT]->(a)-[:WITH_DOCTOR]->(d)
+CREATE (a)-[:HAS_NOTES]->(:AppointmentNote {id: $user_id + '_note_' + toString(i), summary: 'note ' + toString(i)})
+CREATE (m:Medication {id: $user_id + '_med_' + toString(i), name: 'Med ' + toString(i), dosage: '10mg', frequency: 'daily'})
+CREATE (u)-[:TAKES_MEDICATION]->(m)
+CREATE (c:Condition {id: $user_id + '_cond_' + toString(i), name: 'Condition ' + toString(i), severity: 'moderate'})
+CREATE (u)-[:HAS_CONDITION]->(c)-[:TREATED_WITH]->(m)
+CREATE (t:TestResult {
+    id: $user_id + '_test_' + toString(i),
+    test_name: 'Test ' + toString(i),
+    test_date: date($start) - duration({days: i}),
+    result: toString(i),
+    status: 'normal'
+})
+CREATE (u)-[:HAS_TEST_RESULT]->(t)
+CREATE (a)-[:ORDERED_TEST]->(t)
+"""
+
+# Label + unique id constraint'li property üzerinden silinir (tüm graph taranmaz):
+# bench kullanıcıları ve onlardan en fazla 2 adımda erişilen bench düğümleri,
+# ardından paylaşılan bench doktorları (yarım kalmış çalıştırmalardan kalanlar dahil)
+CLEANUP_QUERIES = [
+    """
+    MATCH (u:User) WHERE u.id STARTS WITH 'bench_'
+    OPTIONAL MATCH (u)-[*1..2]->(x) WHERE x.id STARTS WITH 'bench_'
+    DETACH DELETE u, x
+    """,
+    """
+    MATCH (d:Doctor) WHERE d.id STARTS WITH 'bench_doctor_'
+    DETACH DELETE d
+    """
+]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Patient profile query benchmark")
+    parser.add_argument("--sizes", default="5,10,20,100,300", help="Tür başına kayıt sayıları (virgülle)")
+    parser.add_argument("--legacy-max", type=int, default=20, help="Eski sorgunun çalıştırılacağı en büyük N")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--keep", action="store_true", help="Sentetik verileri silme")
+    return parser.parse_args()
+
+
+def cleanup(client: Neo4jClient):
+    """Sentetik bench verilerini siler"""
+    with client.driver.session() as session:
+        for query in CLEANUP_QUERIES:
+            session.run(query).consume()
+
+
+def best_of(fn, repeat: int) -> float:
+    """En iyi süre (ms)"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+
+def check_personal_data(client: Neo4jClient, user_id: str) -> bool:
+    """Tek sorgu sonucu per-slice metodlarla aynı mı"""
+    flags = {'appointments': True, 'medications': True, 'conditions': True, 'test_results': True}
+    combined = client.get_user_personal_data(user_id, flags)
+    separate = {
+        'user': client.get_user(user_id),
+        'appointments': client.get_user_appointments(user_id),
+        'medications': client.get_user_medications(user_id),
+        'conditions': client.get_user_conditions(user_id),
+        'test_results': client.get_user_test_results(user_id)
+    }
+    return combined == separate
+
+
+def main():
+    load_dotenv()
+    args = parse_args()
+    sizes = [int(n) for n in args.sizes.split(",")]
+
+    neo4j_password = os.getenv("NEO4J_PASSWORD")
+    if not neo4j_password:
+        print("❌ NEO4J_PASSWORD not set!")
+        exit(1)
+
+    # Cache kapalı: her çağrı Neo4j'ye gider
+    client = Neo4jClient(
+        os.getenv("NEO4J_URI", "bolt://localhost:7687"),
+        os.getenv("NEO4J_USER", "neo4j"),
+        neo4j_password,
+        cache_ttl=0
+    )
+    client.create_schema()
+
+    # Önceki --keep çalıştırmasından kalanlar
+    cleanup(client)
+
+    try:
+        print("\n   N   legacy(ms)   profile(ms)   export(ms)   rows   per-slice == single")
+        for n in sizes:
+            user_id = f"bench_user_{n}"
+            with client.driver.session() as session:
+                session.run(SEED_QUERY, user_id=user_id, n=n, start=str(date.today() - timedelta(days=n // 2))).consume()
+
+            legacy = "-"
+            if n <= args.legacy_max:
+                def run_legacy():
+                    with client.driver.session() as session:
+                        session.run(LEGACY_PROFILE_QUERY, user_id=user_id).single()
+                legacy = f"{best_of(run_legacy, args.repeat):.1f}"
+
+            profile_ms = best_of(lambda: client.get_user_complete_profile(user_id), args.repeat)
+            rows = 0
+
+            def run_export():
+                nonlocal rows
+                rows = sum(1 for _ in client.export_user_graph(user_id))
+            export_ms = best_of(run_export, args.repeat)
+
+            matches = check_personal_data(client, user_id)
+            print(f"{n:4d}   {legacy:>10}   {profile_ms:11.1f}   {export_ms:10.1f}   {rows:4d}   {'✓' if matches else '⚠️ mismatch'}")
+    finally:
+        if not args.keep:
+            cleanup(client)
+            print("✓ Sentetik veriler silindi")
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Offline FAISS index builder
+
+Kullanım:
+    python build_index.py
+    python build_index.py --workers 4 --index-type hnsw --storage sq8
+    python build_index.py --stream --data big_dump.csv   # milyonlarca satır, CSV ve embedding'ler parça parça
+
+Yarıda kesilirse aynı komut tekrar çalıştırıldığında checkpoint'lerden devam eder
+(--stream modunda checkpoint yoktur).
+"""
+import argparse
+import os
+from dotenv import load_dotenv
+from src.data_processor import DataProcessor
+from src.vector_store import VectorStore, INDEX_TYPES, STORAGE_TYPES
+from src.index_builder import IndexBuildPipeline
+from src.embeddings import DEFAULT_MODEL_NAME, BACKENDS, EmbeddingModel
+from src.embedding_cache import EmbeddingCache
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="MedQuad embedding + FAISS index builder")
+    parser.add_argument("--data", default="data/medquad.csv", help="MedQuad CSV dosyası")
+    parser.add_argument("--model", default=DEFAULT_MODEL_NAME, help="Embedding modeli")
+    parser.add_argument("--backend", choices=BACKENDS, default=os.getenv("EMBEDDING_BACKEND", "torch"),
+                        help="Embedding backend'i (uygulamanınkiyle aynı olmalı; manifest'e yazılır)")
+    parser.add_argument("--onnx-quantization", default=os.getenv("EMBEDDING_ONNX_QUANTIZATION", "avx2"))
+    parser.add_argument("--cache-path", default=os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache.sqlite"),
+                        help="Kalıcı embedding cache ('' = kapalı)")
+    parser.add_argument("--workers", type=int, default=None, help="Encoder process sayısı")
+    parser.add_argument("--chunk-size", type=int, default=2048, help="Checkpoint chunk boyutu")
+    parser.add_argument("--batch-size", type=int, default=64, help="Model batch boyutu")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default=os.getenv("FAISS_INDEX_TYPE", "flat"))
+    parser.add_argument("--storage", choices=STORAGE_TYPES, default=os.getenv("FAISS_STORAGE", "float"))
+    parser.add_argument("--rerank-factor", type=int, default=int(os.getenv("FAISS_RERANK_FACTOR", "0")))
+    parser.add_argument("--work-dir", default="build_checkpoints", help="Checkpoint klasörü")
+    parser.add_argument("--keep-checkpoints", action="store_true", help="Build sonrası checkpoint'leri silme")
+    parser.add_argument("--stream", action="store_true", help="CSV'yi parça parça oku (tüm corpus bellekte tutulmaz)")
+    parser.add_argument("--stream-batch", type=int, default=50_000, help="--stream modunda CSV okuma batch boyutu")
+    parser.add_argument("--expected-docs", type=int, default=0,
+                        help="--stream modunda toplam doküman sayısı (IVF nlist / eğitim örneği için; 0 = CSV'den say)")
+    parser.add_argument("--passage-max-tokens", type=int, default=int(os.getenv("PASSAGE_MAX_TOKENS", "0")),
+                        help="Uzun cevapları bu token sınırında pasajlara böl (0 = bölme)")
+    parser.add_argument("--passage-overlap", type=int, default=int(os.getenv("PASSAGE_OVERLAP", "32")))
+    parser.add_argument("--dedup-threshold", type=float, default=float(os.getenv("DEDUP_THRESHOLD", "0")),
+                        help="Near-duplicate birleştirme Jaccard eşiği (0 = kapalı; --stream ile kullanılamaz)")
+    return parser.parse_args()
+
+
+def main():
+    load_dotenv()
+    args = parse_args()
+    if args.passage_max_tokens > 0 and not 0 <= args.passage_overlap < args.passage_max_tokens:
+        raise SystemExit("--passage-overlap, 0 ile --passage-max-tokens arasında olmalı")
+    if args.stream and args.dedup_threshold > 0:
+        # Batch içi dedup global dedup ile aynı corpus'u üretmez; manifest ikisini ayırt edemez
+        raise SystemExit("--stream ile --dedup-threshold kullanılamaz (dedup tüm corpus üzerinde yapılmalı)")
+
+    data_processor = DataProcessor(args.data)
+
+    # Boyut için; asıl encoder'lar worker process'lerde yüklenir. onnx-int8 modeli
+    # burada bir kez export edilir (worker'lar aynı klasöre eşzamanlı export etmesin)
+    probe = EmbeddingModel(args.model, backend=args.backend, onnx_quantization=args.onnx_quantization)
+    dimension = probe.get_dimension()
+    backend = probe.backend
+    del probe
+    cache = EmbeddingCache(args.cache_path) if args.cache_path else None
+
+    vector_store = VectorStore(
+        dimension=dimension,
+        index_type=args.index_type,
+        storage=args.storage,
+        rerank_factor=args.rerank_factor
+    )
+
+    pipeline = IndexBuildPipeline(
+        model_name=args.model,
+        num_workers=args.workers,
+        chunk_size=args.chunk_size,
+        batch_size=args.batch_size,
+        work_dir=args.work_dir,
+        backend=backend,
+        onnx_quantization=args.onnx_quantization,
+        cache=cache
+    )
+    # app_hybrid.corpus_params_from_env ile aynı şema (manifest karşılaştırması için)
+    corpus_params = {}
+    if args.dedup_threshold > 0:
+        corpus_params['dedup_threshold'] = args.dedup_threshold
+    if args.passage_max_tokens > 0:
+        corpus_params['passage_max_tokens'] = args.passage_max_tokens
+        corpus_params['passage_overlap'] = args.passage_overlap
+
+    def prepare(documents):
+        return data_processor.apply_corpus_params(documents, corpus_params, args.model)
+
+    try:
+        if args.stream:
+            # IVF nlist ve eğitim örneği ilk batch'e göre değil tüm corpus'a göre seçilsin
+            expected_docs = args.expected_docs or data_processor.count_rows()
+            print(f"Beklenen doküman sayısı: {expected_docs}")
+            batches = (prepare(batch) for batch in data_processor.iter_document_batches(batch_size=args.stream_batch))
+            pipeline.build_streaming(
+                batches, vector_store,
+                source_path=args.data,
+                expected_docs=expected_docs,
+                corpus_params=corpus_params
+            )
+        else:
+            documents = prepare(data_processor.prepare_documents())
+            pipeline.build(
+                documents, vector_store,
+                source_path=args.data,
+                keep_checkpoints=args.keep_checkpoints,
+                corpus_params=corpus_params
+            )
+    finally:
+        # Biriken last_access güncellemeleri yazılır
+        if cache is not None:
+            cache.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Embedding backend parity check
+
+PyTorch referans modeli ile int8 ONNX backend'ini MedQuad örneği üzerinde
+karşılaştırır: cosine drift ve top-k overlap raporlar.
+
+Kullanım:
+    python check_embedding_parity.py --docs 2000 --queries 200 --k 10
+"""
+import argparse
+import time
+import numpy as np
+from src.data_processor import DataProcessor
+from src.embeddings import EmbeddingModel, parity_report
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="torch vs onnx-int8 embedding parity")
+    parser.add_argument("--data", default="data/medquad.csv", help="MedQuad CSV dosyası")
+    parser.add_argument("--model", default="sentence-transformers/all-MiniLM-L6-v2")
+    parser.add_argument("--quantization", default="avx2", help="int8 profili (arm64, avx2, avx512, avx512_vnni)")
+    parser.add_argument("--docs", type=int, default=2000, help="Corpus örnek sayısı")
+    parser.add_argument("--queries", type=int, default=200, help="Sorgu sayısı")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+
+def _timed_encode(model: EmbeddingModel, texts):
+    start = time.perf_counter()
+    model.encode(texts, show_progress=False)
+    return len(texts) / (time.perf_counter() - start)
+
+
+def main():
+    args = parse_args()
+    documents = DataProcessor(args.data).prepare_documents()
+
+    rng = np.random.default_rng(args.seed)
+    sample = rng.choice(len(documents), size=min(args.docs, len(documents)), replace=False)
+    corpus_texts = [documents[i]['text'] for i in sample]
+    query_texts = [documents[i]['question'] for i in sample[:args.queries]]
+
+    reference = EmbeddingModel(args.model, backend="torch")
+    candidate = EmbeddingModel(args.model, backend="onnx-int8", onnx_quantization=args.quantization)
+    if candidate.backend != "onnx-int8":
+        print("❌ onnx-int8 backend yüklenemedi: pip install -r requirements-onnx.txt")
+        exit(1)
+
+    report = parity_report(reference, candidate, corpus_texts, query_texts, k=args.k)
+    report['torch_texts_per_sec'] = _timed_encode(reference, query_texts)
+    report['onnx_int8_texts_per_sec'] = _timed_encode(candidate, query_texts)
+
+    print("\n=== Embedding parity (torch -> onnx-int8) ===")
+    for key, value in report.items():
+        print(f"{key:28s} {value:.4f}" if isinstance(value, float) else f"{key:28s} {value}")
+
+
+if __name__ == "__main__":
+    main()
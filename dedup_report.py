@@ -0,0 +1,87 @@
+"""
+Near-duplicate collapse raporu
+
+Corpus'u MinHash/LSH ile birleştirir ve önce/sonra karşılaştırır:
+- doküman sayısı, index boyutu (float vektör byte'ı)
+- örnek sorgularda top-k içinde aynı kümeye düşen (gereksiz) slot oranı
+- prompt'a giren knowledge bölümünün ortalama uzunluğu
+
+Kullanım:
+    python dedup_report.py --threshold 0.8 --queries 500 --k 3
+"""
+import argparse
+import os
+import numpy as np
+from dotenv import load_dotenv
+from src.data_processor import DataProcessor
+from src.dedup import collapse_near_duplicates, parse_aliases
+from src.embedding_cache import EmbeddingCache
+from src.embeddings import EmbeddingModel
+from src.vector_store import VectorStore
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Near-duplicate collapse raporu")
+    parser.add_argument("--data", default="data/medquad.csv", help="MedQuad CSV dosyası")
+    parser.add_argument("--threshold", type=float, default=0.8, help="Jaccard eşiği")
+    parser.add_argument("--queries", type=int, default=500, help="Örnek sorgu sayısı")
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+
+def knowledge_chars(docs) -> int:
+    """format_for_gpt'nin knowledge bölümüne giren karakter sayısı"""
+    return sum(len(f"Q: {doc['question']}\nA: {doc['answer']}\n") for doc in docs)
+
+
+def main():
+    load_dotenv()
+    args = parse_args()
+
+    documents = DataProcessor(args.data).prepare_documents()
+    canonical, report = collapse_near_duplicates(documents, threshold=args.threshold)
+
+    # Her dokümanın kümesi: canonical ID
+    cluster_of = {}
+    for doc in canonical:
+        cluster_of[doc['id']] = doc['id']
+        for alias in parse_aliases(doc['aliases']):
+            cluster_of[alias] = doc['id']
+
+    model = EmbeddingModel(cache=EmbeddingCache(os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache.sqlite")))
+    embeddings = model.encode([doc['text'] for doc in documents])
+    row_of = {doc['id']: row for row, doc in enumerate(documents)}
+
+    before = VectorStore(dimension=model.get_dimension())
+    before.add_documents(embeddings, documents)
+    after = VectorStore(dimension=model.get_dimension())
+    after.add_documents(embeddings[[row_of[doc['id']] for doc in canonical]], canonical)
+
+    rng = np.random.default_rng(args.seed)
+    sample = rng.choice(len(documents), size=min(args.queries, len(documents)), replace=False)
+    queries = model.encode([documents[i]['question'] for i in sample], show_progress=False)
+
+    results_before = before.search_batch(queries, k=args.k)
+    results_after = after.search_batch(queries, k=args.k)
+
+    redundant_slots = sum(len(docs) - len({cluster_of[doc['id']] for doc in docs}) for docs in results_before)
+    total_slots = sum(len(docs) for docs in results_before)
+    chars_before = np.mean([knowledge_chars(docs) for docs in results_before])
+    chars_after = np.mean([knowledge_chars(docs) for docs in results_after])
+    dim = model.get_dimension()
+
+    print("\n=== Near-duplicate collapse ===")
+    print(f"Documents:           {report['documents_before']} -> {report['documents_after']} "
+          f"(-{report['removed']}, {report['clusters']} clusters, "
+          f"{report['kept_for_filters']} kept apart by source/focus_area)")
+    print(f"Index (float):       {report['documents_before'] * dim * 4 / 1e6:.1f} MB -> "
+          f"{report['documents_after'] * dim * 4 / 1e6:.1f} MB")
+    print(f"Corpus text:         {report['chars_before'] / 1e6:.1f}M -> {report['chars_after'] / 1e6:.1f}M chars")
+    print(f"Redundant top-{args.k} slots (before): {redundant_slots}/{total_slots} "
+          f"({redundant_slots / max(total_slots, 1):.1%})")
+    print(f"Knowledge section:   {chars_before:.0f} -> {chars_after:.0f} chars/prompt (k={args.k})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Local intent classifier değerlendirmesi
+
+eval/intent_eval.jsonl üzerinde:
+- local classifier'ın intent ve required_data doğruluğu
+- güven eşiğine göre local karar oranı / LLM çağrı oranı (sweep)
+- seçilen eşikte local + LLM fallback birleşik doğruluk ve LLM çağrı oranı
+
+Kullanım:
+    python eval_intent_classifier.py                 # LLM fallback dahil
+    python eval_intent_classifier.py --no-llm        # sadece local + eşik taraması
+"""
+import argparse
+import os
+import time
+import numpy as np
+from dotenv import load_dotenv
+from src.embedding_cache import EmbeddingCache
+from src.embeddings import EmbeddingModel
+from src.intent_classifier import IntentClassifier
+from src.local_intent_classifier import LocalIntentClassifier, load_labelled, DATA_FLAGS
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Local intent classifier eval")
+    parser.add_argument("--train", default="eval/intent_train.jsonl")
+    parser.add_argument("--eval", default="eval/intent_eval.jsonl")
+    parser.add_argument("--threshold", type=float, default=None, help="Güven eşiği (varsayılan: INTENT_CONFIDENCE_THRESHOLD)")
+    parser.add_argument("--no-llm", action="store_true", help="LLM fallback'i çalıştırma")
+    return parser.parse_args()
+
+
+def is_correct(prediction, example) -> bool:
+    """Intent doğru ve (GENERIC değilse) dört bayrak da doğru"""
+    if prediction['intent'] != example['intent']:
+        return False
+    if example['intent'] == "GENERIC":
+        return True
+    return all(bool(prediction['required_data'].get(f)) == bool(example['required_data'].get(f)) for f in DATA_FLAGS)
+
+
+def main():
+    load_dotenv()
+    args = parse_args()
+    threshold = args.threshold
+    if threshold is None:
+        threshold = float(os.getenv("INTENT_CONFIDENCE_THRESHOLD", "0.8"))
+
+    examples = load_labelled(args.eval)
+    model = EmbeddingModel(cache=EmbeddingCache(os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache.sqlite")))
+    local = LocalIntentClassifier(model, train_path=args.train)
+    local.train(load_labelled(args.train))
+
+    predictions = local.predict_batch([ex['question'] for ex in examples])
+    confidences = np.array([p['confidence'] for p in predictions])
+    intent_ok = np.array([p['intent'] == ex['intent'] for p, ex in zip(predictions, examples)])
+    full_ok = np.array([is_correct(p, ex) for p, ex in zip(predictions, examples)])
+
+    print(f"\n=== Local classifier ({len(examples)} soru) ===")
+    print(f"Intent accuracy:               {intent_ok.mean():.1%}")
+    print(f"Intent + required_data exact:  {full_ok.mean():.1%}")
+
+    print("\nEşik   local karar   local doğruluk   LLM çağrı oranı")
+    for t in (0.5, 0.6, 0.7, 0.8, 0.9, 0.95):
+        covered = confidences >= t
+        accuracy = full_ok[covered].mean() if covered.any() else float('nan')
+        print(f"{t:.2f}   {covered.mean():10.1%}   {accuracy:14.1%}   {1 - covered.mean():14.1%}")
+
+    if args.no_llm:
+        return
+
+    classifier = IntentClassifier(local_classifier=local, confidence_threshold=threshold)
+    start = time.perf_counter()
+    results = [classifier.classify_with_data(ex['question']) for ex in examples]
+    elapsed = time.perf_counter() - start
+    combined_ok = np.array([is_correct(r, ex) for r, ex in zip(results, examples)])
+
+    print(f"\n=== Local + LLM fallback (eşik {threshold:.2f}) ===")
+    print(f"Accuracy (intent + required_data): {combined_ok.mean():.1%}")
+    print(f"LLM çağrı oranı:                   {classifier.llm_call_rate():.1%}")
+    print(f"Ortalama sınıflandırma süresi:     {elapsed / len(examples) * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Micro-batching embedding front end
+
+Aynı anda gelen encode_single çağrıları birkaç milisaniyelik bir pencerede
+toplanır ve tek bir batch forward pass ile encode edilir; sonuçlar her
+çağırana ayrı ayrı döner. Batch dolunca (max_batch_size) veya ilk isteğin
+bekleme süresi dolunca (max_wait_ms) batch hemen gönderilir.
+
+EmbeddingModel ile aynı arayüzü sunar, HybridContextBuilder'a doğrudan verilebilir.
+"""
+import asyncio
+import queue
+import threading
+import time
+import numpy as np
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import List, Dict
+
+
+class MicroBatchEncoder:
+    """Eşzamanlı tekil sorguları batch'leyen embedding servisi"""
+
+    def __init__(
+        self,
+        embedding_model,
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0,
+        request_timeout: float = 60.0
+    ):
+        """
+        Args:
+            embedding_model: Arkadaki EmbeddingModel
+            max_batch_size: Bir forward pass'teki maksimum metin sayısı
+            max_wait_ms: İlk istekten sonra batch'i doldurmak için beklenecek süre
+            request_timeout: encode_single / encode_async için maksimum bekleme (saniye;
+                arka planda yüklenen modelin ilk isteği yükleme süresini de bekler)
+        """
+        self.embedding_model = embedding_model
+        self.model_name = embedding_model.model_name
+        self.cache_namespace = getattr(embedding_model, 'cache_namespace', embedding_model.model_name)
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.request_timeout = request_timeout
+
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._requests = 0
+        self._closed = False
+
+        self._worker = threading.Thread(target=self._run, name="micro-batch-encoder", daemon=True)
+        self._worker.start()
+
+    # ==================== WORKER ====================
+
+    def _collect(self, first) -> List:
+        """İlk istekten itibaren pencere dolana kadar gelen istekleri toplar"""
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                # Kapanış sinyali: elimizdekini bitir, sonra çık
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        try:
+            while True:
+                first = self._queue.get()
+                if first is None:
+                    return
+
+                batch = [item for item in self._collect(first) if item[1].set_running_or_notify_cancel()]
+                if not batch:
+                    continue
+
+                texts = [text for text, _ in batch]
+                try:
+                    embeddings = self.embedding_model.encode(texts, show_progress=False)
+                    for (_, future), embedding in zip(batch, embeddings):
+                        future.set_result(embedding)
+                except Exception as e:
+                    for _, future in batch:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+
+                with self._stats_lock:
+                    self._batches += 1
+                    self._requests += len(batch)
+        finally:
+            # Worker beklenmedik şekilde ölürse kuyruktaki istekler sonsuza dek beklemesin
+            self._closed = True
+            self._fail_pending(RuntimeError("MicroBatchEncoder worker durdu"))
+
+    def _fail_pending(self, error: Exception):
+        """Kuyrukta kalan isteklerin Future'larını hata ile sonlandırır"""
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if item is not None and item[1].set_running_or_notify_cancel():
+                item[1].set_exception(error)
+
+    # ==================== PUBLIC API ====================
+
+    def submit(self, text: str) -> Future:
+        """Metni kuyruğa ekler, embedding'i dönecek Future'ı verir"""
+        if self._closed:
+            raise RuntimeError("MicroBatchEncoder kapatıldı")
+        future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def encode_single(self, text: str) -> np.ndarray:
+        """
+        Tek bir metni vektöre çevirir (eşzamanlı çağrılarla aynı batch'te)
+
+        Raises:
+            concurrent.futures.TimeoutError: request_timeout içinde sonuç gelmezse
+        """
+        future = self.submit(text)
+        try:
+            return future.result(timeout=self.request_timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise
+
+    async def encode_async(self, text: str) -> np.ndarray:
+        """asyncio kodundan kullanım için encode_single"""
+        return await asyncio.wait_for(asyncio.wrap_future(self.submit(text)), self.request_timeout)
+
+    def encode(self, texts: List[str], show_progress: bool = True) -> np.ndarray:
+        """Zaten batch olan istekler doğrudan modele gider"""
+        return self.embedding_model.encode(texts, show_progress=show_progress)
+
+    def get_dimension(self) -> int:
+        return self.embedding_model.get_dimension()
+
+    @property
+    def is_ready(self) -> bool:
+        """Arkadaki model yüklendi mi (BackgroundEmbeddingModel değilse her zaman True)"""
+        return getattr(self.embedding_model, 'is_ready', True)
+
+    def stats(self) -> Dict:
+        """Gönderilen batch sayısı ve ortalama batch boyutu"""
+        with self._stats_lock:
+            return {
+                'batches': self._batches,
+                'requests': self._requests,
+                'avg_batch_size': self._requests / self._batches if self._batches else 0.0
+            }
+
+    def close(self):
+        """Worker thread'i kuyruktaki istekleri bitirdikten sonra durdurur"""
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+            self._worker.join()
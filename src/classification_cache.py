@@ -0,0 +1,283 @@
+"""
+Kalıcı intent classification cache (SQLite)
+
+LLM sınıflandırması temperature=0 ile çalıştığı için aynı soru aynı sonucu
+verir. Sonuçlar normalize edilmiş soru metniyle saklanır:
+
+- Exact lookup: küçük harf, sadeleştirilmiş boşluk, sondaki noktalama atılmış soru
+- Paraphrase lookup (opsiyonel): soru embedding'i cache'teki bir soruya
+  cosine >= similarity_threshold ise o sonuç kullanılır
+- TTL: süresi geçen kayıtlar kullanılmaz ve silinir
+- Boyut sınırı aşılınca en uzun süredir kullanılmayan kayıtlar silinir
+
+Namespace (classifier modeli + system prompt hash'i) anahtara dahildir;
+prompt değişince eski sonuçlar kendiliğinden geçersiz olur.
+"""
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+import numpy as np
+from typing import Dict, Optional
+
+_TRAILING_PUNCT = re.compile(r"[\s?!.]+$")
+
+
+def normalize_question(question: str) -> str:
+    """Exact lookup anahtarı için soruyu normalize eder"""
+    return _TRAILING_PUNCT.sub("", " ".join(question.lower().split()))
+
+
+class ClassificationCache:
+    """TTL ve boyut sınırlı, paraphrase destekli classification cache"""
+
+    def __init__(
+        self,
+        path: str = "classification_cache.sqlite",
+        namespace: str = "",
+        ttl_seconds: float = 7 * 24 * 3600,
+        max_entries: int = 50_000,
+        similarity_threshold: float = 0.95
+    ):
+        """
+        Args:
+            namespace: Classifier modeli + prompt kimliği
+            ttl_seconds: Kayıt ömrü
+            max_entries: Maksimum kayıt sayısı
+            similarity_threshold: Paraphrase eşleşmesi için cosine eşiği (0 = kapalı)
+        """
+        self.path = path
+        self.namespace = namespace
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+
+        self.hits = 0
+        self.paraphrase_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        # Streamlit farklı thread'lerden çağırabilir; erişim lock ile serileştirilir
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS classifications (
+                key BLOB PRIMARY KEY,
+                namespace TEXT NOT NULL,
+                question TEXT NOT NULL,
+                result TEXT NOT NULL,
+                embedding BLOB,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_classifications_access ON classifications(last_access)")
+        self.conn.commit()
+
+        # Paraphrase araması için bellekteki embedding matrisi (normalize edilmiş)
+        # _keys[i] <-> _matrix[i], _row_of: anahtar -> matris satırı
+        self._keys = []
+        self._row_of = {}
+        self._matrix = None
+        self._size = 0
+        with self._lock:
+            self._purge_expired()
+            # Satır sayısı bir kez okunur, sonra put / silmelerle güncel tutulur
+            self._count = self.conn.execute("SELECT COUNT(*) FROM classifications").fetchone()[0]
+            self._load_index()
+
+    def _make_key(self, question: str) -> bytes:
+        payload = f"{self.namespace}\x00{normalize_question(question)}".encode('utf-8')
+        return hashlib.blake2b(payload, digest_size=16).digest()
+
+    # ==================== PARAPHRASE INDEX ====================
+
+    def _load_index(self):
+        """Embedding'li kayıtlardan paraphrase matrisini kurar (lock altında çağrılır)"""
+        self._keys = []
+        self._row_of = {}
+        self._matrix = None
+        self._size = 0
+        if self.similarity_threshold <= 0:
+            return
+
+        rows = self.conn.execute(
+            "SELECT key, embedding FROM classifications WHERE namespace = ? AND embedding IS NOT NULL",
+            (self.namespace,)
+        ).fetchall()
+        for key, blob in rows:
+            self._append_vector(key, np.frombuffer(blob, dtype='float32'))
+
+    def _append_vector(self, key: bytes, vector: np.ndarray):
+        """Vektörü ekler; anahtar zaten varsa yerinde değiştirir"""
+        vector = np.asarray(vector, dtype='float32')
+        vector = vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+        row = self._row_of.get(key)
+        if row is not None:
+            self._matrix[row] = vector
+            return
+
+        if self._matrix is None:
+            self._matrix = np.zeros((64, vector.shape[0]), dtype='float32')
+        elif self._size == self._matrix.shape[0]:
+            # Kapasite ikiye katlanır: her put'ta matris kopyalanmaz
+            grown = np.zeros((self._matrix.shape[0] * 2, self._matrix.shape[1]), dtype='float32')
+            grown[:self._size] = self._matrix[:self._size]
+            self._matrix = grown
+
+        self._matrix[self._size] = vector
+        self._keys.append(key)
+        self._row_of[key] = self._size
+        self._size += 1
+
+    def _remove_vector(self, key: bytes):
+        """Anahtarın vektörünü siler (son satır boşalan yere taşınır)"""
+        row = self._row_of.pop(key, None)
+        if row is None:
+            return
+        last = self._size - 1
+        if row != last:
+            moved = self._keys[last]
+            self._matrix[row] = self._matrix[last]
+            self._keys[row] = moved
+            self._row_of[moved] = row
+        self._keys.pop()
+        self._size -= 1
+
+    # ==================== LOOKUP ====================
+
+    def _fetch(self, key: bytes) -> Optional[Dict]:
+        """Kaydı döndürür (yoksa veya süresi geçtiyse None), erişim zamanını günceller"""
+        row = self.conn.execute(
+            "SELECT result, created_at FROM classifications WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        now = time.time()
+        if now - row[1] > self.ttl_seconds:
+            self.conn.execute("DELETE FROM classifications WHERE key = ?", (key,))
+            self.conn.commit()
+            self._count -= 1
+            self._remove_vector(key)
+            return None
+
+        self.conn.execute("UPDATE classifications SET last_access = ? WHERE key = ?", (now, key))
+        self.conn.commit()
+        return json.loads(row[0])
+
+    def get(self, question: str) -> Optional[Dict]:
+        """Normalize edilmiş soruyla exact lookup"""
+        with self._lock:
+            result = self._fetch(self._make_key(question))
+            if result is not None:
+                self.hits += 1
+            return result
+
+    def get_similar(self, embedding: Optional[np.ndarray]) -> Optional[Dict]:
+        """
+        Embedding'i en yakın cache'li soruya cosine >= eşik ise o sonucu döndürür
+
+        Exact lookup'tan sonra çağrılır; burada da bulunamazsa (veya embedding
+        yoksa) miss sayılır.
+        """
+        with self._lock:
+            if embedding is not None and self.similarity_threshold > 0:
+                query = np.asarray(embedding, dtype='float32')
+                query = query / max(float(np.linalg.norm(query)), 1e-12)
+                # Süresi geçmiş en iyi eşleşme _fetch'te silinir, bir sonrakine bakılır
+                while self._size:
+                    scores = self._matrix[:self._size] @ query
+                    best = int(np.argmax(scores))
+                    if scores[best] < self.similarity_threshold:
+                        break
+                    key = self._keys[best]
+                    result = self._fetch(key)
+                    if result is not None:
+                        self.paraphrase_hits += 1
+                        return result
+                    # Satır başka yoldan silinmişse (ör. eviction) vektörü de at
+                    self._remove_vector(key)
+            self.misses += 1
+            return None
+
+    def put(self, question: str, result: Dict, embedding: Optional[np.ndarray] = None):
+        """Sonucu kaydeder ve gerekiyorsa eski kayıtları siler"""
+        key = self._make_key(question)
+        blob = np.asarray(embedding, dtype='float32').tobytes() if embedding is not None else None
+        now = time.time()
+
+        with self._lock:
+            exists = self.conn.execute("SELECT 1 FROM classifications WHERE key = ?", (key,)).fetchone()
+            self.conn.execute(
+                """
+                INSERT OR REPLACE INTO classifications
+                    (key, namespace, question, result, embedding, created_at, last_access)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (key, self.namespace, normalize_question(question), json.dumps(result), blob, now, now)
+            )
+            if exists is None:
+                self._count += 1
+            if embedding is not None and self.similarity_threshold > 0:
+                self._append_vector(key, embedding)
+            elif exists is not None:
+                self._remove_vector(key)
+            if self._evict():
+                # Silinen kayıtların vektörleri matristen de atılır
+                self._load_index()
+            self.conn.commit()
+
+    # ==================== EVICTION ====================
+
+    def _purge_expired(self) -> int:
+        """Süresi geçmiş kayıtları siler, silinen sayısını döndürür (lock altında çağrılır)"""
+        cursor = self.conn.execute(
+            "DELETE FROM classifications WHERE created_at < ?",
+            (time.time() - self.ttl_seconds,)
+        )
+        self.conn.commit()
+        return cursor.rowcount
+
+    def _evict(self) -> bool:
+        """Boyut sınırı aşıldıysa süresi geçenleri ve en eski %10'u siler (lock altında çağrılır)"""
+        if self._count <= self.max_entries:
+            return False
+
+        self._count -= self._purge_expired()
+        target = int(self.max_entries * 0.9)
+        if self._count > target:
+            cursor = self.conn.execute(
+                """
+                DELETE FROM classifications WHERE key IN (
+                    SELECT key FROM classifications ORDER BY last_access ASC LIMIT ?
+                )
+                """,
+                (self._count - target,)
+            )
+            self._count -= cursor.rowcount
+        return True
+
+    # ==================== STATS ====================
+
+    def stats(self) -> Dict:
+        """Hit (exact + paraphrase) / miss sayaçları ve hit oranı"""
+        hits = self.hits + self.paraphrase_hits
+        total = hits + self.misses
+        return {
+            'hits': self.hits,
+            'paraphrase_hits': self.paraphrase_hits,
+            'misses': self.misses,
+            'hit_rate': hits / total if total else 0.0
+        }
+
+    def __len__(self) -> int:
+        return self._count
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
@@ -5,15 +5,55 @@ MedQuad Dataset:
 - Kaynak: https://www.kaggle.com/datasets/pythonafroz/medquad-medical-question-answer-for-ai-research
 - 16,461 medical question-answer pairs
 - Original sources: NIH, Mayo Clinic, MPlusHealthTopics
+
+Büyük Q&A dump'ları için CSV parça parça okunur (iter_document_batches);
+bellek kullanımı batch boyutuyla sınırlı kalır.
+
+Hazırlanan dokümanlar columnar bir artifact'e (DocumentStore formatı) yazılır
+ve kaynak dosyanın hash'i değişmediği sürece sonraki çalıştırmalarda CSV
+parse edilmeden oradan okunur. CSV değişince doküman ID'leri önceki
+artifact'ten (question + source + focus_area eşleşmesiyle) korunur.
+
+Uzun cevaplar chunk_passages ile token sınırlı, örtüşen pasajlara bölünür;
+her pasaj parent_id ile kaynak dokümana bağlıdır ve prompt'a sadece eşleşen
+pasaj girer.
 """
+import time
 import pandas as pd
-from typing import List, Dict
+from collections import Counter
+from functools import lru_cache
+from typing import List, Dict, Iterator, Optional
+from src.document_store import DocumentStore
+from src.index_manifest import source_fingerprint
+from src.dedup import collapse_near_duplicates
+
+# Doküman oluşturmak için okunan kolonlar
+COLUMNS = ['question', 'answer', 'source', 'focus_area']
+
+# Pasaj ID = parent ID * PASSAGE_ID_STRIDE + pasaj sırası (parent ID stabilse pasaj ID de stabil)
+PASSAGE_ID_STRIDE = 1000
+
+# Uzun soru cevaba bu kadardan az yer bırakırsa yine de bu kadar token ayrılır
+MIN_PASSAGE_TOKENS = 32
+
+
+@lru_cache(maxsize=4)
+def load_tokenizer(model_name: str):
+    """Embedding modelinin tokenizer'ı (pasaj sınırları modelin token sayısıyla hesaplanır)"""
+    from transformers import AutoTokenizer
+    return AutoTokenizer.from_pretrained(model_name)
 
 class DataProcessor:
     """MedQuad veri setini yükler ve işler"""
     
-    def __init__(self, data_path: str = "data/medquad.csv"):
+    def __init__(self, data_path: str = "data/medquad.csv", cache_dir: Optional[str] = "prepared_corpus"):
+        """
+        Args:
+            data_path: MedQuad CSV dosyası
+            cache_dir: Hazırlanmış corpus artifact klasörü (None = cache kullanma)
+        """
         self.data_path = data_path
+        self.cache_dir = cache_dir
         self.data = None
         
     def load_data(self) -> pd.DataFrame:
@@ -23,23 +63,247 @@ class DataProcessor:
         print(f"✓ {len(self.data)} adet kayıt yüklendi")
         return self.data
     
+    @staticmethod
+    def _chunk_to_documents(chunk: pd.DataFrame, start_id: int) -> List[Dict[str, str]]:
+        """DataFrame parçasını kolon bazlı (vektörize) işlemlerle dokümanlara çevirir"""
+        # map(str): boş hücre her pandas sürümünde 'nan' olur (pandas 3'te astype(str)
+        # NaN'ı eksik değer olarak bırakır; text NaN olur ve içerik hash'leri değişir)
+        columns = {name: chunk[name].map(str) for name in COLUMNS}
+        texts = "Question: " + columns['question'] + "\nAnswer: " + columns['answer']
+        
+        return [
+            {
+                'id': doc_id,
+                'question': question,
+                'answer': answer,
+                'source': source,
+                'focus_area': focus_area,
+                'text': text
+            }
+            for doc_id, question, answer, source, focus_area, text in zip(
+                range(start_id, start_id + len(chunk)),
+                columns['question'].tolist(),
+                columns['answer'].tolist(),
+                columns['source'].tolist(),
+                columns['focus_area'].tolist(),
+                texts.tolist()
+            )
+        ]
+    
+    def iter_document_batches(self, batch_size: int = 50_000) -> Iterator[List[Dict[str, str]]]:
+        """
+        CSV'yi parça parça okuyup doküman batch'leri üretir
+        
+        ID'ler dosyadaki satır sırasıdır (stabil ID'ler için prepare_documents kullanın).
+        """
+        if self.data is not None:
+            for start in range(0, len(self.data), batch_size):
+                yield self._chunk_to_documents(self.data.iloc[start:start + batch_size], start)
+            return
+        
+        start_id = 0
+        for chunk in pd.read_csv(self.data_path, usecols=COLUMNS, chunksize=batch_size):
+            yield self._chunk_to_documents(chunk, start_id)
+            start_id += len(chunk)
+    
+    def count_rows(self, batch_size: int = 500_000) -> int:
+        """CSV satır sayısı (tek sütun okunur; streaming build'de IVF boyutlandırması için)"""
+        if self.data is not None:
+            return len(self.data)
+        return sum(len(chunk) for chunk in pd.read_csv(self.data_path, usecols=[COLUMNS[0]], chunksize=batch_size))
+    
     def prepare_documents(self) -> List[Dict[str, str]]:
-        """Veriyi doküman formatına çevirir"""
-        if self.data is None:
-            self.load_data()
+        """Veriyi doküman formatına çevirir (kaynak değişmediyse artifact'ten)"""
+        if self.cache_dir is None or self.data is not None:
+            return self._parse_documents()
+        
+        start = time.perf_counter()
+        fingerprint = source_fingerprint(self.data_path)
+        previous = DocumentStore.open(self.cache_dir, mmap=False) if DocumentStore.exists(self.cache_dir) else None
         
+        if previous is not None and previous.metadata.get('source_fingerprint') == fingerprint:
+            documents = previous.to_documents()
+            print(f"✓ {len(documents)} doküman hazırlanmış corpus'tan yüklendi ({time.perf_counter() - start:.2f}s)")
+            return documents
+        
+        documents = self._parse_documents()
+        if previous is not None:
+            self._assign_stable_ids(documents, previous)
+        
+        DocumentStore.from_documents(
+            documents,
+            {'source_path': self.data_path, 'source_fingerprint': fingerprint}
+        ).save(self.cache_dir)
+        print(f"✓ Hazırlanmış corpus kaydedildi: {self.cache_dir}")
+        return documents
+    
+    def _parse_documents(self) -> List[Dict[str, str]]:
+        """CSV'yi parse edip dokümanları oluşturur (ID = satır sırası)"""
+        print("Veri seti yükleniyor...")
         documents = []
-        for idx, row in self.data.iterrows():
-            doc = {
-                'id': idx,
-                'question': str(row['question']),
-                'answer': str(row['answer']),
-                'source': str(row['source']),
-                'focus_area': str(row['focus_area']),
-                'text': f"Question: {row['question']}\nAnswer: {row['answer']}"
-            }
-            documents.append(doc)
+        for batch in self.iter_document_batches():
+            documents.extend(batch)
         
         print(f"✓ {len(documents)} doküman hazırlandı")
         return documents
-
+    
+    @staticmethod
+    def _identity_keys(questions: List[str], sources: List[str], focus_areas: List[str]) -> List:
+        """Satır kimliği: (question, source, focus_area, aynı üçlünün kaçıncı tekrarı)"""
+        seen = Counter()
+        keys = []
+        for key in zip(questions, sources, focus_areas):
+            keys.append((key, seen[key]))
+            seen[key] += 1
+        return keys
+    
+    def _assign_stable_ids(self, documents: List[Dict], previous: DocumentStore):
+        """
+        Önceki artifact'teki satırlarla eşleşen dokümanlara eski ID'lerini verir
+        
+        Cevabı değişen satır ID'sini korur (manifest onu "değişmiş" görür);
+        yeni satırlar kullanılmamış ID'ler alır, böylece araya satır eklemek
+        sonraki tüm ID'leri kaydırmaz.
+        """
+        previous_keys = self._identity_keys(
+            previous.column_values('question'),
+            previous.column_values('source'),
+            previous.column_values('focus_area')
+        )
+        known = dict(zip(previous_keys, previous.column_values('id')))
+        
+        keys = self._identity_keys(
+            [doc['question'] for doc in documents],
+            [doc['source'] for doc in documents],
+            [doc['focus_area'] for doc in documents]
+        )
+        next_id = previous.next_id()
+        reused = 0
+        for doc, key in zip(documents, keys):
+            if key in known:
+                doc['id'] = known[key]
+                reused += 1
+            else:
+                doc['id'] = next_id
+                next_id += 1
+        
+        print(f"✓ Stabil ID'ler: {reused} korundu, {len(documents) - reused} yeni")
+    
+    # ==================== CORPUS STAGES ====================
+    
+    def apply_corpus_params(
+        self,
+        documents: List[Dict],
+        corpus_params: Dict,
+        model_name: str = "sentence-transformers/all-MiniLM-L6-v2"
+    ) -> List[Dict]:
+        """
+        Index'e girmeden önceki opsiyonel aşamalar (manifest'teki corpus_params ile aynı):
+        near-duplicate birleştirme (dedup_threshold), pasaj chunking (passage_max_tokens)
+        """
+        if corpus_params.get('dedup_threshold'):
+            documents, _ = collapse_near_duplicates(documents, threshold=corpus_params['dedup_threshold'])
+        if corpus_params.get('passage_max_tokens'):
+            documents = self.chunk_passages(
+                documents,
+                model_name,
+                max_tokens=corpus_params['passage_max_tokens'],
+                overlap=corpus_params.get('passage_overlap', 32)
+            )
+        return documents
+    
+    
+    @staticmethod
+    def _is_word_start(offsets: List, i: int) -> bool:
+        """Token bir kelimenin başı mı (öncesinde boşluk var mı)"""
+        return i == 0 or offsets[i][0] > offsets[i - 1][1]
+    
+    def _split_answer(self, answer: str, offsets: List, budget: int, overlap: int) -> List[str]:
+        """Cevabı kelime sınırlarında budget token'lık, overlap kadar örtüşen parçalara böler"""
+        n = len(offsets)
+        if n <= budget:
+            return [answer]
+        
+        passages = []
+        start = 0
+        while True:
+            end = min(start + budget, n)
+            if end < n:
+                # Kelimeyi ortadan bölme (pasajın yarısından fazlasını kaybetmeden)
+                for candidate in range(end, start + budget // 2, -1):
+                    if self._is_word_start(offsets, candidate):
+                        end = candidate
+                        break
+            
+            passages.append(answer[offsets[start][0]:offsets[end - 1][1]])
+            if end >= n:
+                return passages
+            
+            next_start = max(start + 1, end - overlap)
+            for candidate in range(next_start, start, -1):
+                if self._is_word_start(offsets, candidate):
+                    next_start = candidate
+                    break
+            start = next_start
+    
+    def chunk_passages(
+        self,
+        documents: List[Dict],
+        model_name: str = "sentence-transformers/all-MiniLM-L6-v2",
+        max_tokens: int = 256,
+        overlap: int = 32
+    ) -> List[Dict]:
+        """
+        Dokümanları embedding modelinin sequence sınırına sığan pasajlara böler
+        
+        Her pasaj "Question: ...\nAnswer: <pasaj>" olarak max_tokens'a sığar;
+        kısa cevaplar tek pasaj olarak kalır.
+        
+        Returns:
+            Pasaj dokümanları (parent_id: kaynak doküman ID'si, passage_index: sırası,
+            full_answer: ilk pasajda bölünmüş cevabın tamamı, diğerlerinde boş)
+        
+        Raises:
+            ValueError: overlap >= max_tokens ise (pasajlar ilerleyemez)
+        """
+        if overlap < 0 or overlap >= max_tokens:
+            raise ValueError(f"passage overlap ({overlap}) 0 ile max_tokens ({max_tokens}) arasında olmalı")
+        
+        tokenizer = load_tokenizer(model_name)
+        passages = []
+        
+        for batch_start in range(0, len(documents), 10_000):
+            batch = documents[batch_start:batch_start + 10_000]
+            prefix_lengths = [
+                len(ids) for ids in tokenizer(
+                    [f"Question: {doc['question']}\nAnswer: " for doc in batch]
+                )['input_ids']
+            ]
+            answer_offsets = tokenizer(
+                [doc['answer'] for doc in batch],
+                add_special_tokens=False,
+                return_offsets_mapping=True
+            )['offset_mapping']
+            
+            for doc, prefix_length, offsets in zip(batch, prefix_lengths, answer_offsets):
+                budget = max(max_tokens - prefix_length, MIN_PASSAGE_TOKENS)
+                # Uzun soru bütçeyi küçültünce overlap pasajın yarısını geçmesin
+                pieces = self._split_answer(doc['answer'], offsets, budget, min(overlap, budget // 2))
+                if len(pieces) > PASSAGE_ID_STRIDE:
+                    print(f"⚠️ Doküman {doc['id']}: {len(pieces)} pasaj, ilk {PASSAGE_ID_STRIDE} tanesi tutuldu")
+                    pieces = pieces[:PASSAGE_ID_STRIDE]
+                
+                for index, answer in enumerate(pieces):
+                    passages.append({
+                        **doc,
+                        'id': doc['id'] * PASSAGE_ID_STRIDE + index,
+                        'answer': answer,
+                        'text': f"Question: {doc['question']}\nAnswer: {answer}",
+                        'parent_id': doc['id'],
+                        'passage_index': index,
+                        # Bölünen cevabın tamamı sadece ilk pasajda tutulur (UI için)
+                        'full_answer': doc['answer'] if index == 0 and len(pieces) > 1 else ""
+                    })
+        
+        print(f"✓ {len(documents)} doküman {len(passages)} pasaja bölündü (max {max_tokens} token, {overlap} overlap)")
+        return passages
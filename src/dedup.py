@@ -0,0 +1,158 @@
+"""
+Near-duplicate tespiti (MinHash + LSH)
+
+MedQuad'da aynı soru-cevap çiftleri farklı NIH alt kaynaklarında küçük
+farklarla tekrar ediyor ve search() sonuçlarında k slotun hepsini
+doldurabiliyor. Ingest sırasında:
+
+1. Her doküman kelime 3-gram shingle'larına ayrılır, MinHash imzası çıkarılır
+2. İmzalar band'lere bölünür (LSH); aynı bucket'a düşenler aday çift olur
+3. Adaylar imza benzerliği (tahmini Jaccard) >= threshold ise birleştirilir
+4. Her kümeden bir canonical doküman kalır, diğerlerinin ID'leri `aliases`
+   alanında (virgülle ayrılmış) saklanır
+
+Kümeler filtre alanlarına (source, focus_area) göre ayrıca bölünür: farklı
+kaynak / konu altındaki kopyalar birleştirilmez. Aksi halde canonical sadece
+kendi source / focus_area'sını taşır ve filtreli arama (örn. hastanın
+hastalıklarına göre focus_area) alias'ın kategorisindeki içeriği kaçırır.
+"""
+import re
+import zlib
+import numpy as np
+from collections import defaultdict
+from typing import List, Dict, Tuple
+
+# Near-duplicate'ler sadece bu alanlar aynıysa birleştirilir (search filtreleri)
+FILTER_FIELDS = ("source", "focus_area")
+
+# 2^31 - 1: a * x çarpımı uint64'e taşmadan sığar
+_PRIME = (1 << 31) - 1
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def _shingle_hashes(text: str, size: int) -> np.ndarray:
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < size:
+        grams = {" ".join(words)}
+    else:
+        grams = {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+    return np.fromiter((zlib.crc32(g.encode('utf-8')) % _PRIME for g in grams), dtype='uint64', count=len(grams))
+
+
+def minhash_signatures(texts: List[str], num_perm: int = 128, shingle_size: int = 3, seed: int = 0) -> np.ndarray:
+    """
+    Metinlerin MinHash imzaları
+
+    Returns:
+        (len(texts), num_perm) uint64 matris
+    """
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, _PRIME, size=num_perm, dtype='uint64')[:, None]
+    b = rng.integers(0, _PRIME, size=num_perm, dtype='uint64')[:, None]
+
+    signatures = np.empty((len(texts), num_perm), dtype='uint64')
+    for i, text in enumerate(texts):
+        hashes = _shingle_hashes(text, shingle_size)[None, :]
+        signatures[i] = ((a * hashes + b) % _PRIME).min(axis=1)
+    return signatures
+
+
+def find_near_duplicates(signatures: np.ndarray, threshold: float = 0.8, bands: int = 16) -> np.ndarray:
+    """
+    LSH ile near-duplicate kümelerini bulur
+
+    Returns:
+        Her satır için küme etiketi (kümenin en küçük satır numarası)
+    """
+    n, num_perm = signatures.shape
+    rows_per_band = num_perm // bands
+    parent = np.arange(n)
+
+    def find(x: int) -> int:
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    checked = set()
+    for band in range(bands):
+        block = np.ascontiguousarray(signatures[:, band * rows_per_band:(band + 1) * rows_per_band])
+        buckets = defaultdict(list)
+        for i in range(n):
+            buckets[block[i].tobytes()].append(i)
+
+        for members in buckets.values():
+            for pos, i in enumerate(members):
+                for j in members[pos + 1:]:
+                    if (i, j) in checked:
+                        continue
+                    checked.add((i, j))
+                    if np.mean(signatures[i] == signatures[j]) >= threshold:
+                        root_i, root_j = find(i), find(j)
+                        if root_i != root_j:
+                            parent[max(root_i, root_j)] = min(root_i, root_j)
+
+    return np.array([find(i) for i in range(n)], dtype='int64')
+
+
+def collapse_near_duplicates(
+    documents: List[Dict],
+    threshold: float = 0.8,
+    num_perm: int = 128,
+    bands: int = 16
+) -> Tuple[List[Dict], Dict]:
+    """
+    Near-duplicate dokümanları canonical dokümanlara indirger
+
+    Kümede cevabı en uzun olan doküman (eşitlikte en küçük ID) canonical olur;
+    diğerlerinin ID'leri `aliases` alanına yazılır. Doküman sırası korunur.
+    Farklı source / focus_area'daki kopyalar ayrı kalır (FILTER_FIELDS).
+
+    Returns:
+        (canonical_docs, report)
+    """
+    if not documents:
+        return [], {'documents_before': 0, 'documents_after': 0, 'clusters': 0, 'removed': 0}
+
+    signatures = minhash_signatures([doc['text'] for doc in documents], num_perm=num_perm)
+    labels = find_near_duplicates(signatures, threshold=threshold, bands=bands)
+
+    clusters = defaultdict(list)
+    for row, label in enumerate(labels.tolist()):
+        clusters[(label,) + tuple(documents[row].get(name) for name in FILTER_FIELDS)].append(row)
+
+    keep = {}
+    for rows in clusters.values():
+        canonical = max(rows, key=lambda r: (len(documents[r]['answer']), -documents[r]['id']))
+        keep[canonical] = [documents[r]['id'] for r in rows if r != canonical]
+
+    canonical_docs = []
+    for row, doc in enumerate(documents):
+        if row in keep:
+            canonical_docs.append({**doc, 'aliases': ",".join(str(i) for i in sorted(keep[row]))})
+
+    duplicate_clusters = sum(1 for rows in clusters.values() if len(rows) > 1)
+    # Near-duplicate olduğu halde filtre alanları farklı olduğu için ayrı kalanlar
+    kept_for_filters = len(keep) - len(np.unique(labels))
+    chars_before = sum(len(doc['text']) for doc in documents)
+    chars_after = sum(len(doc['text']) for doc in canonical_docs)
+    report = {
+        'documents_before': len(documents),
+        'documents_after': len(canonical_docs),
+        'clusters': duplicate_clusters,
+        'removed': len(documents) - len(canonical_docs),
+        'kept_for_filters': kept_for_filters,
+        'chars_before': chars_before,
+        'chars_after': chars_after,
+        'shrink_ratio': 1 - len(canonical_docs) / len(documents)
+    }
+    print(f"✓ Near-duplicate: {report['removed']} doküman {duplicate_clusters} kümeye birleştirildi "
+          f"({len(documents)} -> {len(canonical_docs)}, %{report['shrink_ratio'] * 100:.1f} küçülme, "
+          f"{kept_for_filters} kopya farklı source/focus_area nedeniyle ayrı bırakıldı)")
+    return canonical_docs, report
+
+
+def parse_aliases(value: str) -> List[int]:
+    """`aliases` alanını ID listesine çevirir"""
+    return [int(part) for part in value.split(",") if part]
@@ -0,0 +1,649 @@
+"""
+Columnar doküman deposu - offset-indexed, memory-map ile okunur
+
+Disk formatı (bir klasör):
+- meta.json              : doküman sayısı, kolon tipleri, kategoriler, vector store metadata
+- <kolon>.offsets.npy    : string kolonlar için int64 offset dizisi (N+1)
+- <kolon>.data.bin       : UTF-8 byte arena (tüm değerler art arda)
+- <kolon>.npy            : int kolonlar için int64 dizi
+- <kolon>.codes.npy      : kategorik kolonlar (source, focus_area) için int32 kodlar
+- deleted.npy            : tombstone maskesi (silinmiş / güncellenmiş satırlar)
+
+Açılışta hiçbir şey kopyalanmaz: dosyalar memory-map edilir, böylece aynı
+index'i kullanan tüm worker process'ler page-cache sayfalarını paylaşır ve
+doküman metni sadece döndürülen k sonuç için decode edilir.
+
+`text` alanı saklanmaz; question + answer'dan erişimde türetilir.
+
+Dosyalar her zaman geçici dosyaya yazılıp os.replace ile değiştirilir; böylece
+memory-map ile açık bir depo üzerine kaydetmek okuyan process'leri bozmaz.
+"""
+import json
+import os
+import pickle
+import numpy as np
+from collections import OrderedDict
+from collections.abc import Mapping
+from typing import List, Dict, Iterator, Optional, Union, Iterable
+
+
+def atomic_write(path: str, write_fn):
+    """Geçici dosyaya yazar, sonra atomik olarak yerine taşır"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        write_fn(f)
+    os.replace(tmp_path, path)
+
+
+def _derive_text(store: "DocumentStore", idx: int) -> str:
+    return f"Question: {store.get_field(idx, 'question')}\nAnswer: {store.get_field(idx, 'answer')}"
+
+
+class DocumentView(Mapping):
+    """
+    Depodaki tek bir satırın hafif görünümü
+
+    Alanlar erişildiğinde materialize edilir. search() sonuçlarına eklenen
+    alanlar (similarity_score gibi) satırın kendisine değil view'a yazılır.
+    """
+
+    __slots__ = ('_store', '_row', '_extra')
+
+    def __init__(self, store: "DocumentStore", row: int, extra: Optional[Dict] = None):
+        self._store = store
+        self._row = row
+        self._extra = extra if extra is not None else {}
+
+    def __getitem__(self, key: str):
+        if key in self._extra:
+            return self._extra[key]
+        return self._store.get_field(self._row, key)
+
+    def __setitem__(self, key: str, value):
+        self._extra[key] = value
+
+    def __contains__(self, key) -> bool:
+        return key in self._extra or key in self._store.field_names
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self._store.field_names
+        for key in self._extra:
+            if key not in self._store.field_names:
+                yield key
+
+    def __len__(self) -> int:
+        return len(self._store.field_names) + sum(1 for key in self._extra if key not in self._store.field_names)
+
+    @property
+    def row(self) -> int:
+        return self._row
+
+    def copy(self) -> "DocumentView":
+        return DocumentView(self._store, self._row, dict(self._extra))
+
+    def to_dict(self) -> Dict:
+        """Tüm alanları normal dict olarak materialize eder"""
+        return {key: self[key] for key in self}
+
+    def __repr__(self) -> str:
+        return f"DocumentView(row={self._row}, {self.to_dict()!r})"
+
+
+class DocumentStore:
+    """Offset-indexed columnar doküman deposu"""
+
+    META_FILE = "meta.json"
+
+    # Az sayıda farklı değere sahip alanlar kod + kategori listesi olarak saklanır
+    CATEGORICAL_FIELDS = ("source", "focus_area")
+
+    # Saklanmayan, erişimde hesaplanan alanlar
+    DERIVED_FIELDS = {'text': _derive_text}
+
+    # Son kullanılan filtre maskeleri (aynı filtre tekrar tekrar geliyor)
+    MASK_CACHE_SIZE = 32
+
+    def __init__(
+        self,
+        num_docs: int,
+        columns: Dict[str, Dict],
+        metadata: Optional[Dict] = None,
+        deleted: Optional[np.ndarray] = None
+    ):
+        """
+        Args:
+            num_docs: Doküman sayısı (silinmişler dahil)
+            columns: kolon adı -> {'type': 'str'|'int'|'cat', ...numpy dizileri}
+            metadata: Vector store ayarları (meta.json içinde saklanır)
+            deleted: Tombstone maskesi (None = hiç silinmiş satır yok)
+        """
+        self.num_docs = num_docs
+        self.columns = columns
+        self.metadata = metadata or {}
+        self._deleted = deleted if deleted is not None else np.zeros(num_docs, dtype=bool)
+
+        # append() ile eklenen, henüz ana dizilere birleştirilmemiş parçalar
+        # (chunk chunk build'de her append'de tüm kolonları kopyalamamak için).
+        # Yazma yolu (next_id / contains_ids / append) birleştirme yapmaz; sadece
+        # okuma ve save birleştirir, böylece chunk chunk build lineer kalır
+        self._pending = []
+        self._pending_ids = set()
+        self._max_id = None
+
+        self.field_names = list(columns.keys())
+        for name in self.DERIVED_FIELDS:
+            if name not in columns and {'question', 'answer'} <= set(columns):
+                self.field_names.append(name)
+
+        # Kategorik kolon başına posting list'ler (ilk filtrede bir kez hesaplanır)
+        self._postings = {}
+        self._mask_cache = OrderedDict()
+
+        # Stabil doküman ID -> satır eşlemesi ve canlı satır maskesi (lazy)
+        self._id_index = None
+        self._alive_mask = None
+
+    # ==================== BUILD ====================
+
+    @classmethod
+    def _column_type(cls, name: str, values: List) -> str:
+        if all(isinstance(v, (int, np.integer)) and not isinstance(v, bool) for v in values):
+            return 'int'
+        if name in cls.CATEGORICAL_FIELDS:
+            return 'cat'
+        return 'str'
+
+    @staticmethod
+    def _build_column(column_type: str, values: List, categories: Optional[List[str]] = None) -> Dict:
+        """
+        Değer listesinden kolon oluşturur
+
+        categories verilirse (append) mevcut kodlar korunur, yeni değerler sona eklenir.
+        """
+        if column_type == 'int':
+            return {'type': 'int', 'values': np.asarray([-1 if v is None else v for v in values], dtype='int64')}
+
+        strings = ["" if v is None else str(v) for v in values]
+
+        if column_type == 'cat':
+            if categories is None:
+                unique, codes = np.unique(np.asarray(strings, dtype=object), return_inverse=True)
+                return {
+                    'type': 'cat',
+                    'codes': codes.astype('int32'),
+                    'categories': [str(c) for c in unique]
+                }
+
+            categories = list(categories)
+            lookup = {c: code for code, c in enumerate(categories)}
+            codes = np.empty(len(strings), dtype='int32')
+            for i, value in enumerate(strings):
+                if value not in lookup:
+                    lookup[value] = len(categories)
+                    categories.append(value)
+                codes[i] = lookup[value]
+            return {'type': 'cat', 'codes': codes, 'categories': categories}
+
+        encoded = [v.encode('utf-8') for v in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype='int64')
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        return {
+            'type': 'str',
+            'offsets': offsets,
+            'data': np.frombuffer(b"".join(encoded), dtype='uint8')
+        }
+
+    @classmethod
+    def from_documents(cls, documents: List[Dict], metadata: Optional[Dict] = None) -> "DocumentStore":
+        """list-of-dicts dokümanlardan columnar depo oluşturur"""
+        columns = {}
+        field_names = list(documents[0].keys()) if documents else []
+
+        for name in field_names:
+            if name in cls.DERIVED_FIELDS:
+                continue
+
+            values = [doc.get(name) for doc in documents]
+            columns[name] = cls._build_column(cls._column_type(name, values), values)
+
+        return cls(len(documents), columns, metadata)
+
+    def append(self, documents: List[Dict]) -> np.ndarray:
+        """
+        Dokümanları sona ekler (mevcut satırlar ve kategori kodları değişmez)
+
+        Returns:
+            Eklenen satır numaraları
+        """
+        start = self.num_docs
+        if not documents:
+            return np.arange(start, start, dtype='int64')
+
+        if not self.columns:
+            fresh = self.from_documents(documents, self.metadata)
+            self.columns = fresh.columns
+            self.field_names = fresh.field_names
+            self._deleted = np.zeros(len(documents), dtype=bool)
+            self._id_index = None
+        else:
+            pieces = {}
+            for name, column in self.columns.items():
+                values = [doc.get(name) for doc in documents]
+                pieces[name] = self._build_column(column['type'], values, column.get('categories'))
+
+                # Kategori listesi hemen güncellenir (sonraki append'ler aynı kodları kullanır)
+                if column['type'] == 'cat':
+                    column['categories'] = pieces[name]['categories']
+            self._pending.append((pieces, len(documents)))
+            if 'id' in pieces:
+                self._pending_ids.update(pieces['id']['values'].tolist())
+
+        if self._max_id is not None and self.columns.get('id', {}).get('type') == 'int':
+            self._max_id = max(self._max_id, max((-1 if doc.get('id') is None else doc['id']) for doc in documents))
+
+        self.num_docs += len(documents)
+        self._invalidate()
+        return np.arange(start, self.num_docs, dtype='int64')
+
+    def _consolidate(self):
+        """Bekleyen append parçalarını tek seferde ana kolonlara birleştirir"""
+        if not self._pending:
+            return
+
+        for name, column in self.columns.items():
+            pieces = [piece[name] for piece, _ in self._pending]
+
+            if column['type'] == 'int':
+                column['values'] = np.concatenate([column['values']] + [p['values'] for p in pieces])
+            elif column['type'] == 'cat':
+                column['codes'] = np.concatenate([column['codes']] + [p['codes'] for p in pieces])
+            else:
+                offsets = [np.asarray(column['offsets'])]
+                base = int(offsets[0][-1])
+                for p in pieces:
+                    offsets.append(p['offsets'][1:] + base)
+                    base += int(p['offsets'][-1])
+                column['offsets'] = np.concatenate(offsets)
+                column['data'] = np.concatenate([column['data']] + [p['data'] for p in pieces])
+
+        n_new = sum(n for _, n in self._pending)
+        self._deleted = np.concatenate([self._deleted, np.zeros(n_new, dtype=bool)])
+        self._pending = []
+        self._pending_ids = set()
+        self._id_index = None
+
+    def _invalidate(self):
+        """
+        Satırlar eklenince türetilmiş index'leri sıfırla
+
+        ID index'i sadece birleştirilmiş satırları kapsar; bekleyen satırlar
+        _pending_ids'de tutulur, bu yüzden append'de sıfırlanmaz.
+        """
+        self._postings = {}
+        self._mask_cache = OrderedDict()
+        self._alive_mask = None
+
+    # ==================== TOMBSTONES & IDS ====================
+
+    @property
+    def deleted(self) -> np.ndarray:
+        """Tombstone maskesi (True = silinmiş)"""
+        self._consolidate()
+        return self._deleted
+
+    @property
+    def num_alive(self) -> int:
+        # Bekleyen (append edilmiş) satırlar silinmiş olamaz: birleştirme gerekmez
+        return self.num_docs - int(self._deleted.sum())
+
+    @property
+    def alive_mask(self) -> Optional[np.ndarray]:
+        """Silinmemiş satırlar için maske (hiç silinmiş satır yoksa None)"""
+        if not self.deleted.any():
+            return None
+        if self._alive_mask is None:
+            self._alive_mask = ~self.deleted
+        return self._alive_mask
+
+    def delete_rows(self, rows: np.ndarray):
+        """Satırları tombstone ile siler (veri compaction'a kadar diskte kalır)"""
+        self.deleted[np.asarray(rows, dtype='int64')] = True
+        self._id_index = None
+        self._alive_mask = None
+
+    def next_id(self) -> int:
+        """Yeni doküman için kullanılmamış stabil ID (en büyük ID append'lerde güncel tutulur)"""
+        if 'id' not in self.columns or self.num_docs == 0:
+            return 0
+
+        if self._max_id is None:
+            values = [np.asarray(self.columns['id']['values'])]
+            values += [piece['id']['values'] for piece, _ in self._pending]
+            self._max_id = max((int(v.max()) for v in values if len(v)), default=-1)
+        return self._max_id + 1
+
+    def _sorted_id_index(self):
+        """Birleştirilmiş canlı satırlar için (sıralı ID'ler, satırlar); bekleyen satırları kapsamaz"""
+        if self._id_index is None:
+            alive_rows = np.flatnonzero(~self._deleted)
+            ids = np.asarray(self.columns['id']['values'])[alive_rows]
+            order = np.argsort(ids, kind='stable')
+            self._id_index = (ids[order], alive_rows[order])
+        return self._id_index
+
+    def contains_ids(self, doc_ids: Iterable[int]) -> np.ndarray:
+        """
+        Her ID için canlı bir satır var mı (yazma yolu: bekleyen append'ler birleştirilmez)
+
+        Birleştirilmiş satırlar sıralı ID index'inde, bekleyen satırlar
+        _pending_ids kümesinde aranır.
+        """
+        doc_ids = np.asarray(list(doc_ids), dtype='int64')
+        if 'id' not in self.columns or len(doc_ids) == 0:
+            return np.zeros(len(doc_ids), dtype=bool)
+
+        sorted_ids, _ = self._sorted_id_index()
+        found = np.zeros(len(doc_ids), dtype=bool)
+        if len(sorted_ids):
+            pos = np.minimum(np.searchsorted(sorted_ids, doc_ids), len(sorted_ids) - 1)
+            found = sorted_ids[pos] == doc_ids
+        if self._pending_ids:
+            found |= np.fromiter((i in self._pending_ids for i in doc_ids.tolist()), dtype=bool, count=len(doc_ids))
+        return found
+
+    def rows_for_ids(self, doc_ids: Iterable[int]) -> np.ndarray:
+        """
+        Stabil doküman ID'lerini canlı satır numaralarına çevirir
+
+        Bulunamayan (veya silinmiş) ID'ler için -1 döner.
+        """
+        doc_ids = np.asarray(list(doc_ids), dtype='int64')
+        self._consolidate()
+        if 'id' not in self.columns or len(doc_ids) == 0:
+            return np.full(len(doc_ids), -1, dtype='int64')
+
+        sorted_ids, rows = self._sorted_id_index()
+        result = np.full(len(doc_ids), -1, dtype='int64')
+        if len(sorted_ids) == 0:
+            return result
+
+        pos = np.minimum(np.searchsorted(sorted_ids, doc_ids), len(sorted_ids) - 1)
+        found = sorted_ids[pos] == doc_ids
+        result[found] = rows[pos[found]]
+        return result
+
+    def take(self, rows: np.ndarray) -> "DocumentStore":
+        """
+        Verilen satırlardan yeni (compact) depo oluşturur
+
+        Kolonlar toplu dilimlenir (satır satır decode / encode yok); kategori
+        listeleri ve kodlar aynen korunur.
+        """
+        self._consolidate()
+        rows = np.asarray(rows, dtype='int64')
+
+        columns = {}
+        for name, column in self.columns.items():
+            if column['type'] == 'int':
+                columns[name] = {'type': 'int', 'values': np.asarray(column['values'])[rows]}
+            elif column['type'] == 'cat':
+                columns[name] = {
+                    'type': 'cat',
+                    'codes': np.asarray(column['codes'])[rows],
+                    'categories': list(column['categories'])
+                }
+            else:
+                # Seçilen satırların byte aralıkları tek gather ile yeni arenaya kopyalanır
+                old_offsets = np.asarray(column['offsets'])
+                starts = old_offsets[rows]
+                lengths = old_offsets[rows + 1] - starts
+                offsets = np.zeros(len(rows) + 1, dtype='int64')
+                np.cumsum(lengths, out=offsets[1:])
+                positions = np.repeat(starts - offsets[:-1], lengths) + np.arange(offsets[-1], dtype='int64')
+                columns[name] = {
+                    'type': 'str',
+                    'offsets': offsets,
+                    'data': np.asarray(column['data'])[positions]
+                }
+
+        store = DocumentStore(len(rows), columns, self.metadata)
+        store.field_names = list(self.field_names)
+        return store
+
+    # ==================== ACCESS ====================
+
+    def __len__(self) -> int:
+        return self.num_docs
+
+    def get_field(self, idx: int, name: str):
+        """Tek bir alanı materialize eder (diğer kolonlara dokunmaz)"""
+        if self._pending:
+            self._consolidate()
+        column = self.columns.get(name)
+        if column is None:
+            if name in self.field_names:
+                return self.DERIVED_FIELDS[name](self, idx)
+            raise KeyError(name)
+
+        if column['type'] == 'int':
+            return int(column['values'][idx])
+        if column['type'] == 'cat':
+            return column['categories'][int(column['codes'][idx])]
+
+        offsets = column['offsets']
+        start, end = int(offsets[idx]), int(offsets[idx + 1])
+        return bytes(column['data'][start:end]).decode('utf-8')
+
+    def column_values(self, name: str) -> List:
+        """Bir kolonun tüm değerleri (tek seferde, satır satır get_field'den çok daha hızlı)"""
+        self._consolidate()
+        column = self.columns.get(name)
+        if column is None:
+            if name == 'text' and name in self.field_names:
+                return [
+                    f"Question: {question}\nAnswer: {answer}"
+                    for question, answer in zip(self.column_values('question'), self.column_values('answer'))
+                ]
+            raise KeyError(name)
+
+        if column['type'] == 'int':
+            return np.asarray(column['values']).tolist()
+        if column['type'] == 'cat':
+            categories = column['categories']
+            return [categories[code] for code in np.asarray(column['codes']).tolist()]
+
+        data = bytes(column['data'])
+        offsets = np.asarray(column['offsets']).tolist()
+        return [data[start:end].decode('utf-8') for start, end in zip(offsets, offsets[1:])]
+
+    def to_documents(self) -> List[Dict]:
+        """Canlı satırları list-of-dicts olarak materialize eder"""
+        values = {name: self.column_values(name) for name in self.field_names}
+        rows = np.flatnonzero(~self.deleted).tolist()
+        return [{name: values[name][row] for name in self.field_names} for row in rows]
+
+    def categories(self, name: str) -> List[str]:
+        """Kategorik kolonun farklı değerleri"""
+        return list(self.columns[name]['categories'])
+
+    # ==================== FILTERING ====================
+
+    def _posting_index(self, name: str):
+        """
+        Kategorik kolon için per-value ID listeleri
+
+        Kodlar stable argsort ile gruplanır: değer c'nin satırları
+        order[starts[c]:starts[c + 1]] (artan sırada).
+        """
+        if name not in self._postings:
+            self._consolidate()
+            column = self.columns.get(name)
+            if column is None or column['type'] != 'cat':
+                raise ValueError(f"Filtre sadece kategorik alanlarda desteklenir: {name}")
+
+            codes = np.asarray(column['codes'])
+            order = np.argsort(codes, kind='stable').astype('int64')
+            starts = np.zeros(len(column['categories']) + 1, dtype='int64')
+            np.cumsum(np.bincount(codes, minlength=len(column['categories'])), out=starts[1:])
+            lookup = {category.lower(): code for code, category in enumerate(column['categories'])}
+            self._postings[name] = (order, starts, lookup)
+
+        return self._postings[name]
+
+    def ids_for_values(self, name: str, values: Iterable[str]) -> np.ndarray:
+        """Verilen değerlerden birine sahip satır ID'leri (büyük/küçük harf duyarsız)"""
+        order, starts, lookup = self._posting_index(name)
+        codes = sorted({lookup[v.lower()] for v in values if v is not None and v.lower() in lookup})
+        if not codes:
+            return np.zeros(0, dtype='int64')
+        return np.concatenate([order[starts[c]:starts[c + 1]] for c in codes])
+
+    def filter_mask(self, filters: Dict[str, Union[str, Iterable[str]]]) -> np.ndarray:
+        """
+        Filtreye uyan satırlar için boolean maske
+
+        Args:
+            filters: alan -> değer veya değer listesi
+                Aynı alan içinde OR, alanlar arasında AND uygulanır.
+                Örnek: {'focus_area': ['Hypertension', 'Diabetes'], 'source': 'NIHSeniorHealth'}
+        """
+        normalized = tuple(sorted(
+            (name, tuple(sorted([values] if isinstance(values, str) else set(values))))
+            for name, values in filters.items()
+        ))
+        if normalized in self._mask_cache:
+            self._mask_cache.move_to_end(normalized)
+            return self._mask_cache[normalized]
+
+        mask = np.ones(self.num_docs, dtype=bool)
+        for name, values in normalized:
+            field_mask = np.zeros(self.num_docs, dtype=bool)
+            field_mask[self.ids_for_values(name, values)] = True
+            mask &= field_mask
+
+        self._mask_cache[normalized] = mask
+        if len(self._mask_cache) > self.MASK_CACHE_SIZE:
+            self._mask_cache.popitem(last=False)
+        return mask
+
+    def __getitem__(self, idx: int) -> DocumentView:
+        """Tek bir doküman için hafif row view döndürür"""
+        idx = int(idx)
+        if idx < 0:
+            idx += self.num_docs
+        if not 0 <= idx < self.num_docs:
+            raise IndexError(f"Doküman index'i aralık dışında: {idx}")
+        return DocumentView(self, idx)
+
+    def __iter__(self) -> Iterator[DocumentView]:
+        for idx in range(self.num_docs):
+            yield self[idx]
+
+    # ==================== PERSISTENCE ====================
+
+    def save(self, path: str):
+        """Depoyu klasöre yazar"""
+        self._consolidate()
+        os.makedirs(path, exist_ok=True)
+
+        def save_array(filename: str, array: np.ndarray):
+            atomic_write(os.path.join(path, filename), lambda f: np.save(f, np.asarray(array)))
+
+        column_meta = {}
+        for name, column in self.columns.items():
+            column_meta[name] = {'type': column['type']}
+            if column['type'] == 'int':
+                save_array(f"{name}.npy", column['values'])
+            elif column['type'] == 'cat':
+                save_array(f"{name}.codes.npy", column['codes'])
+                column_meta[name]['categories'] = list(column['categories'])
+            else:
+                save_array(f"{name}.offsets.npy", column['offsets'])
+                atomic_write(
+                    os.path.join(path, f"{name}.data.bin"),
+                    lambda f, data=column['data']: f.write(memoryview(np.ascontiguousarray(data)))
+                )
+
+        save_array("deleted.npy", self._deleted)
+
+        meta = {
+            'num_docs': self.num_docs,
+            'columns': column_meta,
+            'metadata': self.metadata
+        }
+        atomic_write(
+            os.path.join(path, self.META_FILE),
+            lambda f: f.write(json.dumps(meta, indent=2).encode('utf-8'))
+        )
+
+    @classmethod
+    def exists(cls, path: str) -> bool:
+        return os.path.exists(os.path.join(path, cls.META_FILE))
+
+    @classmethod
+    def open(cls, path: str, mmap: bool = True) -> "DocumentStore":
+        """Depoyu açar (mmap=True: kopyasız, sadece okunan sayfalar RAM'e gelir)"""
+        with open(os.path.join(path, cls.META_FILE), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+
+        mmap_mode = 'r' if mmap else None
+        columns = {}
+        for name, column_meta in meta['columns'].items():
+            # İlk sürümde kolon meta'sı sadece tip string'iydi
+            if isinstance(column_meta, str):
+                column_meta = {'type': column_meta}
+
+            column_type = column_meta['type']
+            if column_type == 'int':
+                columns[name] = {
+                    'type': 'int',
+                    'values': np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode)
+                }
+            elif column_type == 'cat':
+                columns[name] = {
+                    'type': 'cat',
+                    'codes': np.load(os.path.join(path, f"{name}.codes.npy"), mmap_mode=mmap_mode),
+                    'categories': column_meta['categories']
+                }
+            else:
+                columns[name] = {
+                    'type': 'str',
+                    'offsets': np.load(os.path.join(path, f"{name}.offsets.npy"), mmap_mode=mmap_mode),
+                    'data': cls._load_arena(os.path.join(path, f"{name}.data.bin"), mmap)
+                }
+
+        # Tombstone maskesi değiştirilebilir olmalı, memory-map edilmez
+        deleted_path = os.path.join(path, "deleted.npy")
+        deleted = np.load(deleted_path) if os.path.exists(deleted_path) else None
+
+        return cls(meta['num_docs'], columns, meta.get('metadata', {}), deleted)
+
+    @staticmethod
+    def _load_arena(path: str, mmap: bool) -> np.ndarray:
+        # Boş dosya memory-map edilemez
+        if os.path.getsize(path) == 0:
+            return np.zeros(0, dtype='uint8')
+        if mmap:
+            return np.memmap(path, dtype='uint8', mode='r')
+        return np.fromfile(path, dtype='uint8')
+
+    # ==================== MIGRATION ====================
+
+    @classmethod
+    def migrate_pickle(cls, docs_path: str = "documents.pkl", store_path: str = "document_store") -> "DocumentStore":
+        """
+        Eski pickle formatını (list-of-dicts veya {'documents', 'metadata'})
+        columnar depoya çevirir ve kaydeder
+        """
+        with open(docs_path, 'rb') as f:
+            data = pickle.load(f)
+
+        if isinstance(data, dict) and 'documents' in data:
+            documents, metadata = data['documents'], data.get('metadata', {})
+        else:
+            documents, metadata = data, {}
+
+        store = cls.from_documents(documents, metadata)
+        store.save(store_path)
+        print(f"✓ {len(store)} doküman columnar formata taşındı: {store_path}")
+        return store
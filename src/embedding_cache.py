@@ -0,0 +1,147 @@
+"""
+Kalıcı embedding cache (SQLite)
+
+Anahtar: model adı + normalize edilmiş metnin hash'i. Hem index build hem de
+sorgu zamanındaki encode_single aynı cache'i kullanır; böylece parametre
+değişikliği sonrası rebuild'de transformer'a sadece yeni metinler gider.
+Boyut sınırı aşılınca en uzun süredir kullanılmayan kayıtlar silinir.
+"""
+import hashlib
+import sqlite3
+import threading
+import time
+import numpy as np
+from typing import List, Optional
+
+# SQLite tek sorguda sınırlı sayıda parametre kabul eder
+_CHUNK_SIZE = 500
+
+# Hit'lerin last_access güncellemeleri biriktirilip toplu yazılır
+_TOUCH_FLUSH_SIZE = 1024
+_TOUCH_FLUSH_SECONDS = 30.0
+
+
+def normalize_text(text: str) -> str:
+    """Cache anahtarı için metni normalize eder (boşlukları sadeleştir)"""
+    return " ".join(text.split())
+
+
+class EmbeddingCache:
+    """SQLite tabanlı, boyut sınırlı embedding cache"""
+
+    def __init__(self, path: str = "embedding_cache.sqlite", max_entries: int = 2_000_000):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+        # Streamlit farklı thread'lerden çağırabilir; erişim lock ile serileştirilir
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key BLOB PRIMARY KEY,
+                model TEXT NOT NULL,
+                dim INTEGER NOT NULL,
+                vector BLOB NOT NULL,
+                last_access INTEGER NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_access ON embeddings(last_access)")
+        self.conn.commit()
+
+        # Satır sayısı bir kez okunur, sonra put'larla güncel tutulur (her put'ta COUNT(*) yok)
+        self._count = self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        self._pending_touch = {}
+        self._last_flush = time.monotonic()
+
+    @staticmethod
+    def make_key(model_name: str, text: str) -> bytes:
+        payload = f"{model_name}\x00{normalize_text(text)}".encode('utf-8')
+        return hashlib.blake2b(payload, digest_size=16).digest()
+
+    def get_many(self, model_name: str, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """Her metin için cache'teki vektör (yoksa None)"""
+        keys = [self.make_key(model_name, text) for text in texts]
+        found = {}
+
+        with self._lock:
+            for start in range(0, len(keys), _CHUNK_SIZE):
+                chunk = list(set(keys[start:start + _CHUNK_SIZE]))
+                placeholders = ",".join("?" * len(chunk))
+                rows = self.conn.execute(
+                    f"SELECT key, dim, vector FROM embeddings WHERE key IN ({placeholders})",
+                    chunk
+                ).fetchall()
+                for key, dim, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype='float32', count=dim)
+
+            # LRU bilgisi: erişim zamanları biriktirilir, toplu yazılır
+            if found:
+                now = time.time_ns()
+                for key in found:
+                    self._pending_touch[key] = now
+                if (len(self._pending_touch) >= _TOUCH_FLUSH_SIZE
+                        or time.monotonic() - self._last_flush >= _TOUCH_FLUSH_SECONDS):
+                    self._flush_touches()
+                    self.conn.commit()
+
+        return [found.get(key) for key in keys]
+
+    def _flush_touches(self):
+        """Biriken last_access güncellemelerini yazar (lock altında çağrılır)"""
+        if self._pending_touch:
+            self.conn.executemany(
+                "UPDATE embeddings SET last_access = ? WHERE key = ?",
+                [(ts, key) for key, ts in self._pending_touch.items()]
+            )
+            self._pending_touch = {}
+        self._last_flush = time.monotonic()
+
+    def put_many(self, model_name: str, texts: List[str], vectors: np.ndarray):
+        """Vektörleri cache'e yazar ve gerekiyorsa eski kayıtları siler"""
+        vectors = np.asarray(vectors, dtype='float32')
+        now = time.time_ns()
+        rows = [
+            (self.make_key(model_name, text), model_name, int(vector.shape[0]), vector.tobytes(), now)
+            for text, vector in zip(texts, vectors)
+        ]
+
+        with self._lock:
+            # Aynı anahtar aynı vektörü verir: var olan kayıt değiştirilmez,
+            # böylece total_changes farkı tam olarak yeni satır sayısıdır
+            changes_before = self.conn.total_changes
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (key, model, dim, vector, last_access) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            self._count += self.conn.total_changes - changes_before
+            self._evict()
+            self.conn.commit()
+
+    def _evict(self):
+        """Boyut sınırı aşıldıysa en eski %10'u siler (lock altında çağrılır)"""
+        if self._count <= self.max_entries:
+            return
+
+        # LRU sırası güncel olsun
+        self._flush_touches()
+        target = int(self.max_entries * 0.9)
+        cursor = self.conn.execute(
+            """
+            DELETE FROM embeddings WHERE key IN (
+                SELECT key FROM embeddings ORDER BY last_access ASC LIMIT ?
+            )
+            """,
+            (self._count - target,)
+        )
+        self._count -= cursor.rowcount
+
+    def __len__(self) -> int:
+        return self._count
+
+    def close(self):
+        with self._lock:
+            self._flush_touches()
+            self.conn.commit()
+            self.conn.close()
@@ -1,32 +1,266 @@
 """
 HuggingFace embedding modülü
+
+Backend'ler:
+- torch     : tam hassasiyetli PyTorch SentenceTransformer (varsayılan)
+- onnx-int8 : ONNX Runtime + dinamik int8 quantize edilmiş model (GPU'suz node'lar için)
+              Opsiyonel gereksinimler: pip install -r requirements-onnx.txt
+              (yüklü değilse uyarı verilip torch backend'e düşülür)
+
+sentence-transformers / torch import'u pahalı olduğundan model yüklenirken yapılır.
 """
-from sentence_transformers import SentenceTransformer
-from typing import List
+import os
+import re
+import threading
+from importlib import metadata, util
+from typing import List, Optional, Dict
 import numpy as np
+from src.embedding_cache import EmbeddingCache
+
+BACKENDS = ("torch", "onnx-int8")
+DEFAULT_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+def onnx_backend_available() -> bool:
+    """onnx-int8 için gereken paketler kurulu mu (sentence-transformers import edilmeden)"""
+    if util.find_spec("optimum") is None or util.find_spec("onnxruntime") is None:
+        return False
+    try:
+        version = metadata.version("sentence-transformers")
+    except metadata.PackageNotFoundError:
+        return False
+    return tuple(int(part) for part in re.findall(r"\d+", version)[:2]) >= (3, 2)
+
+
+def resolve_backend(backend: str) -> str:
+    """İstenen backend'in bağımlılıkları yoksa uyarı verip torch'a düşer"""
+    if backend == "onnx-int8" and not onnx_backend_available():
+        print("⚠️ onnx-int8 backend için sentence-transformers>=3.2, optimum ve onnxruntime gerekli "
+              "(pip install -r requirements-onnx.txt); torch backend kullanılıyor")
+        return "torch"
+    return backend
+
+
+def embedding_namespace(model_name: str, backend: str = "torch", onnx_quantization: str = "avx2") -> str:
+    """Model + backend kimliği (int8 vektörleri fp32 vektörlerle karışmasın diye)"""
+    return model_name if backend == "torch" else f"{model_name}#{backend}-{onnx_quantization}"
+
 
 class EmbeddingModel:
     """HuggingFace SentenceTransformer ile embedding oluşturur"""
-    
-    def __init__(self, model_name: str = "sentence-transformers/all-MiniLM-L6-v2"):
-        print(f"Embedding modeli yükleniyor: {model_name}")
-        self.model = SentenceTransformer(model_name)
+
+    def __init__(
+        self,
+        model_name: str = DEFAULT_MODEL_NAME,
+        cache: Optional[EmbeddingCache] = None,
+        backend: str = "torch",
+        onnx_quantization: str = "avx2",
+        onnx_dir: str = "onnx_models"
+    ):
+        """
+        Args:
+            model_name: HuggingFace model adı
+            cache: Opsiyonel kalıcı embedding cache (model adı + metin hash'i ile)
+            backend: "torch" veya "onnx-int8"
+            onnx_quantization: int8 quantization profili (arm64, avx2, avx512, avx512_vnni)
+            onnx_dir: Quantize edilmiş modelin export edildiği klasör
+        """
+        if backend not in BACKENDS:
+            raise ValueError(f"Bilinmeyen embedding backend: {backend} (seçenekler: {', '.join(BACKENDS)})")
+        backend = resolve_backend(backend)
+
+        print(f"Embedding modeli yükleniyor: {model_name} ({backend})")
+        self.model_name = model_name
+        self.backend = backend
+        if backend == "torch":
+            from sentence_transformers import SentenceTransformer
+            self.model = SentenceTransformer(model_name)
+        else:
+            self.model = self._load_onnx_int8(model_name, onnx_quantization, onnx_dir)
+
+        # int8 vektörleri fp32 vektörlerle aynı cache kaydını paylaşmasın
+        self.cache_namespace = embedding_namespace(model_name, backend, onnx_quantization)
+        self.cache = cache
         print("✓ Model yüklendi")
-        
-    def encode(self, texts: List[str], show_progress: bool = True) -> np.ndarray:
-        """Metinleri vektörlere çevirir"""
-        embeddings = self.model.encode(
+
+    @staticmethod
+    def _load_onnx_int8(model_name: str, quantization: str, onnx_dir: str):
+        """
+        int8 ONNX modelini yükler; yoksa bir kez export + quantize edip diske yazar
+        """
+        try:
+            from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+        except ImportError as e:
+            raise ValueError(
+                "onnx-int8 backend için sentence-transformers>=3.2 ve "
+                "'pip install \"sentence-transformers[onnx]\"' gerekli"
+            ) from e
+
+        local_path = os.path.join(onnx_dir, model_name.replace("/", "__"))
+        file_name = f"onnx/model_qint8_{quantization}.onnx"
+
+        if not os.path.exists(os.path.join(local_path, file_name)):
+            print(f"int8 ONNX modeli export ediliyor ({quantization}) -> {local_path}")
+            base = SentenceTransformer(model_name, backend="onnx", device="cpu")
+            base.save(local_path)
+            export_dynamic_quantized_onnx_model(base, quantization, local_path)
+
+        return SentenceTransformer(
+            local_path,
+            backend="onnx",
+            device="cpu",
+            model_kwargs={"file_name": file_name, "provider": "CPUExecutionProvider"}
+        )
+
+    def _encode_uncached(self, texts: List[str], show_progress: bool) -> np.ndarray:
+        return self.model.encode(
             texts,
             show_progress_bar=show_progress,
             convert_to_numpy=True
         )
-        return embeddings
-    
+
+    def encode(self, texts: List[str], show_progress: bool = True) -> np.ndarray:
+        """Metinleri vektörlere çevirir (cache varsa sadece eksik olanlar modelden geçer)"""
+        if self.cache is None:
+            return self._encode_uncached(texts, show_progress)
+
+        cached = self.cache.get_many(self.cache_namespace, texts)
+        missing = [i for i, vector in enumerate(cached) if vector is None]
+
+        if missing:
+            # Aynı metin batch içinde birden fazla geçiyorsa bir kez encode et
+            unique_texts = list(dict.fromkeys(texts[i] for i in missing))
+            if len(texts) > 1:
+                print(f"Embedding cache: {len(texts) - len(missing)} hit, {len(unique_texts)} encode edilecek")
+            new_vectors = self._encode_uncached(unique_texts, show_progress)
+            self.cache.put_many(self.cache_namespace, unique_texts, new_vectors)
+
+            by_text = dict(zip(unique_texts, new_vectors))
+            for i in missing:
+                cached[i] = by_text[texts[i]]
+
+        if not cached:
+            return np.zeros((0, self.get_dimension()), dtype='float32')
+        return np.vstack(cached).astype('float32')
+
     def encode_single(self, text: str) -> np.ndarray:
         """Tek bir metni vektöre çevirir"""
+        if self.cache is not None:
+            return self.encode([text], show_progress=False)[0]
         return self.model.encode([text], convert_to_numpy=True)[0]
-    
+
     def get_dimension(self) -> int:
         """Embedding boyutunu döndürür"""
         return self.model.get_sentence_embedding_dimension()
 
+
+class BackgroundEmbeddingModel:
+    """
+    EmbeddingModel'i arka plan thread'inde yükler
+
+    Uygulama model hazır olmadan servis vermeye başlar; embedding gerektiren
+    ilk çağrı model yüklenene kadar bekler. model_name hemen kullanılabilir.
+    """
+
+    def __init__(self, model_name: str = DEFAULT_MODEL_NAME, **model_kwargs):
+        self.model_name = model_name
+        # Fallback burada çözülür: namespace yüklenen modelle aynı backend'i gösterir
+        if 'backend' in model_kwargs and model_kwargs['backend'] in BACKENDS:
+            model_kwargs['backend'] = resolve_backend(model_kwargs['backend'])
+        # Model yüklenmeden bilinir (cache / classifier anahtarları için)
+        self.cache_namespace = embedding_namespace(
+            model_name,
+            model_kwargs.get('backend', "torch"),
+            model_kwargs.get('onnx_quantization', "avx2")
+        )
+        self._model = None
+        self._error = None
+        self._ready = threading.Event()
+        self._thread = threading.Thread(
+            target=self._load,
+            args=(model_name, model_kwargs),
+            name="embedding-model-loader",
+            daemon=True
+        )
+        self._thread.start()
+
+    def _load(self, model_name: str, model_kwargs: Dict):
+        try:
+            self._model = EmbeddingModel(model_name, **model_kwargs)
+        except Exception as e:
+            print(f"⚠️ Embedding modeli yüklenemedi: {e}")
+            self._error = e
+        finally:
+            self._ready.set()
+
+    @property
+    def is_ready(self) -> bool:
+        """Model yüklendi mi (hata ile bittiyse de True)"""
+        return self._ready.is_set()
+
+    def wait(self) -> EmbeddingModel:
+        """Model yüklenene kadar bekler"""
+        self._ready.wait()
+        if self._error is not None:
+            raise RuntimeError(f"Embedding modeli yüklenemedi: {self._error}")
+        return self._model
+
+    def encode(self, texts: List[str], show_progress: bool = True) -> np.ndarray:
+        return self.wait().encode(texts, show_progress=show_progress)
+
+    def encode_single(self, text: str) -> np.ndarray:
+        return self.wait().encode_single(text)
+
+    def get_dimension(self) -> int:
+        return self.wait().get_dimension()
+
+
+# ==================== PARITY CHECK ====================
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype='float32')
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _top_k(queries: np.ndarray, corpus: np.ndarray, k: int) -> np.ndarray:
+    scores = queries @ corpus.T
+    k = min(k, corpus.shape[0])
+    return np.argpartition(-scores, k - 1, axis=1)[:, :k]
+
+
+def parity_report(
+    reference: EmbeddingModel,
+    candidate: EmbeddingModel,
+    corpus_texts: List[str],
+    query_texts: List[str],
+    k: int = 10
+) -> Dict:
+    """
+    İki backend'i karşılaştırır (genelde torch referans, onnx-int8 aday)
+
+    - cosine drift: aynı metnin iki backend'deki vektörleri arasındaki 1 - cosine
+    - top-k overlap: referans sonuçlarıyla kesişim oranı
+        * serving: index referans ile kurulmuş, sorgu aday ile encode edilmiş (gerçek senaryo)
+        * full   : hem index hem sorgu aday ile encode edilmiş
+    """
+    ref_corpus = _normalize(reference.encode(corpus_texts, show_progress=False))
+    cand_corpus = _normalize(candidate.encode(corpus_texts, show_progress=False))
+    ref_queries = _normalize(reference.encode(query_texts, show_progress=False))
+    cand_queries = _normalize(candidate.encode(query_texts, show_progress=False))
+
+    drift = 1.0 - np.sum(np.vstack([ref_corpus, ref_queries]) * np.vstack([cand_corpus, cand_queries]), axis=1)
+
+    def overlap(found: np.ndarray, expected: np.ndarray) -> float:
+        hits = [len(set(f.tolist()) & set(e.tolist())) for f, e in zip(found, expected)]
+        return float(np.mean(hits) / expected.shape[1]) if len(hits) else 0.0
+
+    expected = _top_k(ref_queries, ref_corpus, k)
+    return {
+        'texts': int(len(drift)),
+        'k': int(expected.shape[1]),
+        'cosine_drift_mean': float(drift.mean()),
+        'cosine_drift_p99': float(np.percentile(drift, 99)),
+        'cosine_drift_max': float(drift.max()),
+        'topk_overlap_serving': overlap(_top_k(cand_queries, ref_corpus, k), expected),
+        'topk_overlap_full': overlap(_top_k(cand_queries, cand_corpus, k), expected)
+    }
@@ -1,12 +1,61 @@
 """
 Hybrid Context Builder - Neo4j + FAISS birleştirir
 """
+import hashlib
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from typing import Dict, List, Optional
+import numpy as np
 from src.neo4j_client import Neo4jClient
 from src.intent_classifier import IntentClassifier
 from src.date_tools import DateTools
 from src.vector_store import VectorStore
 from src.embeddings import EmbeddingModel
+from src.embedding_cache import normalize_text
+from src.lru_cache import LRUCache
+
+# Neo4j çağrısı pool kuyruğunda en fazla neo4j_timeout'un bu katı kadar bekler,
+# sonra iptal edilir (dolu pool isteği sınırsız bekletmesin)
+NEO4J_QUEUE_TIMEOUT_FACTOR = 2
+
+class _SpeculativeStage:
+    """Intent belli olmadan başlatılan bir retrieval adımı (zaman damgalı)"""
+    
+    def __init__(self, executor: ThreadPoolExecutor, fn, *args):
+        self.started = None
+        self.finished = None
+        self.future = executor.submit(self._run, fn, args)
+    
+    def _run(self, fn, args):
+        self.started = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            self.finished = time.perf_counter()
+    
+    def report(self, used: bool, classified_at: float) -> Dict:
+        """
+        Trace için adım özeti
+        
+        overlap_ms: classification ile eşzamanlı geçen süre
+        wait_ms: classification bittikten sonra sonucu beklerken geçen süre
+        wasted_ms: intent'e göre atılan sonucun harcadığı süre (hala çalışıyorsa şu ana kadarki)
+        """
+        if not used and self.future.cancel():
+            return {'status': 'cancelled', 'duration_ms': 0.0, 'overlap_ms': 0.0, 'wait_ms': 0.0, 'wasted_ms': 0.0}
+        
+        now = time.perf_counter()
+        started = self.started or now
+        finished = self.finished or now
+        duration = finished - started
+        return {
+            'status': 'used' if used else ('discarded' if self.finished else 'discarded (running)'),
+            'duration_ms': duration * 1000,
+            'overlap_ms': max(0.0, min(finished, classified_at) - started) * 1000,
+            'wait_ms': max(0.0, finished - max(started, classified_at)) * 1000 if used else 0.0,
+            'wasted_ms': 0.0 if used else duration * 1000
+        }
+
 
 class HybridContextBuilder:
     """Neo4j personal data + FAISS knowledge birleştirir"""
@@ -15,19 +64,195 @@ class HybridContextBuilder:
         self,
         neo4j_client: Neo4jClient,
         vector_store: VectorStore,
-        embedding_model: EmbeddingModel
+        embedding_model: EmbeddingModel,
+        intent_classifier: Optional[IntentClassifier] = None,
+        speculative: bool = False,
+        speculative_workers: int = 4,
+        neo4j_concurrency: int = 5,
+        neo4j_timeout: float = 5.0,
+        neo4j_single_query: bool = False
     ):
+        """
+        Args:
+            speculative: True ise ham soru için FAISS araması ve kullanıcı profili
+                intent classification ile paralel başlatılır; intent gelince
+                sonuçlar tutulur veya atılır
+            speculative_workers: Spekülatif adımlar için thread sayısı
+            neo4j_concurrency: Aynı anda çalışan en fazla Neo4j sorgusu
+            neo4j_timeout: Sorgu başına bekleme süresi (saniye); aşılırsa o veri atlanır
+            neo4j_single_query: True ise tüm personal data tek Cypher sorgusuyla
+                (Neo4jClient.get_user_personal_data) çekilir
+        """
         self.neo4j = neo4j_client
         self.vector_store = vector_store
         self.embedding_model = embedding_model
-        self.intent_classifier = IntentClassifier()
+        self.intent_classifier = intent_classifier or IntentClassifier()
         self.date_tools = DateTools()
+        
+        # Sık tekrarlanan sorular için in-process cache'ler
+        # query text -> embedding, (embedding, k, filters, index version) -> sonuçlar
+        self.query_embedding_cache = LRUCache(maxsize=2048)
+        self.retrieval_cache = LRUCache(maxsize=2048)
+        
+        # Personal data sorguları paralel çalışır: gecikme en yavaş sorgu kadar olur
+        self.neo4j_timeout = neo4j_timeout
+        self.neo4j_single_query = neo4j_single_query
+        self._neo4j_executor = ThreadPoolExecutor(
+            max_workers=max(1, neo4j_concurrency),
+            thread_name_prefix="neo4j-fetch"
+        )
+        
+        self.speculative = speculative
+        self._executor = None
+        if speculative:
+            self._executor = ThreadPoolExecutor(
+                max_workers=max(2, speculative_workers),
+                thread_name_prefix="speculative-retrieval"
+            )
+    
+    def build_context(
+        self,
+        user_id: str,
+        question: str,
+        k_docs: int = 3,
+        filters: Optional[Dict] = None
+    ) -> Dict:
+        """
+        Hybrid context oluştur
+        
+        Args:
+            filters: Opsiyonel FAISS metadata filtresi, örn. {'source': ['NIHSeniorHealth']}
+                veya condition_filter() çıktısı
+        """
+        if self.speculative:
+            return self._build_context_speculative(user_id, question, k_docs, filters)
+        
+        context, knowledge_query = self._build_base_context(user_id, question)
+        
+        if knowledge_query is not None:
+            context['knowledge'] = self._get_knowledge(knowledge_query, k_docs, filters)
+        
+        return context
     
-    def build_context(self, user_id: str, question: str, k_docs: int = 3) -> Dict:
-        """Hybrid context oluştur"""
+    def _build_context_speculative(
+        self,
+        user_id: str,
+        question: str,
+        k_docs: int,
+        filters: Optional[Dict]
+    ) -> Dict:
+        """
+        Classification ile paralel retrieval
+        
+        - Ham soru için encode + FAISS araması: GENERIC'te (ve enrichment'sız
+          HYBRID'de) kullanılır, PERSONAL'da atılır
+        - Kullanıcı profili (get_user): PERSONAL / HYBRID'de kullanılır, GENERIC'te atılır.
+          neo4j_single_query modunda başlatılmaz (tek sorgu user'ı zaten getirir)
+        
+        Atılan işin süresi ve classification ile örtüşme context['speculation']'a yazılır.
+        """
+        start = time.perf_counter()
+        knowledge_stage = _SpeculativeStage(self._executor, self._get_knowledge, question, k_docs, filters)
+        profile_stage = None
+        if not self.neo4j_single_query:
+            profile_stage = _SpeculativeStage(self._executor, self.neo4j.get_user, user_id)
+        
+        classification = self.intent_classifier.classify_with_data(question)
+        classified_at = time.perf_counter()
+        
+        profile_used = profile_stage is not None and classification['intent'] in ("PERSONAL", "HYBRID")
+        user = None
+        if profile_used:
+            try:
+                user = profile_stage.future.result()
+            except Exception as e:
+                print(f"⚠️ Neo4j veri çekme hatası: {e}")
+        
+        context, knowledge_query = self._context_from_classification(user_id, question, classification, user)
+        
+        # Enriched query ham sorudan farklıysa spekülatif arama işe yaramaz
+        knowledge_used = knowledge_query == question
+        if knowledge_used:
+            context['knowledge'] = knowledge_stage.future.result()
+        elif knowledge_query is not None:
+            context['knowledge'] = self._get_knowledge(knowledge_query, k_docs, filters)
+        
+        stages = {'knowledge': knowledge_stage.report(knowledge_used, classified_at)}
+        if profile_stage is not None:
+            stages['profile'] = profile_stage.report(profile_used, classified_at)
+        context['speculation'] = {
+            'classification_ms': (classified_at - start) * 1000,
+            'stages': stages,
+            'wasted_ms': sum(stage['wasted_ms'] for stage in stages.values())
+        }
+        return context
+    
+    def condition_filter(self, user_id: str) -> Optional[Dict]:
+        """Kullanıcının hastalıklarına göre focus_area filtresi (hastalık yoksa None)"""
+        try:
+            conditions = self.neo4j.get_user_conditions(user_id)
+        except Exception as e:
+            print(f"⚠️ Neo4j veri çekme hatası: {e}")
+            return None
+        
+        names = [cond['name'] for cond in conditions if cond.get('name')]
+        return {'focus_area': names} if names else None
+    
+    def build_contexts_batch(
+        self,
+        user_id: str,
+        questions: List[str],
+        k_docs: int = 3,
+        filters: Optional[Dict] = None
+    ) -> List[Dict]:
+        """
+        Birden fazla soru için context oluştur (offline evaluation / load test)
+        
+        Intent classification ve Neo4j sorguları soru başına yapılır; FAISS
+        tarafında tüm sorgular tek encode + tek search_batch çağrısıyla işlenir.
+        """
+        contexts = []
+        knowledge_queries = []
+        
+        for question in questions:
+            context, knowledge_query = self._build_base_context(user_id, question)
+            contexts.append(context)
+            knowledge_queries.append(knowledge_query)
+        
+        # Sadece GENERIC / HYBRID sorular RAG'e gider
+        positions = [i for i, q in enumerate(knowledge_queries) if q is not None]
+        if positions:
+            knowledge = self._get_knowledge_batch([knowledge_queries[i] for i in positions], k_docs, filters)
+            for i, docs in zip(positions, knowledge):
+                contexts[i]['knowledge'] = docs
+        
+        return contexts
+    
+    def _build_base_context(self, user_id: str, question: str):
+        """
+        Intent + personal data kısmını oluşturur
+        
+        Returns:
+            (context, knowledge_query) - knowledge_query None ise RAG gerekmez
+        """
         
-        # LLM-based intent classification + required data detection
+        # Intent classification + required data detection (local classifier, düşük güvende LLM)
         classification = self.intent_classifier.classify_with_data(question)
+        return self._context_from_classification(user_id, question, classification)
+    
+    def _context_from_classification(
+        self,
+        user_id: str,
+        question: str,
+        classification: Dict,
+        user: Optional[Dict] = None
+    ):
+        """
+        Classification sonucuna göre context iskeleti + personal data
+        
+        Args:
+            user: Önceden çekilmiş kullanıcı profili (None ise Neo4j'den çekilir)
+        """
         intent = classification['intent']
         required_data = classification['required_data']
         
@@ -36,96 +261,180 @@ class HybridContextBuilder:
             'personal_data': {},
             'knowledge': [],
             'required_data': required_data,  # Store for debugging/trace
+            'classification': {
+                'source': classification.get('source', 'llm'),
+                'confidence': classification.get('confidence')
+            },
             'metadata': {
                 'current_date': self.date_tools.get_current_date(),
                 'current_time': self.date_tools.get_current_time()
             }
         }
         
+        knowledge_query = None
+        
         # Intent-based data retrieval
         if intent == "PERSONAL":
             # PERSONAL: Sadece Neo4j graph data (sadece gerekli olanlar)
-            context['personal_data'] = self._get_personal_data(user_id, question, required_data)
+            context['personal_data'] = self._get_personal_data(user_id, question, required_data, user)
             context['knowledge'] = []
             
         elif intent == "GENERIC":
             # GENERIC: Sadece FAISS RAG
-            context['knowledge'] = self._get_knowledge(question, k_docs)
+            knowledge_query = question
             
         elif intent == "HYBRID":
             # HYBRID: Hem graph hem RAG (sadece gerekli olanlar)
-            context['personal_data'] = self._get_personal_data(user_id, question, required_data)
+            context['personal_data'] = self._get_personal_data(user_id, question, required_data, user)
             
             # HYBRID için enriched query oluştur
             enriched_query = self._enrich_query_with_personal_data(question, context['personal_data'])
-            context['knowledge'] = self._get_knowledge(enriched_query, k_docs)
+            knowledge_query = enriched_query
             context['original_question'] = question  # Original'i sakla
             context['enriched_query'] = enriched_query  # Enriched'i sakla (debug için)
         
-        return context
+        return context, knowledge_query
     
-    def _get_personal_data(self, user_id: str, question: str, required_data: Dict[str, bool]) -> Dict:
+    def _get_personal_data(
+        self,
+        user_id: str,
+        question: str,
+        required_data: Dict[str, bool],
+        user: Optional[Dict] = None
+    ) -> Dict:
         """
         Neo4j'den SADECE GEREKLİ personal data'yı çek
         
         LLM hangi dataların gerekli olduğunu belirledi,
         sadece onları çek -> daha küçük prompt, daha hızlı.
+        Sorgular thread pool'da eşzamanlı çalışır; neo4j_timeout'u aşan veya
+        hata veren sorgu atlanır, diğerleri yine kullanılır. neo4j_single_query
+        açıksa hepsi tek sorguyla gelir.
         
         FALLBACK: Eğer hiçbir data gerekli değilse (LLM belirsizse),
         güvenli tarafta kal ve tüm dataları çek.
         
+        Timeout / hata yüzünden çekilemeyen gerekli slice'lar 'unavailable'
+        listesine yazılır.
+        
         Args:
             user_id: Kullanıcı ID
             question: Kullanıcı sorusu (tarih parsing için)
             required_data: LLM'den gelen gerekli data listesi
+            user: Spekülatif olarak önceden çekilmiş kullanıcı profili
         """
-        personal_data = {}
+        # Relative date parsing (soruda tarih varsa)
+        date_filter = self.date_tools.parse_relative_date(question)
         
-        try:
-            # User info (her zaman çek - küçük data)
-            user = self.neo4j.get_user(user_id)
-            if user:
-                personal_data['user'] = user
-            
-            # Relative date parsing (soruda tarih varsa)
-            date_filter = self.date_tools.parse_relative_date(question)
-            
-            # FALLBACK: Eğer hiçbir data field gerekli değilse, hepsini çek
-            if not any(required_data.values()):
-                print(f"⚠️ LLM hiçbir data field belirtmedi, tüm dataları çekiyorum (fallback)")
-                required_data = {
-                    'appointments': True,
-                    'medications': True,
-                    'conditions': True,
-                    'test_results': True
-                }
-            
-            # Sadece gerekli dataları çek
-            if required_data.get('appointments', False):
-                appointments = self.neo4j.get_user_appointments(user_id, date_filter)
-                if appointments:
-                    personal_data['appointments'] = appointments
-            
-            if required_data.get('medications', False):
-                medications = self.neo4j.get_user_medications(user_id)
-                if medications:
-                    personal_data['medications'] = medications
-            
-            if required_data.get('conditions', False):
-                conditions = self.neo4j.get_user_conditions(user_id)
-                if conditions:
-                    personal_data['conditions'] = conditions
-            
-            if required_data.get('test_results', False):
-                test_results = self.neo4j.get_user_test_results(user_id)
-                if test_results:
-                    personal_data['test_results'] = test_results
+        # FALLBACK: Eğer hiçbir data field gerekli değilse, hepsini çek
+        if not any(required_data.values()):
+            print(f"⚠️ LLM hiçbir data field belirtmedi, tüm dataları çekiyorum (fallback)")
+            required_data = {
+                'appointments': True,
+                'medications': True,
+                'conditions': True,
+                'test_results': True
+            }
         
-        except Exception as e:
-            print(f"⚠️ Neo4j veri çekme hatası: {e}")
+        requested = [name for name, needed in required_data.items() if needed]
+        
+        if self.neo4j_single_query:
+            # Tek round trip: user + gerekli slice'lar
+            results, failed = self._fetch_concurrently({
+                'personal_data': (self.neo4j.get_user_personal_data, user_id, required_data, date_filter)
+            })
+            personal_data = {name: value for name, value in results.get('personal_data', {}).items() if value}
+            if failed:
+                personal_data['unavailable'] = requested
+            return personal_data
+        
+        # Sadece gerekli dataları çek (user info her zaman - küçük data)
+        calls = {}
+        if user is None:
+            calls['user'] = (self.neo4j.get_user, user_id)
+        if required_data.get('appointments', False):
+            calls['appointments'] = (self.neo4j.get_user_appointments, user_id, date_filter)
+        if required_data.get('medications', False):
+            calls['medications'] = (self.neo4j.get_user_medications, user_id)
+        if required_data.get('conditions', False):
+            calls['conditions'] = (self.neo4j.get_user_conditions, user_id)
+        if required_data.get('test_results', False):
+            calls['test_results'] = (self.neo4j.get_user_test_results, user_id)
+        
+        results, failed = self._fetch_concurrently(calls)
+        if user is None:
+            user = results.pop('user', None)
+        
+        personal_data = {}
+        if user:
+            personal_data['user'] = user
+        for name, value in results.items():
+            if value:
+                personal_data[name] = value
+        
+        # Çekilemeyen slice'lar boş sayılmasın: prompt ve trace'te belirtilir
+        unavailable = [name for name in failed if name != 'user']
+        if unavailable:
+            personal_data['unavailable'] = unavailable
         
         return personal_data
     
+    def _fetch_concurrently(self, calls: Dict):
+        """
+        {isim: (fonksiyon, *args)} çağrılarını paralel çalıştırır
+        
+        Timeout her çağrı için thread'de çalışmaya başladığı andan sayılır: pool
+        başka oturumların sorgularıyla doluyken kuyrukta beklenen süre dahil edilmez.
+        (Çalışan sorgu Neo4j tarafında da Neo4jClient.query_timeout ile kesilir.)
+        Kuyrukta submit'ten itibaren NEO4J_QUEUE_TIMEOUT_FACTOR * neo4j_timeout'tan
+        uzun bekleyen çağrı iptal edilir ve başarısız sayılır.
+        
+        Returns:
+            ({isim: sonuç}, [timeout veya hata alan isimler])
+        """
+        started = {}
+        
+        def run(name, fn, args):
+            started[name] = time.perf_counter()
+            return fn(*args)
+        
+        futures = {
+            name: self._neo4j_executor.submit(run, name, fn, args)
+            for name, (fn, *args) in calls.items()
+        }
+        queue_deadline = time.perf_counter() + NEO4J_QUEUE_TIMEOUT_FACTOR * self.neo4j_timeout
+        
+        results = {}
+        failed = []
+        for name, future in futures.items():
+            while True:
+                start = started.get(name)
+                if start is None:
+                    wait = queue_deadline - time.perf_counter()
+                else:
+                    wait = start + self.neo4j_timeout - time.perf_counter()
+                try:
+                    results[name] = future.result(timeout=max(0.0, wait))
+                except FutureTimeoutError:
+                    if future.done():
+                        continue  # Tam sınırda bitti
+                    if start is None:
+                        # Kuyruk süresi doldu: hala başlamadıysa iptal; az önce başladıysa
+                        # (cancel başarısız) çalışma timeout'u ile beklenir
+                        if future.cancel():
+                            print(f"⚠️ Neo4j sorgusu kuyrukta zaman aşımına uğradı: {name} "
+                                  f"(> {NEO4J_QUEUE_TIMEOUT_FACTOR * self.neo4j_timeout}s)")
+                            failed.append(name)
+                            break
+                        continue
+                    print(f"⚠️ Neo4j sorgusu zaman aşımına uğradı: {name} (> {self.neo4j_timeout}s)")
+                    failed.append(name)
+                except Exception as e:
+                    print(f"⚠️ Neo4j veri çekme hatası ({name}): {e}")
+                    failed.append(name)
+                break
+        return results, failed
+    
     def _enrich_query_with_personal_data(self, question: str, personal_data: Dict) -> str:
         """
         HYBRID sorular için query'yi personal data ile zenginleştir
@@ -169,16 +478,108 @@ class HybridContextBuilder:
         
         return enriched_query
     
-    def _get_knowledge(self, question: str, k: int) -> List[Dict]:
+    def _encode_query(self, question: str) -> np.ndarray:
+        """Query embedding (normalize edilmiş metin ile LRU cache'li)"""
+        key = normalize_text(question)
+        embedding = self.query_embedding_cache.get(key)
+        if embedding is None:
+            embedding = self.embedding_model.encode_single(key)
+            self.query_embedding_cache.put(key, embedding)
+        return embedding
+    
+    @staticmethod
+    def _freeze_filters(filters: Optional[Dict]):
+        """Filtre dict'ini hashable cache anahtarına çevirir"""
+        if not filters:
+            return None
+        return tuple(sorted(
+            (name, tuple(sorted([values] if isinstance(values, str) else set(values))))
+            for name, values in filters.items()
+        ))
+    
+    def cache_stats(self) -> Dict:
+        """Query embedding ve retrieval cache istatistikleri"""
+        return {
+            'query_embedding': self.query_embedding_cache.stats(),
+            'retrieval': self.retrieval_cache.stats()
+        }
+    
+    # Pasajlı index'te aynı dokümanın pasajları k slotu doldurmasın diye fazladan aday çekilir
+    PASSAGE_OVERFETCH = 3
+    
+    def _fetch_k(self, k: int) -> int:
+        if 'parent_id' in self.vector_store.documents.field_names:
+            return k * self.PASSAGE_OVERFETCH
+        return k
+    
+    @staticmethod
+    def _one_passage_per_parent(docs: List[Dict], k: int) -> List[Dict]:
+        """Her kaynak doküman için sadece en iyi eşleşen pasajı tutar (sıra korunur)"""
+        seen = set()
+        result = []
+        for doc in docs:
+            parent_id = doc.get('parent_id', doc.get('id'))
+            if parent_id in seen:
+                continue
+            seen.add(parent_id)
+            result.append(doc)
+            if len(result) == k:
+                break
+        return result
+    
+    def full_answer(self, doc: Dict) -> str:
+        """
+        Pasajın ait olduğu dokümanın tam cevabı (UI'daki "View Full Answer" için)
+        
+        Bölünmüş cevabın tamamı kaynak dokümanın ilk pasajında tutulur;
+        pasajlı olmayan index'te veya tek pasajlı dokümanda answer döner.
+        """
+        if doc.get('parent_id') is None:
+            return doc.get('answer', 'N/A')
+        if doc.get('full_answer'):
+            return doc['full_answer']
+        
+        from src.data_processor import PASSAGE_ID_STRIDE
+        first = self.vector_store.get_document(int(doc['parent_id']) * PASSAGE_ID_STRIDE)
+        if first is not None and first.get('full_answer'):
+            return first['full_answer']
+        return doc.get('answer', 'N/A')
+    
+    def _get_knowledge(self, question: str, k: int, filters: Optional[Dict] = None) -> List[Dict]:
         """FAISS'ten knowledge çek"""
         try:
-            query_embedding = self.embedding_model.encode_single(question)
-            similar_docs = self.vector_store.search(query_embedding, k=k)
+            query_embedding = self._encode_query(question)
+            
+            # Vector store değişince version artar, eski sonuçlar kendiliğinden geçersiz olur
+            key = (
+                hashlib.blake2b(np.asarray(query_embedding, dtype='float32').tobytes(), digest_size=16).digest(),
+                k,
+                self._freeze_filters(filters),
+                self.vector_store.version
+            )
+            cached = self.retrieval_cache.get(key)
+            if cached is not None:
+                return [doc.copy() for doc in cached]
+            
+            similar_docs = self._one_passage_per_parent(
+                self.vector_store.search(query_embedding, k=self._fetch_k(k), filters=filters), k
+            )
+            self.retrieval_cache.put(key, [doc.copy() for doc in similar_docs])
             return similar_docs
         except Exception as e:
             print(f"⚠️ FAISS arama hatası: {e}")
             return []
     
+    def _get_knowledge_batch(self, questions: List[str], k: int, filters: Optional[Dict] = None) -> List[List[Dict]]:
+        """FAISS'ten birden fazla soru için knowledge çek (tek encode + tek search)"""
+        try:
+            query_embeddings = self.embedding_model.encode(questions, show_progress=False)
+            results = self.vector_store.search_batch(query_embeddings, k=self._fetch_k(k), filters=filters)
+            return [self._one_passage_per_parent(docs, k) for docs in results]
+        except Exception as e:
+            print(f"⚠️ FAISS batch arama hatası: {e}")
+            return [[] for _ in questions]
+    
     def format_for_gpt(self, context: Dict) -> str:
         """Context'i GPT için string formatına çevir"""
         parts = []
@@ -244,6 +645,14 @@ class HybridContextBuilder:
                     parts.append(f"  Status: {status_icon} {test['status'].upper()}")
             parts.append("")
         
+        if personal.get('unavailable'):
+            parts.append("=== UNAVAILABLE USER DATA ===")
+            parts.append(
+                f"Could not load: {', '.join(personal['unavailable'])}. "
+                "Do not assume the user has none; say this data is temporarily unavailable."
+            )
+            parts.append("")
+        
         # Medical Knowledge
         knowledge = context.get('knowledge', [])
         if knowledge:
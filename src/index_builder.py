@@ -0,0 +1,401 @@
+"""
+Offline index build pipeline - büyük corpus'lar için
+
+1. Metinler tokenizer ile token uzunluğuna göre sıralanır ve benzer uzunluktaki
+   metinler aynı chunk'a düşer (batch içi padding minimum)
+2. Chunk'lar bir encoder worker process havuzunda embed edilir
+   (her worker modeli EmbeddingModel ile uygulamayla aynı backend'de bir kez yükler,
+   torch thread'leri worker'lar arasında bölünür). Kalıcı embedding cache'teki
+   metinler worker'a gönderilmez; cache'e sadece ana process yazar
+3. Biten chunk'lar diske checkpoint'lenir ve sırayla index'e eklenir
+4. Yarıda kesilirse aynı komut tekrar çalıştırıldığında sadece eksik chunk'lar encode edilir
+5. Sonunda throughput (texts/sec) raporlanır
+
+build_streaming: DataProcessor.iter_document_batches çıktısını doğrudan alır;
+sıralama batch içinde yapılır, doküman dict'leri batch batch işlenir
+(checkpoint/resume yoktur). Doküman metinleri ise save()'e kadar vector
+store'un columnar DocumentStore'unda bellekte birikir: bellek corpus metninin
+boyutuyla orantılıdır. Sıkıştırılmış modlarda (sq8 / pq / ivf_pq) re-ranking
+için tüm float32 vektörler de save()'e kadar bellekte kalır (N * dim * 4 byte).
+"""
+import hashlib
+import json
+import multiprocessing as mp
+import os
+import shutil
+import time
+import numpy as np
+from functools import lru_cache
+from typing import List, Dict, Optional, Iterable
+from src.document_store import atomic_write
+from src.vector_store import VectorStore
+from src.index_manifest import IndexManifest, content_hash, source_fingerprint, source_stat
+from src.embedding_cache import EmbeddingCache
+from src.embeddings import embedding_namespace, resolve_backend
+
+# Worker process state (initializer'da bir kez yüklenir)
+_worker_model = None
+_worker_batch_size = 64
+
+
+def _init_worker(model_name: str, threads: int, batch_size: int, backend: str, onnx_quantization: str):
+    """Worker process başına modeli bir kez yükler (uygulamayla aynı backend)"""
+    global _worker_model, _worker_batch_size
+    import torch
+    from src.embeddings import EmbeddingModel
+
+    torch.set_num_threads(max(1, threads))
+    _worker_model = EmbeddingModel(model_name, backend=backend, onnx_quantization=onnx_quantization).model
+    _worker_batch_size = batch_size
+
+
+def _encode_chunk(job):
+    """Bir chunk'ı encode eder: (chunk_id, texts) -> (chunk_id, embeddings)"""
+    chunk_id, texts = job
+    if not texts:
+        return chunk_id, np.zeros((0, 0), dtype='float32')
+    embeddings = _worker_model.encode(
+        texts,
+        batch_size=_worker_batch_size,
+        show_progress_bar=False,
+        convert_to_numpy=True
+    )
+    return chunk_id, embeddings.astype('float32')
+
+
+@lru_cache(maxsize=4)
+def _tokenizer(model_name: str):
+    from transformers import AutoTokenizer
+    return AutoTokenizer.from_pretrained(model_name)
+
+
+def token_lengths(texts: List[str], model_name: str) -> np.ndarray:
+    """Her metnin (truncation sonrası) token sayısı"""
+    tokenizer = _tokenizer(model_name)
+    max_length = min(getattr(tokenizer, 'model_max_length', 512), 512)
+
+    lengths = np.zeros(len(texts), dtype='int32')
+    for start in range(0, len(texts), 10_000):
+        encoded = tokenizer(texts[start:start + 10_000], truncation=True, max_length=max_length)
+        lengths[start:start + len(encoded['input_ids'])] = [len(ids) for ids in encoded['input_ids']]
+    return lengths
+
+
+class _IndexWriter:
+    """Embedding'leri vector store'a ekler; IVF/PQ eğitimi için ilk satırları tamponlar"""
+
+    def __init__(self, vector_store: VectorStore, n_docs: int):
+        self.vector_store = vector_store
+        vector_store.reserve(n_docs)
+        self.train_rows = 0 if vector_store.index.is_trained else min(n_docs, vector_store.training_sample_size())
+        self._embeddings = []
+        self._docs = []
+
+    def add(self, embeddings: np.ndarray, docs: List[Dict]):
+        if self.vector_store.index.is_trained and not self._docs:
+            self.vector_store.add_documents(embeddings, docs)
+            return
+
+        self._embeddings.append(embeddings)
+        self._docs.extend(docs)
+        if len(self._docs) >= self.train_rows:
+            self.flush()
+
+    def flush(self):
+        if self._docs:
+            self.vector_store.add_documents(np.vstack(self._embeddings), self._docs)
+            self._embeddings = []
+            self._docs = []
+
+
+class IndexBuildPipeline:
+    """Length-bucketed, multi-process, resumable embedding + index build"""
+
+    def __init__(
+        self,
+        model_name: str = "sentence-transformers/all-MiniLM-L6-v2",
+        num_workers: Optional[int] = None,
+        chunk_size: int = 2048,
+        batch_size: int = 64,
+        work_dir: str = "build_checkpoints",
+        backend: str = "torch",
+        onnx_quantization: str = "avx2",
+        cache: Optional[EmbeddingCache] = None
+    ):
+        """
+        Args:
+            model_name: Embedding modeli
+            num_workers: Encoder process sayısı (None = CPU sayısının yarısı)
+            chunk_size: Checkpoint / index'e ekleme birimi (metin sayısı)
+            batch_size: Model forward batch boyutu
+            work_dir: Chunk checkpoint klasörü (resume için)
+            backend: Embedding backend'i (uygulamanın EMBEDDING_BACKEND'i ile aynı olmalı)
+            onnx_quantization: onnx-int8 profili
+            cache: Kalıcı embedding cache (uygulamayla aynı dosya)
+        """
+        cpu_count = os.cpu_count() or 1
+        self.model_name = model_name
+        self.backend = resolve_backend(backend)
+        self.onnx_quantization = onnx_quantization
+        # Manifest ve cache anahtarı: model + backend (uygulama farklı backend'le açarsa reddeder)
+        self.cache_namespace = embedding_namespace(model_name, self.backend, onnx_quantization)
+        self.cache = cache
+        self.num_workers = num_workers or max(1, cpu_count // 2)
+        self.threads_per_worker = max(1, cpu_count // self.num_workers)
+        self.chunk_size = chunk_size
+        self.batch_size = batch_size
+        self.work_dir = work_dir
+
+    # ==================== PLAN & CHECKPOINTS ====================
+
+    def _plan(self, documents: List[Dict]) -> List[np.ndarray]:
+        """Dokümanları token uzunluğuna göre sıralayıp chunk'lara böler"""
+        texts = [doc['text'] for doc in documents]
+        lengths = token_lengths(texts, self.model_name)
+        order = np.argsort(lengths, kind='stable')
+        return [order[i:i + self.chunk_size] for i in range(0, len(order), self.chunk_size)]
+
+    def _plan_key(self, documents: List[Dict]) -> str:
+        """Checkpoint'lerin bu corpus + model + chunk ayarına ait olduğunu doğrulamak için"""
+        h = hashlib.blake2b(digest_size=16)
+        h.update(f"{self.cache_namespace}|{self.chunk_size}|{len(documents)}".encode('utf-8'))
+        for doc in documents:
+            h.update(doc['text'].encode('utf-8'))
+            h.update(b"\x00")
+        return h.hexdigest()
+
+    def _chunk_path(self, chunk_id: int) -> str:
+        return os.path.join(self.work_dir, f"chunk_{chunk_id:06d}.npy")
+
+    def _load_plan(self, plan_key: str) -> Optional[List[np.ndarray]]:
+        """
+        Aynı build'e ait kayıtlı plan varsa chunk'ları döndürür
+
+        Farklı bir build'e ait checkpoint'ler temizlenir.
+        """
+        plan_path = os.path.join(self.work_dir, "plan.json")
+        if not os.path.exists(plan_path):
+            return None
+
+        with open(plan_path, 'r', encoding='utf-8') as f:
+            plan = json.load(f)
+        if plan.get('plan_key') != plan_key:
+            print("⚠️ Checkpoint'ler farklı bir build'e ait, temizleniyor")
+            shutil.rmtree(self.work_dir)
+            return None
+
+        order = np.load(os.path.join(self.work_dir, "order.npy"))
+        return [order[i:i + self.chunk_size] for i in range(0, len(order), self.chunk_size)]
+
+    def _save_plan(self, plan_key: str, chunks: List[np.ndarray]):
+        os.makedirs(self.work_dir, exist_ok=True)
+        order = np.concatenate(chunks) if chunks else np.zeros(0, dtype='int64')
+        np.save(os.path.join(self.work_dir, "order.npy"), order)
+        with open(os.path.join(self.work_dir, "plan.json"), 'w', encoding='utf-8') as f:
+            json.dump({'plan_key': plan_key, 'model_name': self.cache_namespace, 'num_chunks': len(chunks)}, f)
+
+    # ==================== ENCODE ====================
+
+    def _encode_jobs(self, pool, jobs: Iterable, ordered: bool = False):
+        """
+        (chunk_id, texts) işlerini worker havuzunda encode eder
+
+        Cache'te olan metinler worker'a gönderilmez; yeni vektörler cache'e
+        ana process'te yazılır (SQLite'a tek yazar).
+
+        Yields:
+            (chunk_id, embeddings, encode edilen metin sayısı)
+        """
+        lookups = {}
+
+        def misses():
+            for chunk_id, texts in jobs:
+                if self.cache is not None:
+                    vectors = self.cache.get_many(self.cache_namespace, texts)
+                else:
+                    vectors = [None] * len(texts)
+                missing = [i for i, vector in enumerate(vectors) if vector is None]
+                lookups[chunk_id] = (texts, vectors, missing)
+                yield chunk_id, [texts[i] for i in missing]
+
+        mapper = pool.imap if ordered else pool.imap_unordered
+        for chunk_id, embeddings in mapper(_encode_chunk, misses()):
+            texts, vectors, missing = lookups.pop(chunk_id)
+            if missing:
+                if self.cache is not None:
+                    self.cache.put_many(self.cache_namespace, [texts[i] for i in missing], embeddings)
+                for i, vector in zip(missing, embeddings):
+                    vectors[i] = vector
+            yield chunk_id, np.vstack(vectors).astype('float32'), len(missing)
+
+    # ==================== BUILD ====================
+
+    def build(
+        self,
+        documents: List[Dict],
+        vector_store: VectorStore,
+        source_path: Optional[str] = None,
+        keep_checkpoints: bool = False,
+        corpus_params: Optional[Dict] = None
+    ) -> Dict:
+        """
+        Dokümanları embed edip vector store'a ekler, index ve manifest'i kaydeder
+
+        Returns:
+            Throughput istatistikleri
+        """
+        total_start = time.perf_counter()
+        n_docs = len(documents)
+
+        plan_key = self._plan_key(documents)
+        chunks = self._load_plan(plan_key)
+        if chunks is None:
+            print(f"Build planı hazırlanıyor ({n_docs} doküman, token uzunluğuna göre sıralama)...")
+            chunks = self._plan(documents)
+            self._save_plan(plan_key, chunks)
+
+        done = {i for i in range(len(chunks)) if os.path.exists(self._chunk_path(i))}
+        pending = [i for i in range(len(chunks)) if i not in done]
+        if done:
+            print(f"↻ Resume: {len(done)}/{len(chunks)} chunk checkpoint'ten okunacak")
+
+        # IVF/PQ eğitimi için ilk chunk'lar tamponlanır, sonra stream edilir
+        writer = _IndexWriter(vector_store, n_docs)
+
+        def add_chunk(chunk_id: int, embeddings: np.ndarray):
+            writer.add(embeddings, [documents[i] for i in chunks[chunk_id]])
+
+        # Checkpoint'teki chunk'lar
+        for chunk_id in sorted(done):
+            add_chunk(chunk_id, np.load(self._chunk_path(chunk_id)))
+
+        # Eksik chunk'lar worker havuzunda
+        encode_start = time.perf_counter()
+        encoded_texts = 0
+        cache_hits = 0
+        if pending:
+            print(f"{len(pending)} chunk, {self.num_workers} worker ile encode ediliyor "
+                  f"({self.threads_per_worker} thread/worker)...")
+            jobs = ((i, [documents[j]['text'] for j in chunks[i]]) for i in pending)
+
+            with self._pool() as pool:
+                for n_done, (chunk_id, embeddings, n_encoded) in enumerate(self._encode_jobs(pool, jobs), 1):
+                    atomic_write(self._chunk_path(chunk_id), lambda f, e=embeddings: np.save(f, e))
+                    add_chunk(chunk_id, embeddings)
+                    encoded_texts += len(embeddings)
+                    cache_hits += len(embeddings) - n_encoded
+
+                    elapsed = time.perf_counter() - encode_start
+                    print(f"  [{n_done}/{len(pending)}] chunk {chunk_id} "
+                          f"({encoded_texts / max(elapsed, 1e-9):.1f} texts/sec, {cache_hits} cache hit)")
+        encode_time = time.perf_counter() - encode_start
+
+        writer.flush()
+        vector_store.save()
+        IndexManifest.from_documents(
+            documents,
+            self.cache_namespace,
+            vector_store.dimension,
+            vector_store.config,
+            source_path,
+            corpus_params
+        ).save()
+
+        if not keep_checkpoints:
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+
+        return self._report(n_docs, encoded_texts, encode_time, time.perf_counter() - total_start, cache_hits)
+
+    def build_streaming(
+        self,
+        batches: Iterable[List[Dict]],
+        vector_store: VectorStore,
+        source_path: Optional[str] = None,
+        expected_docs: int = 0,
+        corpus_params: Optional[Dict] = None
+    ) -> Dict:
+        """
+        Doküman batch'lerini (örn. DataProcessor.iter_document_batches) dict olarak
+        biriktirmeden embed edip index'e ekler (metinler DocumentStore'da birikir)
+
+        Args:
+            expected_docs: Toplam doküman sayısı (IVF nlist / eğitim örneği için);
+                0 ise ilk batch'in boyutu kullanılır
+        """
+        total_start = time.perf_counter()
+        writer = None
+        doc_ids, hashes = [], []
+        n_docs = 0
+        cache_hits = 0
+        encode_time = 0.0
+
+        with self._pool() as pool:
+            for batch in batches:
+                if writer is None:
+                    writer = _IndexWriter(vector_store, max(expected_docs, len(batch)))
+
+                # Batch içinde token uzunluğuna göre sıralama
+                texts = [doc['text'] for doc in batch]
+                order = np.argsort(token_lengths(texts, self.model_name), kind='stable')
+                jobs = [
+                    (i, [texts[j] for j in order[start:start + self.chunk_size]])
+                    for i, start in enumerate(range(0, len(order), self.chunk_size))
+                ]
+
+                encode_start = time.perf_counter()
+                for chunk_id, embeddings, n_encoded in self._encode_jobs(pool, jobs, ordered=True):
+                    cache_hits += len(embeddings) - n_encoded
+                    rows = order[chunk_id * self.chunk_size:(chunk_id + 1) * self.chunk_size]
+                    writer.add(embeddings, [batch[j] for j in rows])
+                encode_time += time.perf_counter() - encode_start
+
+                doc_ids.append(np.fromiter((doc['id'] for doc in batch), dtype='int64', count=len(batch)))
+                hashes.append(np.fromiter((content_hash(doc) for doc in batch), dtype='uint64', count=len(batch)))
+                n_docs += len(batch)
+                print(f"  {n_docs} doküman ({n_docs / max(encode_time, 1e-9):.1f} texts/sec)")
+
+        if writer is not None:
+            writer.flush()
+        vector_store.save()
+
+        fingerprint, stat = None, None
+        if source_path and os.path.exists(source_path):
+            fingerprint, stat = source_fingerprint(source_path), source_stat(source_path)
+        IndexManifest(
+            self.cache_namespace,
+            vector_store.dimension,
+            vector_store.config,
+            np.concatenate(doc_ids) if doc_ids else np.zeros(0, dtype='int64'),
+            np.concatenate(hashes) if hashes else np.zeros(0, dtype='uint64'),
+            source_path,
+            fingerprint,
+            corpus_params,
+            stat
+        ).save()
+
+        return self._report(n_docs, n_docs, encode_time, time.perf_counter() - total_start, cache_hits)
+
+    def _pool(self):
+        # torch fork-safe değil: spawn context
+        return mp.get_context("spawn").Pool(
+            self.num_workers,
+            initializer=_init_worker,
+            initargs=(self.model_name, self.threads_per_worker, self.batch_size, self.backend, self.onnx_quantization)
+        )
+
+    @staticmethod
+    def _report(n_docs: int, encoded_texts: int, encode_time: float, total_time: float, cache_hits: int = 0) -> Dict:
+        stats = {
+            'documents': n_docs,
+            'encoded': encoded_texts,
+            'resumed': n_docs - encoded_texts,
+            'cache_hits': cache_hits,
+            'encode_seconds': encode_time,
+            'total_seconds': total_time,
+            'encode_texts_per_sec': encoded_texts / encode_time if encoded_texts else 0.0,
+            'total_texts_per_sec': n_docs / total_time if total_time else 0.0
+        }
+        print(f"✓ Build tamamlandı: {n_docs} doküman, {total_time:.1f}s "
+              f"(encode: {stats['encode_texts_per_sec']:.1f} texts/sec, "
+              f"toplam: {stats['total_texts_per_sec']:.1f} texts/sec)")
+        return stats
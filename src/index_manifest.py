@@ -0,0 +1,263 @@
+"""
+Index manifest - kaydedilmiş index'in hangi veri ve model ile kurulduğunu tutar
+
+- index_manifest.json : embedding modeli + backend (embedding_namespace; torch'ta sadece model adı), boyut, index parametreleri, kaynak dosya + fingerprint,
+                        corpus parametreleri (örn. pasaj chunking ayarları)
+- index_manifest.npz  : doküman ID'leri + içerik hash'leri (uint64)
+
+Başlangıçta CSV'den hazırlanan dokümanlar manifest ile karşılaştırılır:
+sadece değişen/yeni satırlar yeniden embed edilir, silinenler tombstone'lanır,
+farklı bir embedding modeliyle kurulmuş index ise hiç servis edilmez.
+Kaynak dosyanın boyutu + mtime'ı (veya bunlar değiştiyse içerik fingerprint'i)
+değişmemişse (is_current) CSV hiç okunmaz.
+"""
+import hashlib
+import json
+import os
+import numpy as np
+from typing import List, Dict, Optional, Tuple
+
+# Hash'e giren alanlar (text bunlardan türetildiği için ayrıca eklenmez)
+HASHED_FIELDS = ('question', 'answer', 'source', 'focus_area')
+
+# Sadece dokümanda varsa hash'e giren alanlar (eski manifest'ler geçersiz olmasın)
+OPTIONAL_HASHED_FIELDS = ('aliases', 'full_answer')
+
+
+class IndexModelMismatchError(ValueError):
+    """Index farklı bir embedding modeli / boyutu ile kurulmuş"""
+
+
+def source_fingerprint(path: str) -> str:
+    """Kaynak dosyanın içerik hash'i (CSV'yi parse etmekten çok daha ucuz)"""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(str(os.path.getsize(path)).encode('utf-8'))
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def source_stat(path: str) -> Dict:
+    """Kaynak dosyanın boyutu ve değişiklik zamanı (hash'lemeden ucuz ön kontrol)"""
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def content_hash(doc: Dict) -> int:
+    """Dokümanın içerik hash'i (64-bit blake2b)"""
+    fields = HASHED_FIELDS + tuple(field for field in OPTIONAL_HASHED_FIELDS if field in doc)
+    payload = "\x1f".join(str(doc.get(field, "")) for field in fields)
+    digest = hashlib.blake2b(payload.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+
+class IndexManifest:
+    """Kaydedilmiş index için model + içerik manifest'i"""
+
+    def __init__(
+        self,
+        model_name: str,
+        dimension: int,
+        index_params: Dict,
+        doc_ids: np.ndarray,
+        hashes: np.ndarray,
+        source_path: Optional[str] = None,
+        source_fingerprint: Optional[str] = None,
+        corpus_params: Optional[Dict] = None,
+        source_stat: Optional[Dict] = None
+    ):
+        self.model_name = model_name
+        self.dimension = dimension
+        self.index_params = index_params
+        self.doc_ids = np.asarray(doc_ids, dtype='int64')
+        self.hashes = np.asarray(hashes, dtype='uint64')
+        self.source_path = source_path
+        self.source_fingerprint = source_fingerprint
+        self.corpus_params = corpus_params or {}
+        self.source_stat = source_stat
+
+    @classmethod
+    def from_documents(
+        cls,
+        documents: List[Dict],
+        model_name: str,
+        dimension: int,
+        index_params: Dict,
+        source_path: Optional[str] = None,
+        corpus_params: Optional[Dict] = None
+    ) -> "IndexManifest":
+        """Hazırlanmış dokümanlardan manifest oluşturur"""
+        doc_ids = np.fromiter((doc['id'] for doc in documents), dtype='int64', count=len(documents))
+        hashes = np.fromiter((content_hash(doc) for doc in documents), dtype='uint64', count=len(documents))
+        fingerprint, stat = None, None
+        if source_path and os.path.exists(source_path):
+            fingerprint, stat = source_fingerprint(source_path), source_stat(source_path)
+        return cls(model_name, dimension, index_params, doc_ids, hashes, source_path, fingerprint, corpus_params, stat)
+
+    # ==================== CHECKS ====================
+
+    def check_model(self, model_name: str, dimension: int):
+        """Index başka bir modelle kurulmuşsa servis etmeyi reddeder"""
+        if self.model_name != model_name or self.dimension != dimension:
+            raise IndexModelMismatchError(
+                f"Index '{self.model_name}' ({self.dimension} boyut) ile kurulmuş, "
+                f"şu anki model '{model_name}' ({dimension} boyut). Index'i yeniden oluşturun."
+            )
+
+    def is_current(self, model_name: str, source_path: str, corpus_params: Optional[Dict] = None) -> bool:
+        """
+        Index aynı model/corpus ayarlarıyla ve değişmemiş kaynak dosyadan mı kurulmuş (CSV okumadan)
+
+        Önce boyut + mtime karşılaştırılır (O(1)); sadece bunlar farklıysa
+        (veya eski manifest'te yoksa) dosyanın içeriği hash'lenir.
+        """
+        if self.model_name != model_name or not self.source_fingerprint:
+            return False
+        if self.corpus_params != (corpus_params or {}):
+            return False
+        if not os.path.exists(source_path):
+            return False
+        if self.source_stat is not None and source_stat(source_path) == self.source_stat:
+            return True
+        return source_fingerprint(source_path) == self.source_fingerprint
+
+    def diff(self, documents: List[Dict]) -> Tuple[List[Dict], List[int]]:
+        """
+        Güncel dokümanları manifest ile karşılaştırır
+
+        Returns:
+            (changed, deleted_ids) - changed: yeni veya içeriği değişmiş dokümanlar,
+            deleted_ids: artık kaynakta olmayan doküman ID'leri
+        """
+        known = dict(zip(self.doc_ids.tolist(), self.hashes.tolist()))
+
+        changed = []
+        seen = set()
+        for doc in documents:
+            doc_id = doc['id']
+            seen.add(doc_id)
+            if known.get(doc_id) != content_hash(doc):
+                changed.append(doc)
+
+        deleted_ids = [doc_id for doc_id in known if doc_id not in seen]
+        return changed, deleted_ids
+
+    # ==================== PERSISTENCE ====================
+
+    @staticmethod
+    def _hashes_path(path: str) -> str:
+        return os.path.splitext(path)[0] + ".npz"
+
+    def save(self, path: str = "index_manifest.json"):
+        """Manifest'i kaydeder"""
+        np.savez(self._hashes_path(path), doc_ids=self.doc_ids, hashes=self.hashes)
+        self._save_meta(path)
+
+    def refresh_source_stat(self, source_path: str, path: str = "index_manifest.json"):
+        """
+        İçeriği aynı çıkan (örn. sadece touch edilmiş) kaynağın boyut + mtime'ını günceller
+
+        is_current() True döndükten sonra çağrılır; böylece sonraki başlangıçlar
+        dosyayı tekrar hash'lemez. Sadece JSON yeniden yazılır.
+        """
+        stat = source_stat(source_path)
+        if stat != self.source_stat:
+            self.source_stat = stat
+            self._save_meta(path)
+
+    def _save_meta(self, path: str):
+        meta = {
+            'model_name': self.model_name,
+            'dimension': self.dimension,
+            'index_params': self.index_params,
+            'source_path': self.source_path,
+            'source_fingerprint': self.source_fingerprint,
+            'corpus_params': self.corpus_params,
+            'source_stat': self.source_stat,
+            'num_docs': int(len(self.doc_ids))
+        }
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=2)
+
+    @classmethod
+    def load(cls, path: str = "index_manifest.json") -> Optional["IndexManifest"]:
+        """Manifest'i yükler (yoksa None)"""
+        if not os.path.exists(path) or not os.path.exists(cls._hashes_path(path)):
+            return None
+
+        with open(path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        with np.load(cls._hashes_path(path)) as data:
+            doc_ids, hashes = data['doc_ids'], data['hashes']
+
+        return cls(
+            meta['model_name'],
+            meta['dimension'],
+            meta.get('index_params', {}),
+            doc_ids,
+            hashes,
+            meta.get('source_path'),
+            meta.get('source_fingerprint'),
+            meta.get('corpus_params'),
+            meta.get('source_stat')
+        )
+
+
+def sync_vector_store(
+    vector_store,
+    embedding_model,
+    documents: List[Dict],
+    manifest_path: str = "index_manifest.json",
+    source_path: Optional[str] = None,
+    corpus_params: Optional[Dict] = None
+) -> Dict:
+    """
+    Yüklenmiş vector store'u güncel dokümanlarla senkronize eder
+
+    Sadece değişen satırlar embed edilir (upsert), silinenler tombstone'lanır.
+    Manifest yoksa (eski index) mevcut index güncel kabul edilir ve manifest yazılır;
+    eski index ham corpus ile kurulduğu için bu sadece corpus_params boşken yapılır.
+
+    Raises:
+        IndexModelMismatchError: Index farklı bir embedding modeliyle kurulmuşsa
+
+    Returns:
+        {'changed': int, 'deleted': int, 'manifest_created': bool}
+    """
+    # Backend de karşılaştırılır: torch ile kurulmuş index int8 sorgularla (veya tersi) servis edilmez
+    model_name = getattr(embedding_model, 'cache_namespace', embedding_model.model_name)
+    dimension = embedding_model.get_dimension()
+    manifest = IndexManifest.load(manifest_path)
+
+    if manifest is None:
+        if corpus_params:
+            raise ValueError(
+                "Index manifest'i yok ama corpus ayarları (dedup / pasaj) verilmiş; "
+                "eski index bu ayarlarla kurulmadı, index sıfırdan kurulmalı."
+            )
+        if vector_store.dimension != dimension:
+            raise IndexModelMismatchError(
+                f"Index {vector_store.dimension} boyutlu, şu anki model {dimension} boyut üretiyor."
+            )
+        print("⚠️ Index manifest'i yok, mevcut index güncel kabul ediliyor")
+        IndexManifest.from_documents(documents, model_name, dimension, vector_store.config, source_path, corpus_params).save(manifest_path)
+        return {'changed': 0, 'deleted': 0, 'manifest_created': True}
+
+    manifest.check_model(model_name, dimension)
+    changed, deleted_ids = manifest.diff(documents)
+
+    if deleted_ids:
+        vector_store.delete_documents(deleted_ids)
+    if changed:
+        print(f"{len(changed)} değişen doküman yeniden embed ediliyor...")
+        embeddings = embedding_model.encode([doc['text'] for doc in changed])
+        vector_store.upsert_documents(embeddings, changed)
+
+    if changed or deleted_ids:
+        vector_store.save()
+    # Kaynak fingerprint'i güncel tutulur: sonraki başlangıçlar CSV'yi hiç okumaz
+    if changed or deleted_ids or (source_path and not manifest.is_current(model_name, source_path, corpus_params)):
+        IndexManifest.from_documents(documents, model_name, dimension, vector_store.config, source_path, corpus_params).save(manifest_path)
+
+    return {'changed': len(changed), 'deleted': len(deleted_ids), 'manifest_created': False}
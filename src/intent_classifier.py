@@ -2,30 +2,62 @@
 Intent classification - LLM-based classifier (GPT-4o-mini)
 3 Intent Types: PERSONAL, GENERIC, HYBRID
 + Required data detection
+
+Sıra: classification cache (exact, sonra paraphrase) -> local classifier
+(embedding + logistic regression) -> LLM. LLM sadece cache'te yoksa ve local
+tahminin güveni eşiğin altındaysa çağrılır; LLM sonuçları cache'e yazılır.
 """
-from typing import Literal, Dict, Any
+from typing import Literal, Dict, Any, Optional
 from openai import OpenAI
+import hashlib
 import os
 import json
+import threading
+from src.classification_cache import ClassificationCache
 
 IntentType = Literal["PERSONAL", "GENERIC", "HYBRID"]
 
 class IntentClassifier:
     """LLM-based intent classifier with 3-way classification"""
     
-    def __init__(self, api_key: str = None, model: str = "gpt-4o-mini"):
+    def __init__(
+        self,
+        api_key: str = None,
+        model: str = "gpt-4o-mini",
+        local_classifier=None,
+        confidence_threshold: float = 0.8,
+        embedder=None
+    ):
         """
         LLM-based intent classifier
         
         Args:
             api_key: OpenAI API key (None ise .env'den alır)
             model: OpenAI model (default: gpt-4o-mini - ucuz ve hızlı)
+            local_classifier: Opsiyonel LocalIntentClassifier
+            confidence_threshold: Local tahmin bu güvenin altındaysa LLM'e sorulur
+            embedder: Paraphrase lookup ve local classifier için soru encoder'ı
+                (encode_single; örn. MicroBatchEncoder). None ise local
+                classifier'ın embedding modeli kullanılır.
         """
         if api_key is None:
             api_key = os.getenv("OPENAI_API_KEY")
         
         self.client = OpenAI(api_key=api_key)
         self.model = model
+        self.local_classifier = local_classifier
+        self.confidence_threshold = confidence_threshold
+        if embedder is None and local_classifier is not None:
+            embedder = local_classifier.embedding_model
+        self.embedder = embedder
+        
+        self.cache: Optional[ClassificationCache] = None
+        
+        # Cache / local / LLM karar sayaçları (LLM çağrı oranı için)
+        self.cache_hits = 0
+        self.local_decisions = 0
+        self.llm_calls = 0
+        self._stats_lock = threading.Lock()
         
         # System prompt for classification
         self.system_prompt = """You are an intent classifier for a healthcare chatbot with access to:
@@ -65,9 +97,39 @@ Respond with ONLY valid JSON (no markdown, no extra text):
   }
 }"""
 
+    def enable_cache(
+        self,
+        path: str = "classification_cache.sqlite",
+        ttl_seconds: float = 7 * 24 * 3600,
+        max_entries: int = 50_000,
+        similarity_threshold: float = 0.95
+    ) -> ClassificationCache:
+        """
+        Kalıcı classification cache'i açar
+        
+        Namespace LLM modeli + system prompt + embedding modelinden türetilir:
+        prompt veya model değişince eski sonuçlar kullanılmaz. Paraphrase
+        lookup embedder'ın embedding'lerini kullanır (local classifier açık
+        olmasa da); embedder yoksa sadece exact lookup yapılır.
+        """
+        embedding_name = ""
+        if self.embedder is not None:
+            embedding_name = getattr(self.embedder, 'cache_namespace', self.embedder.model_name)
+        prompt_hash = hashlib.blake2b(self.system_prompt.encode('utf-8'), digest_size=8).hexdigest()
+        self.cache = ClassificationCache(
+            path,
+            namespace=f"{self.model}|{prompt_hash}|{embedding_name}",
+            ttl_seconds=ttl_seconds,
+            max_entries=max_entries,
+            similarity_threshold=similarity_threshold if self.embedder is not None else 0.0
+        )
+        return self.cache
+    
     def classify_with_data(self, question: str) -> Dict[str, Any]:
         """
-        LLM ile soruyu sınıflandır + hangi dataların gerekli olduğunu belirle
+        Soruyu sınıflandır + hangi dataların gerekli olduğunu belirle
+        
+        Cache'te varsa veya local classifier'ın güveni eşiğin üstündeyse LLM çağrılmaz.
         
         Args:
             question: Kullanıcı sorusu
@@ -80,9 +142,89 @@ Respond with ONLY valid JSON (no markdown, no extra text):
                     "medications": bool,
                     "conditions": bool,
                     "test_results": bool
-                }
+                },
+                "source": "cache" | "cache_paraphrase" | "local" | "llm" | "fallback",
+                "confidence": float | None  (local tahminin güveni)
             }
         """
+        if self.cache is not None:
+            cached = self.cache.get(question)
+            if cached is not None:
+                return self._cached_result(cached, "cache")
+        
+        embedding = self._embed(question)
+        if self.cache is not None:
+            similar = self.cache.get_similar(embedding)
+            if similar is not None:
+                return self._cached_result(similar, "cache_paraphrase")
+        
+        local = self._local_predict(question, embedding)
+        if local is not None and local['confidence'] >= self.confidence_threshold:
+            with self._stats_lock:
+                self.local_decisions += 1
+            return {
+                "intent": local['intent'],
+                "required_data": local['required_data'],
+                "source": "local",
+                "confidence": local['confidence']
+            }
+        
+        with self._stats_lock:
+            self.llm_calls += 1
+        result = self.classify_with_llm(question)
+        result.setdefault("source", "llm")
+        result["confidence"] = local['confidence'] if local is not None else None
+        
+        # Keyword fallback sonuçları (LLM hatası) cache'lenmez
+        if self.cache is not None and result["source"] == "llm":
+            self.cache.put(
+                question,
+                {"intent": result["intent"], "required_data": result["required_data"]},
+                embedding
+            )
+        return result
+    
+    def _cached_result(self, cached: Dict[str, Any], source: str) -> Dict[str, Any]:
+        with self._stats_lock:
+            self.cache_hits += 1
+        return {
+            "intent": cached["intent"],
+            "required_data": cached["required_data"],
+            "source": source,
+            "confidence": None
+        }
+    
+    def _embed(self, question: str):
+        """Paraphrase lookup ve local classifier için soru embedding'i (model hazır değilse None)"""
+        if self.embedder is None or not getattr(self.embedder, 'is_ready', True):
+            return None
+        try:
+            return self.embedder.encode_single(question)
+        except Exception as e:
+            print(f"⚠️ Soru embedding hatası: {e}")
+            return None
+    
+    def _local_predict(self, question: str, embedding=None) -> Optional[Dict[str, Any]]:
+        """Local classifier tahmini (yoksa, hazır değilse veya hata olursa None)"""
+        if self.local_classifier is None or embedding is None or not self.local_classifier.is_ready:
+            return None
+        try:
+            return self.local_classifier.predict(question, embedding)
+        except Exception as e:
+            print(f"⚠️ Local intent classifier hatası: {e}, LLM kullanılıyor")
+            return None
+    
+    def llm_call_rate(self) -> float:
+        """Sınıflandırmaların ne kadarının LLM'e gittiği"""
+        total = self.cache_hits + self.local_decisions + self.llm_calls
+        return self.llm_calls / total if total else 0.0
+    
+    def cache_stats(self) -> Optional[Dict[str, Any]]:
+        """Classification cache hit/miss istatistikleri (cache kapalıysa None)"""
+        return self.cache.stats() if self.cache is not None else None
+    
+    def classify_with_llm(self, question: str) -> Dict[str, Any]:
+        """LLM ile sınıflandırma (classify_with_data ile aynı format, source hariç)"""
         try:
             response = self.client.chat.completions.create(
                 model=self.model,
@@ -102,7 +244,7 @@ Respond with ONLY valid JSON (no markdown, no extra text):
             intent = result.get("intent", "").upper()
             if intent not in ["PERSONAL", "GENERIC", "HYBRID"]:
                 print(f"⚠️ LLM returned invalid intent: {intent}, using fallback")
-                return self._fallback_classify_with_data(question)
+                return {**self._fallback_classify_with_data(question), "source": "fallback"}
             
             # Ensure required_data exists
             if "required_data" not in result:
@@ -120,7 +262,7 @@ Respond with ONLY valid JSON (no markdown, no extra text):
                 
         except Exception as e:
             print(f"⚠️ LLM classification error: {e}, using fallback")
-            return self._fallback_classify_with_data(question)
+            return {**self._fallback_classify_with_data(question), "source": "fallback"}
     
     def classify(self, question: str) -> IntentType:
         """
@@ -0,0 +1,213 @@
+"""
+Local intent classifier - EmbeddingModel vektörleri üzerinde logistic regression
+
+LLM round trip'i olmadan intent (PERSONAL / GENERIC / HYBRID) ve dört
+required_data bayrağını tahmin eder. Her tahmin bir güven skoru taşır;
+IntentClassifier bu skor eşiğin altındaysa LLM'e düşer.
+
+- Intent: softmax regression (3 sınıf)
+- required_data: bayrak başına bağımsız sigmoid regression
+- Eğitim verisi: eval/intent_train.jsonl (question, intent, required_data)
+
+Ağırlıklar embedding modeli + backend ve eğitim dosyası hash'i ile diske
+kaydedilir; veri, model veya backend (torch / onnx-int8) değişince yeniden
+eğitilir. Eğitim / yükleme başlangıçta arka planda yapılır
+(start_background_training); hazır olana kadar IntentClassifier LLM kullanır.
+"""
+import hashlib
+import json
+import os
+import threading
+import numpy as np
+from typing import List, Dict, Optional
+
+INTENTS = ("PERSONAL", "GENERIC", "HYBRID")
+DATA_FLAGS = ("appointments", "medications", "conditions", "test_results")
+
+
+def load_labelled(path: str) -> List[Dict]:
+    """JSONL etiketli soru seti"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype='float32')
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    logits = logits - logits.max(axis=1, keepdims=True)
+    exp = np.exp(logits)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+def _sigmoid(x: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+def _fit(features: np.ndarray, targets: np.ndarray, softmax: bool, l2: float, epochs: int, lr: float):
+    """Full-batch gradient descent (bias sütunu features'a eklenmiş olmalı)"""
+    weights = np.zeros((features.shape[1], targets.shape[1]), dtype='float32')
+    n = features.shape[0]
+    for _ in range(epochs):
+        logits = features @ weights
+        probs = _softmax(logits) if softmax else _sigmoid(logits)
+        grad = features.T @ (probs - targets) / n + l2 * weights
+        weights -= lr * grad
+    return weights
+
+
+class LocalIntentClassifier:
+    """Embedding tabanlı intent + required_data sınıflandırıcı"""
+
+    def __init__(
+        self,
+        embedding_model,
+        train_path: str = "eval/intent_train.jsonl",
+        weights_path: str = "intent_model.npz",
+        l2: float = 1e-3,
+        epochs: int = 500,
+        learning_rate: float = 2.0
+    ):
+        """
+        Args:
+            embedding_model: EmbeddingModel (veya aynı arayüzü sunan wrapper)
+            train_path: Etiketli eğitim seti
+            weights_path: Eğitilmiş ağırlıkların kaydedildiği dosya
+        """
+        self.embedding_model = embedding_model
+        self.train_path = train_path
+        self.weights_path = weights_path
+        self.l2 = l2
+        self.epochs = epochs
+        self.learning_rate = learning_rate
+
+        self.intent_weights = None
+        self.flag_weights = None
+        self._lock = threading.Lock()
+
+    # ==================== TRAINING ====================
+
+    @property
+    def embedding_namespace(self) -> str:
+        """Embedding modeli + backend kimliği"""
+        return getattr(self.embedding_model, 'cache_namespace', self.embedding_model.model_name)
+
+    def _training_key(self) -> str:
+        h = hashlib.blake2b(digest_size=16)
+        h.update(self.embedding_namespace.encode('utf-8'))
+        h.update(f"|{self.l2}|{self.epochs}|{self.learning_rate}|".encode('utf-8'))
+        with open(self.train_path, 'rb') as f:
+            h.update(f.read())
+        return h.hexdigest()
+
+    @staticmethod
+    def _features(embeddings: np.ndarray) -> np.ndarray:
+        embeddings = _normalize(embeddings)
+        return np.hstack([embeddings, np.ones((len(embeddings), 1), dtype='float32')])
+
+    def train(self, examples: List[Dict]):
+        """Etiketli örneklerden intent ve bayrak ağırlıklarını öğrenir"""
+        features = self._features(
+            self.embedding_model.encode([ex['question'] for ex in examples], show_progress=False)
+        )
+
+        intent_targets = np.zeros((len(examples), len(INTENTS)), dtype='float32')
+        flag_targets = np.zeros((len(examples), len(DATA_FLAGS)), dtype='float32')
+        for i, ex in enumerate(examples):
+            intent_targets[i, INTENTS.index(ex['intent'])] = 1.0
+            required = ex.get('required_data', {})
+            flag_targets[i] = [float(bool(required.get(flag))) for flag in DATA_FLAGS]
+
+        self.intent_weights = _fit(features, intent_targets, True, self.l2, self.epochs, self.learning_rate)
+        self.flag_weights = _fit(features, flag_targets, False, self.l2, self.epochs, self.learning_rate)
+
+    def ensure_trained(self):
+        """Kayıtlı ağırlıklar güncelse yükler, değilse eğitip kaydeder"""
+        if self.intent_weights is not None:
+            return
+
+        with self._lock:
+            if self.intent_weights is not None:
+                return
+
+            key = self._training_key()
+            if os.path.exists(self.weights_path):
+                with np.load(self.weights_path) as data:
+                    if str(data['key']) == key:
+                        self.flag_weights = data['flags']
+                        self.intent_weights = data['intent']
+                        return
+
+            print(f"Local intent classifier eğitiliyor: {self.train_path}")
+            self.train(load_labelled(self.train_path))
+            np.savez(self.weights_path, key=key, intent=self.intent_weights, flags=self.flag_weights)
+            print("✓ Local intent classifier hazır")
+
+    def start_background_training(self) -> threading.Thread:
+        """Ağırlıkları arka planda yükler / eğitir (istek thread'inde eğitim yapılmaz)"""
+        def run():
+            try:
+                self.ensure_trained()
+            except Exception as e:
+                print(f"⚠️ Local intent classifier eğitilemedi: {e}, LLM kullanılacak")
+
+        thread = threading.Thread(target=run, name="intent-classifier-trainer", daemon=True)
+        thread.start()
+        return thread
+
+    # ==================== PREDICTION ====================
+
+    @property
+    def is_ready(self) -> bool:
+        """Embedding modeli yüklendi ve ağırlıklar hazır mı (değilse LLM kullanılır)"""
+        return self.intent_weights is not None and getattr(self.embedding_model, 'is_ready', True)
+
+    def predict_batch(self, questions: List[str]) -> List[Dict]:
+        """
+        Returns:
+            Her soru için {'intent', 'required_data', 'confidence', 'intent_probs'}
+            confidence: intent olasılığı ve (PERSONAL/HYBRID ise) en belirsiz bayrağın
+            olasılığının minimumu
+        """
+        return self._predict_embeddings(self.embedding_model.encode(questions, show_progress=False))
+
+    def _predict_embeddings(self, embeddings: np.ndarray) -> List[Dict]:
+        self.ensure_trained()
+        features = self._features(embeddings)
+        intent_probs = _softmax(features @ self.intent_weights)
+        flag_probs = _sigmoid(features @ self.flag_weights)
+
+        predictions = []
+        for probs, flags in zip(intent_probs, flag_probs):
+            intent = INTENTS[int(np.argmax(probs))]
+            confidence = float(probs.max())
+            required_data = {flag: False for flag in DATA_FLAGS}
+
+            if intent != "GENERIC":
+                required_data = {flag: bool(p >= 0.5) for flag, p in zip(DATA_FLAGS, flags)}
+                confidence = min(confidence, float(np.maximum(flags, 1 - flags).min()))
+                # Keyword fallback ile aynı: hangi veri gerektiği belli değilse hepsini çek
+                if not any(required_data.values()):
+                    required_data = {flag: True for flag in DATA_FLAGS}
+
+            predictions.append({
+                'intent': intent,
+                'required_data': required_data,
+                'confidence': confidence,
+                'intent_probs': {name: float(p) for name, p in zip(INTENTS, probs)}
+            })
+        return predictions
+
+    def embed(self, question: str) -> np.ndarray:
+        """Soru embedding'i (encode_single: eşzamanlı oturumların soruları micro-batch'lenebilir)"""
+        return self.embedding_model.encode_single(question)
+
+    def predict(self, question: str, embedding: Optional[np.ndarray] = None) -> Optional[Dict]:
+        """Tek soru için tahmin (model henüz hazır değilse None)"""
+        if not self.is_ready:
+            return None
+        if embedding is None:
+            embedding = self.embed(question)
+        return self._predict_embeddings(np.asarray(embedding)[None, :])[0]
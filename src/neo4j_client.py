@@ -1,16 +1,84 @@
 """
 Neo4j client ve bağlantı yönetimi
+
+get_user_* okumaları kullanıcı başına versiyonlu bir cache'ten döner:
+- Bu client üzerinden yapılan yazmalar (create_*, add_appointment_notes,
+  link_medication_to_condition) kullanıcının versiyonunu artırır, eski
+  kayıtlar bir daha okunmaz
+- Uygulama dışından yapılan yazmalar için kayıtlar cache_ttl sonra düşer
+- "Yaklaşan randevular" gibi bugüne göre değişen sonuçlar gece yarısı düşer
 """
-from neo4j import GraphDatabase
+from neo4j import GraphDatabase, Query
 from typing import List, Dict, Optional
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
+import copy
+import functools
 import os
+import threading
+import time
+from src.lru_cache import LRUCache
+
+
+def _next_midnight() -> float:
+    """Yerel saatle bir sonraki gece yarısı (epoch saniye)"""
+    tomorrow = date.today() + timedelta(days=1)
+    return datetime.combine(tomorrow, datetime.min.time()).timestamp()
+
+
+def _freeze(value):
+    """Cache anahtarı için dict/list argümanlarını hashable hale getirir"""
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def _cached_read(date_relative=None):
+    """
+    get_user_*(self, user_id, ...) okumalarını kullanıcı versiyonlu cache'e bağlar
+    
+    Args:
+        date_relative: Argümanlardan sonucun bugüne bağlı olup olmadığını söyleyen
+            fonksiyon (True ise kayıt gece yarısı düşer)
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, user_id: str, *args, **kwargs):
+            relative = bool(date_relative and date_relative(*args, **kwargs))
+            return self._cached(
+                method.__name__, user_id, (_freeze(args), _freeze(kwargs)), relative,
+                lambda: method(self, user_id, *args, **kwargs)
+            )
+        return wrapper
+    return decorator
+
 
 class Neo4jClient:
     """Neo4j veritabanı client'ı"""
     
-    def __init__(self, uri: str, user: str, password: str):
+    def __init__(
+        self,
+        uri: str,
+        user: str,
+        password: str,
+        cache_ttl: float = 300.0,
+        cache_size: int = 4096,
+        query_timeout: Optional[float] = None
+    ):
+        """
+        Args:
+            query_timeout: Okuma sorguları için sunucu tarafı transaction timeout'u
+                (saniye, None = sunucu varsayılanı); aşılınca sorgu Neo4j'de iptal edilir
+            cache_ttl: get_user_* cache kayıt ömrü (saniye, 0 = cache kapalı)
+            cache_size: Maksimum cache kaydı
+        """
         self.driver = GraphDatabase.driver(uri, auth=(user, password))
+        self.cache_ttl = cache_ttl
+        self.query_timeout = query_timeout
+        self._read_cache = LRUCache(maxsize=cache_size)
+        self._user_versions = {}
+        self._cache_lock = threading.Lock()
         print(f"✓ Neo4j bağlantısı kuruldu: {uri}")
     
     def close(self):
@@ -50,6 +118,46 @@ class Neo4jClient:
             
             print("✓ Neo4j schema oluşturuldu")
     
+    def _read_query(self, text: str):
+        """Okuma sorgusu (query_timeout varsa transaction timeout'u ile)"""
+        return Query(text, timeout=self.query_timeout) if self.query_timeout else text
+    
+    # ==================== READ CACHE ====================
+    
+    def _cached(self, method: str, user_id: str, args, date_relative: bool, loader):
+        """Kullanıcının güncel versiyonuna göre cache'ten döner, yoksa loader ile yükler"""
+        if self.cache_ttl <= 0:
+            return loader()
+        
+        with self._cache_lock:
+            version = self._user_versions.get(user_id, 0)
+        key = (method, user_id, version, args)
+        
+        now = time.time()
+        entry = self._read_cache.get(key)
+        if entry is not None and entry[1] > now:
+            return copy.deepcopy(entry[0])
+        
+        value = loader()
+        expires_at = now + self.cache_ttl
+        if date_relative:
+            expires_at = min(expires_at, _next_midnight())
+        
+        # Okuma sırasında yazma olduysa eski sonuç cache'lenmez
+        with self._cache_lock:
+            if self._user_versions.get(user_id, 0) == version:
+                self._read_cache.put(key, (copy.deepcopy(value), expires_at))
+        return value
+    
+    def invalidate_user(self, user_id: str):
+        """Kullanıcının cache'li okumalarını geçersiz kılar (versiyon artar)"""
+        with self._cache_lock:
+            self._user_versions[user_id] = self._user_versions.get(user_id, 0) + 1
+    
+    def cache_stats(self) -> Dict:
+        """Read cache hit/miss istatistikleri"""
+        return self._read_cache.stats()
+    
     # ==================== USER OPERATIONS ====================
     
     def create_user(self, user_id: str, name: str, age: Optional[int] = None):
@@ -65,8 +173,11 @@ class Neo4jClient:
             RETURN u
             """
             result = session.run(query, user_id=user_id, name=name, age=age)
-            return result.single()
+            record = result.single()
+        self.invalidate_user(user_id)
+        return record
     
+    @_cached_read()
     def get_user(self, user_id: str):
         """Kullanıcı bilgilerini getir"""
         with self.driver.session() as session:
@@ -74,7 +185,7 @@ class Neo4jClient:
             MATCH (u:User {id: $user_id})
             RETURN u
             """
-            result = session.run(query, user_id=user_id)
+            result = session.run(self._read_query(query), user_id=user_id)
             record = result.single()
             return dict(record["u"]) if record else None
     
@@ -107,8 +218,11 @@ class Neo4jClient:
                 location=appointment_data.get('location', ''),
                 notes=appointment_data.get('notes', '')
             )
-            return result.single()
+            record = result.single()
+        self.invalidate_user(user_id)
+        return record
     
+    @_cached_read(date_relative=lambda date_filter=None: not date_filter)
     def get_user_appointments(self, user_id: str, date_filter: Optional[str] = None):
         """Kullanıcının randevularını getir (doctor bilgisiyle birlikte)"""
         with self.driver.session() as session:
@@ -120,7 +234,7 @@ class Neo4jClient:
                 RETURN a, d.name as doctor_name, d.specialty as doctor_specialty
                 ORDER BY a.date, a.time
                 """
-                result = session.run(query, user_id=user_id, date_filter=date_filter)
+                result = session.run(self._read_query(query), user_id=user_id, date_filter=date_filter)
             else:
                 query = """
                 MATCH (u:User {id: $user_id})-[:HAS_APPOINTMENT]->(a:Appointment)
@@ -130,7 +244,7 @@ class Neo4jClient:
                 ORDER BY a.date, a.time
                 LIMIT 10
                 """
-                result = session.run(query, user_id=user_id)
+                result = session.run(self._read_query(query), user_id=user_id)
             
             # Appointment ve doctor bilgisini birleştir
             appointments = []
@@ -169,8 +283,11 @@ class Neo4jClient:
                 start_date=medication_data.get('start_date', str(date.today())),
                 notes=medication_data.get('notes', '')
             )
-            return result.single()
+            record = result.single()
+        self.invalidate_user(user_id)
+        return record
     
+    @_cached_read()
     def get_user_medications(self, user_id: str):
         """Kullanıcının ilaçlarını getir"""
         with self.driver.session() as session:
@@ -179,7 +296,7 @@ class Neo4jClient:
             RETURN m
             ORDER BY m.name
             """
-            result = session.run(query, user_id=user_id)
+            result = session.run(self._read_query(query), user_id=user_id)
             return [dict(record["m"]) for record in result]
     
     # ==================== CONDITION OPERATIONS ====================
@@ -207,8 +324,11 @@ class Neo4jClient:
                 severity=condition_data.get('severity', 'moderate'),
                 notes=condition_data.get('notes', '')
             )
-            return result.single()
+            record = result.single()
+        self.invalidate_user(user_id)
+        return record
     
+    @_cached_read()
     def get_user_conditions(self, user_id: str):
         """Kullanıcının hastalıklarını getir"""
         with self.driver.session() as session:
@@ -217,7 +337,7 @@ class Neo4jClient:
             RETURN c
             ORDER BY c.name
             """
-            result = session.run(query, user_id=user_id)
+            result = session.run(self._read_query(query), user_id=user_id)
             return [dict(record["c"]) for record in result]
     
     # ==================== DOCTOR OPERATIONS ====================
@@ -286,7 +406,9 @@ class Neo4jClient:
                 location=appointment_data.get('location', ''),
                 notes=appointment_data.get('notes', '')
             )
-            return result.single()
+            record = result.single()
+        self.invalidate_user(user_id)
+        return record
     
     # ==================== APPOINTMENT NOTES ====================
     
@@ -304,7 +426,9 @@ class Neo4jClient:
                 created_at: datetime()
             })
             CREATE (a)-[:HAS_NOTES]->(n)
-            RETURN n
+            WITH a, n
+            OPTIONAL MATCH (u:User)-[:HAS_APPOINTMENT]->(a)
+            RETURN n, collect(u.id) AS user_ids
             """
             result = session.run(query,
                 appointment_id=appointment_id,
@@ -313,7 +437,11 @@ class Neo4jClient:
                 recommendations=notes_data.get('recommendations', ''),
                 follow_up=notes_data.get('follow_up', '')
             )
-            return result.single()
+            record = result.single()
+        if record:
+            for user_id in record["user_ids"]:
+                self.invalidate_user(user_id)
+        return record
     
     # ==================== TEST RESULTS ====================
     
@@ -365,8 +493,11 @@ class Neo4jClient:
                 normal_range=test_data.get('normal_range', ''),
                 status=test_data.get('status', 'normal')
             )
-            return result.single()
+            record = result.single()
+        self.invalidate_user(user_id)
+        return record
     
+    @_cached_read()
     def get_user_test_results(self, user_id: str):
         """Kullanıcının test sonuçlarını getir"""
         with self.driver.session() as session:
@@ -375,7 +506,7 @@ class Neo4jClient:
             RETURN t
             ORDER BY t.test_date DESC
             """
-            result = session.run(query, user_id=user_id)
+            result = session.run(self._read_query(query), user_id=user_id)
             return [dict(record["t"]) for record in result]
     
     # ==================== MEDICATION-CONDITION RELATIONSHIP ====================
@@ -395,32 +526,206 @@ class Neo4jClient:
                 medication_name=medication_name,
                 condition_name=condition_name
             )
-            return result.single()
+            record = result.single()
+        self.invalidate_user(user_id)
+        return record
     
     # ==================== COMPLEX QUERIES ====================
     
+    # required_data bayrağı -> tek sorgudaki CALL {} bloğu (her blok tek satır döner)
+    _PERSONAL_DATA_SUBQUERIES = {
+        'appointments': """
+            CALL {
+                WITH u
+                MATCH (u)-[:HAS_APPOINTMENT]->(a:Appointment)
+                WHERE %s
+                OPTIONAL MATCH (a)-[:WITH_DOCTOR]->(d:Doctor)
+                WITH a, d
+                ORDER BY a.date, a.time
+                %s
+                RETURN collect(a {.*, doctor: d.name, specialty: d.specialty}) AS appointments
+            }
+        """,
+        'medications': """
+            CALL {
+                WITH u
+                MATCH (u)-[:TAKES_MEDICATION]->(m:Medication)
+                WITH m
+                ORDER BY m.name
+                RETURN collect(properties(m)) AS medications
+            }
+        """,
+        'conditions': """
+            CALL {
+                WITH u
+                MATCH (u)-[:HAS_CONDITION]->(c:Condition)
+                WITH c
+                ORDER BY c.name
+                RETURN collect(properties(c)) AS conditions
+            }
+        """,
+        'test_results': """
+            CALL {
+                WITH u
+                MATCH (u)-[:HAS_TEST_RESULT]->(t:TestResult)
+                WITH t
+                ORDER BY t.test_date DESC
+                RETURN collect(properties(t)) AS test_results
+            }
+        """
+    }
+    
+    @_cached_read(date_relative=lambda required_data, date_filter=None: required_data.get('appointments') and not date_filter)
+    def get_user_personal_data(
+        self,
+        user_id: str,
+        required_data: Dict[str, bool],
+        date_filter: Optional[str] = None
+    ) -> Dict:
+        """
+        Kullanıcı + istenen personal data slice'larını tek sorguda getir
+        
+        Her slice ayrı bir CALL {} içinde collect edilir; OPTIONAL MATCH
+        zincirindeki gibi satırlar çarpılmaz (slice başına tek satır).
+        Sonuçlar get_user / get_user_appointments / get_user_medications /
+        get_user_conditions / get_user_test_results ile aynıdır.
+        
+        Args:
+            required_data: {'appointments', 'medications', 'conditions', 'test_results'} bayrakları
+            date_filter: get_user_appointments ile aynı (yoksa yaklaşan 10 randevu)
+        
+        Returns:
+            {'user': dict | None, <istenen slice>: list, ...}
+        """
+        slices = [name for name in self._PERSONAL_DATA_SUBQUERIES if required_data.get(name)]
+        
+        parts = ["MATCH (u:User {id: $user_id})"]
+        for name in slices:
+            subquery = self._PERSONAL_DATA_SUBQUERIES[name]
+            if name == 'appointments':
+                if date_filter:
+                    subquery = subquery % ("a.date = date($date_filter)", "")
+                else:
+                    subquery = subquery % ("a.date >= date()", "LIMIT 10")
+            parts.append(subquery)
+        parts.append("RETURN " + ", ".join(["u"] + slices))
+        
+        with self.driver.session() as session:
+            result = session.run(self._read_query("\n".join(parts)), user_id=user_id, date_filter=date_filter)
+            record = result.single()
+        
+        if record is None:
+            return {'user': None, **{name: [] for name in slices}}
+        
+        personal_data = {'user': dict(record["u"])}
+        for name in slices:
+            personal_data[name] = [dict(item) for item in record[name]]
+        return personal_data
+    
     def get_user_complete_profile(self, user_id: str):
-        """Kullanıcının tüm bilgilerini ilişkilerle getir"""
+        """
+        Kullanıcının tüm bilgilerini ilişkilerle getir
+        
+        Her ilişki türü ayrı bir CALL {} içinde collect edilir: ara satır sayısı
+        profil boyutuyla doğrusal kalır (OPTIONAL MATCH zincirinde randevu ×
+        not × ilaç × hastalık × test çarpımı oluşuyordu).
+        """
         with self.driver.session() as session:
             query = """
             MATCH (u:User {id: $user_id})
-            OPTIONAL MATCH (u)-[:HAS_APPOINTMENT]->(a:Appointment)-[:WITH_DOCTOR]->(d:Doctor)
-            OPTIONAL MATCH (a)-[:HAS_NOTES]->(n:AppointmentNote)
-            OPTIONAL MATCH (u)-[:TAKES_MEDICATION]->(m:Medication)
-            OPTIONAL MATCH (u)-[:HAS_CONDITION]->(c:Condition)
-            OPTIONAL MATCH (c)-[:TREATED_WITH]->(m2:Medication)
-            OPTIONAL MATCH (u)-[:HAS_TEST_RESULT]->(t:TestResult)
-            RETURN u, 
-                   collect(DISTINCT a) as appointments,
-                   collect(DISTINCT d) as doctors,
-                   collect(DISTINCT n) as notes,
-                   collect(DISTINCT m) as medications,
-                   collect(DISTINCT c) as conditions,
-                   collect(DISTINCT t) as test_results
+            CALL {
+                WITH u
+                MATCH (u)-[:HAS_APPOINTMENT]->(a:Appointment)
+                RETURN collect(a) AS appointments
+            }
+            CALL {
+                WITH u
+                MATCH (u)-[:HAS_APPOINTMENT]->(:Appointment)-[:WITH_DOCTOR]->(d:Doctor)
+                RETURN collect(DISTINCT d) AS doctors
+            }
+            CALL {
+                WITH u
+                MATCH (u)-[:HAS_APPOINTMENT]->(:Appointment)-[:HAS_NOTES]->(n:AppointmentNote)
+                RETURN collect(n) AS notes
+            }
+            CALL {
+                WITH u
+                MATCH (u)-[:TAKES_MEDICATION]->(m:Medication)
+                RETURN collect(m) AS medications
+            }
+            CALL {
+                WITH u
+                MATCH (u)-[:HAS_CONDITION]->(c:Condition)
+                RETURN collect(c) AS conditions
+            }
+            CALL {
+                WITH u
+                MATCH (u)-[:HAS_TEST_RESULT]->(t:TestResult)
+                RETURN collect(t) AS test_results
+            }
+            RETURN u, appointments, doctors, notes, medications, conditions, test_results
             """
-            result = session.run(query, user_id=user_id)
+            result = session.run(self._read_query(query), user_id=user_id)
             return result.single()
     
+    # Export: tür başına tek sorgu, her satır bir düğüm + id'leriyle komşuları
+    _EXPORT_QUERIES = (
+        ('user', """
+            MATCH (u:User {id: $user_id})
+            RETURN properties(u) AS data
+        """),
+        ('appointment', """
+            MATCH (:User {id: $user_id})-[:HAS_APPOINTMENT]->(a:Appointment)
+            RETURN a {
+                .*,
+                doctor_ids: [(a)-[:WITH_DOCTOR]->(d:Doctor) | d.id],
+                note_ids: [(a)-[:HAS_NOTES]->(n:AppointmentNote) | n.id],
+                test_result_ids: [(a)-[:ORDERED_TEST]->(t:TestResult) | t.id]
+            } AS data
+            ORDER BY a.date, a.time
+        """),
+        ('doctor', """
+            MATCH (:User {id: $user_id})-[:HAS_APPOINTMENT]->(:Appointment)-[:WITH_DOCTOR]->(d:Doctor)
+            RETURN DISTINCT properties(d) AS data
+        """),
+        ('appointment_note', """
+            MATCH (:User {id: $user_id})-[:HAS_APPOINTMENT]->(a:Appointment)-[:HAS_NOTES]->(n:AppointmentNote)
+            RETURN n {.*, appointment_id: a.id} AS data
+        """),
+        ('medication', """
+            MATCH (:User {id: $user_id})-[:TAKES_MEDICATION]->(m:Medication)
+            RETURN properties(m) AS data
+            ORDER BY m.name
+        """),
+        ('condition', """
+            MATCH (:User {id: $user_id})-[:HAS_CONDITION]->(c:Condition)
+            RETURN c {.*, treated_with: [(c)-[:TREATED_WITH]->(m:Medication) | m.id]} AS data
+            ORDER BY c.name
+        """),
+        ('test_result', """
+            MATCH (:User {id: $user_id})-[:HAS_TEST_RESULT]->(t:TestResult)
+            RETURN properties(t) AS data
+            ORDER BY t.test_date DESC
+        """)
+    )
+    
+    def export_user_graph(self, user_id: str, fetch_size: int = 1000):
+        """
+        Kullanıcının tüm graph'ını akış olarak dışa aktar (bulk job'lar için)
+        
+        Sonuçlar driver'dan fetch_size'lık parçalarla çekilir; profil ne kadar
+        büyük olursa olsun bellekte tek parça tutulmaz.
+        
+        Yields:
+            (tür, dict) - tür: user, appointment, doctor, appointment_note,
+            medication, condition, test_result. İlişkiler id listeleriyle verilir
+            (doctor_ids, note_ids, test_result_ids, appointment_id, treated_with).
+        """
+        with self.driver.session(fetch_size=fetch_size) as session:
+            for kind, query in self._EXPORT_QUERIES:
+                for record in session.run(query, user_id=user_id):
+                    yield kind, dict(record["data"])
+    
     # ==================== UTILITY ====================
     
     def clear_all_data(self):
@@ -428,4 +733,10 @@ class Neo4jClient:
         with self.driver.session() as session:
             session.run("MATCH (n) DETACH DELETE n")
             print("⚠️ Tüm Neo4j verisi silindi")
+        
+        # Silme sırasında süren okumalar eski veriyi cache'e yazmasın diye versiyonlar da artar
+        with self._cache_lock:
+            for user_id in self._user_versions:
+                self._user_versions[user_id] += 1
+        self._read_cache.clear()
 
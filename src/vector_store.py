@@ -3,60 +3,577 @@ FAISS vector store modülü
 """
 import faiss
 import numpy as np
-import pickle
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Optional
+import math
 import os
+from src.document_store import DocumentStore, atomic_write
+
+# Desteklenen index tipleri
+# - flat:     brute-force (exact), küçük corpus için
+# - ivf_flat: inverted file + exact vektörler (nprobe ile recall/latency ayarı)
+# - ivf_pq:   inverted file + product quantization (en az RAM)
+# - hnsw:     graph tabanlı ANN (efSearch ile recall/latency ayarı)
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+
+# Vektör saklama formatı (flat / ivf_flat / hnsw için; ivf_pq zaten PQ kullanır)
+# - float: float32 (4 byte/boyut)
+# - sq8:   8-bit scalar quantization (4x küçük)
+# - pq:    product quantization, pq_m byte/vektör (384 boyut, m=24 -> 64x küçük)
+STORAGE_TYPES = ("float", "sq8", "pq")
+
+# Bu kadar veya daha az satıra uyan filtrelerde ANN yerine alt küme üzerinde
+# exact arama yapılır (her zaman tam k sonuç, maliyet filtresiz aramadan düşük)
+EXACT_FILTER_THRESHOLD = 4096
+
+# Filtresiz aramada en fazla bu kadar tombstone varsa ID selector yerine
+# k + silinmiş sayısı kadar aday çekilip silinmiş satırlar atılır
+TOMBSTONE_OVERFETCH_LIMIT = 1024
+
+# Silinmiş (tombstone) satır oranı bunu aşınca index compaction ile yeniden kurulur
+COMPACT_DELETED_RATIO = 0.25
+
 
 class VectorStore:
     """FAISS ile vektör veritabanı yönetimi"""
-    
-    def __init__(self, dimension: int, use_cosine: bool = True):
+
+    def __init__(
+        self,
+        dimension: int,
+        use_cosine: bool = True,
+        index_type: str = "flat",
+        nlist: Optional[int] = None,
+        nprobe: int = 8,
+        pq_m: int = 16,
+        pq_nbits: int = 8,
+        hnsw_m: int = 32,
+        ef_construction: int = 200,
+        ef_search: int = 64,
+        storage: str = "float",
+        rerank_factor: int = 0
+    ):
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Bilinmeyen index tipi: {index_type} (seçenekler: {', '.join(INDEX_TYPES)})")
+        if storage not in STORAGE_TYPES:
+            raise ValueError(f"Bilinmeyen storage tipi: {storage} (seçenekler: {', '.join(STORAGE_TYPES)})")
+
         self.dimension = dimension
         self.use_cosine = use_cosine
-        
-        if use_cosine:
-            # Cosine similarity için Inner Product kullan
-            # Yüksek değer = daha benzer (1'e yakın = çok benzer)
-            self.index = faiss.IndexFlatIP(dimension)
+        self.index_type = index_type
+
+        # IVF parametreleri (nlist=None ise eğitimde corpus boyutuna göre seçilir)
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.pq_m = pq_m
+        self.pq_nbits = pq_nbits
+
+        # HNSW parametreleri
+        self.hnsw_m = hnsw_m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+
+        # Sıkıştırılmış saklama + orijinal vektörlerle exact re-ranking
+        # rerank_factor > 0 ise k * rerank_factor aday çekilir ve diskteki
+        # float32 vektörlerle yeniden skorlanır
+        self.storage = storage
+        self.rerank_factor = rerank_factor
+        self.vectors = None
+
+        # Cosine similarity için Inner Product kullan
+        # Yüksek değer = daha benzer (1'e yakın = çok benzer)
+        # L2 distance: Düşük değer = daha benzer (0'a yakın = çok benzer)
+        self.metric = faiss.METRIC_INNER_PRODUCT if use_cosine else faiss.METRIC_L2
+
+        self.index = self._create_index()
+        self.documents = DocumentStore.from_documents([])
+
+        # load(mmap=True) sonrası index read-only; ilk değişiklikte belleğe alınır
+        self._mmap_index_path = None
+
+        # Her değişiklikte artar; sorgu/sonuç cache'leri bununla geçersiz kılınır
+        self.version = 0
+
+    # ==================== INDEX CONSTRUCTION ====================
+
+    @property
+    def vectors(self) -> Optional[np.ndarray]:
+        """
+        Re-ranking için orijinal float32 vektörler (sıkıştırılmış index'lerde)
+
+        add_documents parçaları listeye ekler; ilk okumada (arama / save)
+        tek seferde birleştirilir, böylece chunk chunk build'de her ekleme
+        tüm matrisi kopyalamaz.
+        """
+        if self._pending_vectors:
+            parts = [] if self._vectors is None else [np.asarray(self._vectors)]
+            self._vectors = np.concatenate(parts + self._pending_vectors)
+            self._pending_vectors = []
+        return self._vectors
+
+    @vectors.setter
+    def vectors(self, value: Optional[np.ndarray]):
+        self._vectors = value
+        self._pending_vectors = []
+
+    @property
+    def is_compressed(self) -> bool:
+        """Index vektörleri kayıplı (quantized) mı saklıyor?"""
+        return self.index_type == "ivf_pq" or self.storage != "float"
+
+    def _factory_string(self) -> str:
+        """Index tipini FAISS index_factory spec'ine çevirir"""
+        codec = {
+            "float": "Flat",
+            "sq8": "SQ8",
+            "pq": f"PQ{self.pq_m}x{self.pq_nbits}"
+        }[self.storage]
+
+        if self.index_type == "flat":
+            return codec
+        if self.index_type == "hnsw":
+            # HNSW graph + sıkıştırılmış vektörler (HNSW32_SQ8, HNSW32_PQ16)
+            if self.storage == "float":
+                return f"HNSW{self.hnsw_m}"
+            if self.storage == "sq8":
+                return f"HNSW{self.hnsw_m}_SQ8"
+            return f"HNSW{self.hnsw_m}_PQ{self.pq_m}"
+
+        nlist = self.nlist or 1
+        if self.index_type == "ivf_flat":
+            return f"IVF{nlist},{codec}"
+        return f"IVF{nlist},PQ{self.pq_m}x{self.pq_nbits}"
+
+    def _create_index(self) -> faiss.Index:
+        """Boş index oluşturur"""
+        index = faiss.index_factory(self.dimension, self._factory_string(), self.metric)
+
+        if self.index_type == "hnsw":
+            index.hnsw.efConstruction = self.ef_construction
+
+        self._apply_search_params(index)
+        return index
+
+    def _apply_search_params(self, index: faiss.Index):
+        """Kalıcı nprobe / efSearch değerlerini index'e uygular"""
+        if self.index_type in ("ivf_flat", "ivf_pq"):
+            faiss.extract_index_ivf(index).nprobe = self.nprobe
+        elif self.index_type == "hnsw":
+            index.hnsw.efSearch = self.ef_search
+
+    @staticmethod
+    def _default_nlist(n_vectors: int) -> int:
+        """Corpus boyutuna göre IVF liste sayısı (~4*sqrt(N), her listede >= 39 vektör)"""
+        nlist = int(4 * math.sqrt(n_vectors))
+        return max(1, min(nlist, n_vectors // 39))
+
+    def reserve(self, n_vectors: int):
+        """
+        Beklenen toplam boyutu bildirir (chunk chunk eklenecek büyük build'ler için)
+
+        IVF liste sayısı ilk chunk'a göre değil toplam corpus'a göre seçilir.
+        """
+        if self.index_type in ("ivf_flat", "ivf_pq") and self.nlist is None and self.index.ntotal == 0:
+            self.nlist = self._default_nlist(n_vectors)
+            self.index = self._create_index()
+
+    def training_sample_size(self) -> int:
+        """Eğitim için kullanılacak maksimum örnek sayısı"""
+        return max(self.nlist or 0, 2 ** self.pq_nbits) * 256
+
+    @property
+    def uses_pq(self) -> bool:
+        """Index product quantization kullanıyor mu? (PQ codebook eğitimi gerekir)"""
+        return self.index_type == "ivf_pq" or self.storage == "pq"
+
+    def _fallback_from_pq(self, n_vectors: int):
+        """
+        PQ codebook'u için yetersiz örnek varsa SQ8'e düşer
+
+        Her alt-quantizer 2^pq_nbits centroid'li k-means ile eğitilir; daha az
+        vektörle FAISS eğitimi hata verir. ivf_pq -> ivf_flat + SQ8, pq -> sq8
+        (hâlâ sıkıştırılmış, re-ranking için orijinal vektörler saklanır).
+        Yeni tip metadata ile kaydedilir; load() aynı tipi yükler.
+        """
+        min_samples = 2 ** self.pq_nbits
+        if not self.uses_pq or n_vectors >= min_samples:
+            return
+
+        old_spec = self._factory_string()
+        if self.index_type == "ivf_pq":
+            self.index_type = "ivf_flat"
+        self.storage = "sq8"
+        self.index = self._create_index()
+        print(f"⚠️ PQ eğitimi için en az {min_samples} vektör gerekli ({n_vectors} var): "
+              f"{old_spec} yerine {self._factory_string()} kullanılıyor")
+
+    def _train(self, embeddings: np.ndarray):
+        """IVF / PQ index'lerini eğitir (flat ve HNSW eğitim gerektirmez)"""
+        if self.index.is_trained:
+            return
+
+        if self.nlist is None and self.index_type in ("ivf_flat", "ivf_pq"):
+            self.nlist = self._default_nlist(len(embeddings))
+            self.index = self._create_index()
+
+        self._fallback_from_pq(len(embeddings))
+        if self.index.is_trained:
+            return
+
+        # k-means için her centroid başına 256 örnek yeterli (PQ/SQ için de bol)
+        max_samples = self.training_sample_size()
+        if len(embeddings) > max_samples:
+            rng = np.random.default_rng(0)
+            sample = embeddings[rng.choice(len(embeddings), max_samples, replace=False)]
         else:
-            # L2 distance kullan
-            # Düşük değer = daha benzer (0'a yakın = çok benzer)
-            self.index = faiss.IndexFlatL2(dimension)
-        
-        self.documents = []
-        
-    def add_documents(self, embeddings: np.ndarray, documents: List[Dict]):
-        """Dokümanları ve embedding'lerini ekler"""
+            sample = embeddings
+
+        print(f"{self._factory_string()} index eğitiliyor ({len(sample)} örnek)...")
+        self.index.train(sample)
+        print("✓ Index eğitildi")
+
+    def _search_params(
+        self,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        selector=None
+    ):
+        """Çağrı bazında recall/latency ayarı ve ID filtresi için FAISS SearchParameters"""
+        if selector is None:
+            if nprobe is not None and self.index_type in ("ivf_flat", "ivf_pq"):
+                return faiss.SearchParametersIVF(nprobe=nprobe)
+            if ef_search is not None and self.index_type == "hnsw":
+                return faiss.SearchParametersHNSW(efSearch=ef_search)
+            return None
+
+        # Selector verildiğinde parametre objesi index'in kayıtlı değerlerini ezer,
+        # bu yüzden nprobe / efSearch her zaman açıkça set edilir
+        if self.index_type in ("ivf_flat", "ivf_pq"):
+            return faiss.SearchParametersIVF(sel=selector, nprobe=nprobe or self.nprobe)
+        if self.index_type == "hnsw":
+            return faiss.SearchParametersHNSW(sel=selector, efSearch=ef_search or self.ef_search)
+        return faiss.SearchParameters(sel=selector)
+
+    # ==================== DOCUMENTS & SEARCH ====================
+
+    def _validate_ids(self, documents: List[Dict], allow_existing: bool = False):
+        """
+        Verilen 'id'lerin batch içinde tekil (ve allow_existing=False ise index'te yeni) olduğunu doğrular
+
+        Aynı ID'li iki canlı satır rows_for_ids / get_document / delete_documents'ı
+        belirsiz bırakır.
+        """
+        ids = np.asarray([doc['id'] for doc in documents if doc.get('id') is not None], dtype='int64')
+        if len(ids) == 0:
+            return
+
+        unique, counts = np.unique(ids, return_counts=True)
+        if len(unique) != len(ids):
+            raise ValueError(f"Aynı 'id' birden fazla dokümanda: {unique[counts > 1][:10].tolist()}")
+
+        if not allow_existing:
+            existing = ids[self.documents.contains_ids(ids)]
+            if len(existing):
+                raise ValueError(
+                    f"Bu ID'ler index'te zaten var: {existing[:10].tolist()} "
+                    f"(güncelleme için upsert_documents kullanın)"
+                )
+
+    def add_documents(self, embeddings: np.ndarray, documents: List[Dict]) -> List[int]:
+        """
+        Dokümanları ve embedding'lerini mevcut dokümanların sonuna ekler
+
+        Dokümanlar stabil 'id' alanı ile saklanır (DataProcessor satır ID'si);
+        'id' olmayan dokümanlara yeni ID atanır. Index'te zaten olan veya
+        batch içinde tekrar eden ID'ler ValueError ile reddedilir.
+
+        Returns:
+            Eklenen dokümanların ID'leri
+        """
+        self._validate_ids(documents)
         print(f"Vector store'a {len(documents)} doküman ekleniyor...")
-        
-        embeddings_float = embeddings.astype('float32')
-        
+
         # Cosine similarity için embeddings'leri normalize et
-        if self.use_cosine:
-            # L2 normalization (her vektörün uzunluğu 1 olacak)
-            norms = np.linalg.norm(embeddings_float, axis=1, keepdims=True)
-            embeddings_float = embeddings_float / norms
-        
+        # (L2 normalization, her vektörün uzunluğu 1 olacak)
+        embeddings_float = self._normalize_queries(embeddings)
+
+        self._ensure_writable()
+        self._train(embeddings_float)
+
+        next_id = self.documents.next_id()
+        prepared = []
+        for doc in documents:
+            doc = dict(doc)
+            if doc.get('id') is None:
+                doc['id'] = next_id
+                next_id += 1
+            prepared.append(doc)
+
+        n_before = self.index.ntotal
         self.index.add(embeddings_float)
+
+        # Columnar depo: string arena + offset, kategorik source/focus_area
+        # FAISS pozisyonu == depo satırı
+        self.documents.append(prepared)
+
+        # Sıkıştırılmış index'te orijinal vektörleri re-ranking için sakla
+        # (save() sonrası diskten memory-map edilir)
+        if self.is_compressed:
+            if n_before == 0:
+                self.vectors = embeddings_float
+            elif self._vectors is not None:
+                self._pending_vectors.append(embeddings_float)
+
+        self.version += 1
+        print(f"✓ Toplam {self.documents.num_alive} doküman ({self.index.ntotal} index satırı)")
+        return [doc['id'] for doc in prepared]
+
+    def delete_documents(self, doc_ids: List[int]) -> int:
+        """
+        Dokümanları stabil ID ile siler (tombstone)
+
+        Silinen satırlar aramalarda ID selector ile (az sayıdaysa fazladan aday
+        çekilip) dışlanır; oran
+        COMPACT_DELETED_RATIO'yu aşınca index compaction ile yeniden kurulur.
+
+        Returns:
+            Silinen doküman sayısı
+        """
+        rows = self.documents.rows_for_ids(doc_ids)
+        rows = rows[rows >= 0]
+        self.documents.delete_rows(rows)
+        if len(rows):
+            self.version += 1
+            print(f"✓ {len(rows)} doküman silindi")
+        self.maybe_compact()
+        return len(rows)
+
+    def upsert_documents(self, embeddings: np.ndarray, documents: List[Dict]) -> List[int]:
+        """
+        Aynı ID'li dokümanı günceller, yoksa ekler
+
+        Eski satır tombstone'lanır, yeni sürüm sona eklenir; ID değişmez.
+        """
+        self._validate_ids(documents, allow_existing=True)
+        existing = [doc['id'] for doc in documents if doc.get('id') is not None]
+        rows = self.documents.rows_for_ids(existing)
+        self.documents.delete_rows(rows[rows >= 0])
+
+        ids = self.add_documents(embeddings, documents)
+        self.maybe_compact()
+        return ids
+
+    def get_document(self, doc_id: int) -> Optional[Dict]:
+        """Stabil ID ile doküman getirir"""
+        row = int(self.documents.rows_for_ids([doc_id])[0])
+        return self.documents[row] if row >= 0 else None
+
+    def maybe_compact(self, max_deleted_ratio: float = COMPACT_DELETED_RATIO) -> bool:
+        """Tombstone oranı eşiği aşarsa compaction yapar"""
+        total = self.documents.num_docs
+        if total == 0 or (total - self.documents.num_alive) / float(total) <= max_deleted_ratio:
+            return False
+        self.compact()
+        return True
+
+    def compact(self):
+        """
+        Silinmiş satırları fiziksel olarak atar ve index'i canlı vektörlerle yeniden kurar
+
+        Embedding yeniden hesaplanmaz: vektörler orijinal vektör dosyasından
+        (sıkıştırılmış index) veya index'in kendisinden reconstruct edilir.
+        IVF/PQ index'ler canlı vektörlerle yeniden eğitilir.
+        """
+        alive = np.flatnonzero(~self.documents.deleted)
+        if len(alive) == self.documents.num_docs:
+            return
+
+        print(f"Index compaction: {self.documents.num_docs - len(alive)} silinmiş satır atılıyor...")
+        vectors = self._subset_vectors(alive)
+        documents = self.documents.take(alive)
+
+        self.index = self._create_index()
+        self._mmap_index_path = None
+        if len(vectors):
+            self._train(vectors)
+            self.index.add(vectors)
+
         self.documents = documents
-        print(f"✓ Toplam {self.index.ntotal} doküman eklendi")
-        
-    def search(self, query_embedding: np.ndarray, k: int = 3) -> List[Dict]:
-        """En benzer K dokümanı bulur"""
-        query_embedding = query_embedding.astype('float32').reshape(1, -1)
-        
-        # Cosine similarity için query'yi de normalize et
+        if self.is_compressed:
+            self.vectors = vectors
+        self.version += 1
+        print(f"✓ Compaction tamamlandı ({self.index.ntotal} doküman)")
+
+    def _ensure_writable(self):
+        """Memory-map ile açılmış (read-only) index'i değişiklik öncesi belleğe alır"""
+        if self._mmap_index_path is not None:
+            self.index = faiss.read_index(self._mmap_index_path)
+            self._apply_search_params(self.index)
+            self._mmap_index_path = None
+
+    def _search_matrix(
+        self,
+        queries: np.ndarray,
+        k: int,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        rerank_factor: Optional[int] = None,
+        filters: Optional[Dict] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Normalize edilmiş sorgu matrisi için FAISS araması (+ opsiyonel filtre ve exact re-ranking)"""
+        if rerank_factor is None:
+            rerank_factor = self.rerank_factor
+        rerank = rerank_factor > 0 and self.vectors is not None
+        k_fetch = k * rerank_factor if rerank else k
+
+        # Filtre maskesi + tombstone'lar tek bitmap'te birleşir. Filtre yoksa ve
+        # az sayıda tombstone varsa bitmap kurulmaz: fazladan aday çekilip silinmişler atılır
+        mask = self.documents.filter_mask(filters) if filters else None
+        alive = self.documents.alive_mask
+        n_deleted = 0 if alive is None else self.documents.num_docs - self.documents.num_alive
+        overfetch = mask is None and 0 < n_deleted <= TOMBSTONE_OVERFETCH_LIMIT
+        if alive is not None and not overfetch:
+            mask = alive if mask is None else (mask & alive)
+
+        selector = None
+        if mask is not None:
+            n_selected = int(mask.sum())
+            if n_selected == 0:
+                return self._empty_result(len(queries), k)
+            # Flat SQ8/PQ index'leri (IndexScalarQuantizer / IndexPQ) ID selector'ı
+            # desteklemez; flat zaten brute-force olduğu için alt kümede exact arama yapılır
+            if n_selected <= EXACT_FILTER_THRESHOLD or (self.index_type == "flat" and self.storage != "float"):
+                return self._exact_subset_search(queries, np.flatnonzero(mask), k)
+
+            # Seçici filtrelerde IVF/HNSW aday havuzunu seçicilik oranında büyüt,
+            # böylece filtreli sorgu da k sonuçla döner ve taranan eşleşen vektör
+            # sayısı filtresiz aramayla aynı kalır
+            selectivity = n_selected / float(len(mask))
+            if self.index_type in ("ivf_flat", "ivf_pq"):
+                base = nprobe or self.nprobe
+                nprobe = min(self.nlist or base, int(math.ceil(base / selectivity)))
+            elif self.index_type == "hnsw":
+                base = ef_search or self.ef_search
+                ef_search = max(k_fetch, min(4096, int(math.ceil(base / selectivity))))
+
+            # Bitmap selector: bit i = satır i filtreye uyuyor (little-endian)
+            bitmap = np.packbits(mask, bitorder='little')
+            # İlk argüman bitmap'in byte uzunluğu
+            selector = faiss.IDSelectorBitmap(len(bitmap), faiss.swig_ptr(bitmap))
+
+        k_search = k_fetch + n_deleted if overfetch else k_fetch
+        params = self._search_params(nprobe, ef_search, selector)
+        if params is not None:
+            distances, indices = self.index.search(queries, k_search, params=params)
+        else:
+            distances, indices = self.index.search(queries, k_search)
+
+        if overfetch:
+            distances, indices = self._drop_deleted(distances, indices, alive, k_fetch)
+
+        if rerank:
+            distances, indices = self._rerank(queries, indices, k)
+        return distances, indices
+
+    def _drop_deleted(
+        self,
+        distances: np.ndarray,
+        indices: np.ndarray,
+        alive: np.ndarray,
+        k: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Fazladan çekilen adaylardan silinmiş satırları atar, sırayı bozmadan ilk k canlı sonucu tutar"""
+        keep = (indices >= 0) & alive[np.maximum(indices, 0)]
+        order = np.argsort(~keep, axis=1, kind='stable')[:, :k]
+        kept = np.take_along_axis(keep, order, axis=1)
+
+        out_distances, out_indices = self._empty_result(len(indices), k)
+        out_distances[kept] = np.take_along_axis(distances, order, axis=1)[kept]
+        out_indices[kept] = np.take_along_axis(indices, order, axis=1)[kept]
+        return out_distances, out_indices
+
+    def _subset_vectors(self, ids: np.ndarray) -> np.ndarray:
+        """Verilen satırların vektörleri (orijinal vektörler yoksa index'ten reconstruct)"""
+        if self.vectors is not None:
+            return np.asarray(self.vectors[ids], dtype='float32')
+
+        if self.index_type in ("ivf_flat", "ivf_pq"):
+            faiss.extract_index_ivf(self.index).make_direct_map()
+        return self.index.reconstruct_batch(ids)
+
+    def _exact_subset_search(self, queries: np.ndarray, ids: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Küçük bir satır kümesi üzerinde brute-force top-k"""
+        vectors = self._subset_vectors(ids)
         if self.use_cosine:
-            norm = np.linalg.norm(query_embedding)
-            query_embedding = query_embedding / norm
-        
-        distances, indices = self.index.search(query_embedding, k)
-        
+            scores = queries @ vectors.T
+            keys = -scores
+        else:
+            scores = (queries ** 2).sum(axis=1, keepdims=True) - 2 * queries @ vectors.T + (vectors ** 2).sum(axis=1)
+            keys = scores
+
+        # Tüm alt kümeyi sıralamak yerine önce top-k seçilir, sadece k aday sıralanır
+        n_top = min(k, len(ids))
+        if n_top < len(ids):
+            top = np.argpartition(keys, n_top - 1, axis=1)[:, :n_top]
+        else:
+            top = np.broadcast_to(np.arange(len(ids)), keys.shape)
+        order = np.take_along_axis(top, np.argsort(np.take_along_axis(keys, top, axis=1), axis=1), axis=1)
+
+        distances, indices = self._empty_result(len(queries), k)
+        n = order.shape[1]
+        distances[:, :n] = np.take_along_axis(scores, order, axis=1)
+        indices[:, :n] = ids[order]
+        return distances, indices
+
+    def _empty_result(self, n_queries: int, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Hiç aday yokken FAISS ile aynı formatta boş sonuç"""
+        fill = -np.inf if self.use_cosine else np.inf
+        return (
+            np.full((n_queries, k), fill, dtype='float32'),
+            np.full((n_queries, k), -1, dtype='int64')
+        )
+
+    def _rerank(self, queries: np.ndarray, candidates: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Adayları orijinal float32 vektörlerle yeniden skorlar"""
+        out_distances, out_indices = self._empty_result(len(queries), k)
+
+        for row, (query, ids) in enumerate(zip(queries, candidates)):
+            ids = ids[ids >= 0]
+            if len(ids) == 0:
+                continue
+
+            # memmap üzerinde sıralı okuma daha az sayfa dokunur
+            ids = np.sort(ids)
+            vectors = np.asarray(self.vectors[ids], dtype='float32')
+            if self.use_cosine:
+                scores = vectors @ query
+                order = np.argsort(-scores)[:k]
+            else:
+                # FAISS ile tutarlı: squared L2
+                scores = ((vectors - query) ** 2).sum(axis=1)
+                order = np.argsort(scores)[:k]
+
+            out_distances[row, :len(order)] = scores[order]
+            out_indices[row, :len(order)] = ids[order]
+
+        return out_distances, out_indices
+
+    def _normalize_queries(self, query_embeddings: np.ndarray) -> np.ndarray:
+        """Sorguları (n, d) float32 matrise çevirir, cosine için tek geçişte normalize eder"""
+        queries = np.ascontiguousarray(query_embeddings, dtype='float32').reshape(-1, self.dimension)
+
+        if self.use_cosine:
+            norms = np.linalg.norm(queries, axis=1, keepdims=True)
+            queries = queries / np.maximum(norms, 1e-12)
+        return queries
+
+    def _to_results(self, distances: np.ndarray, indices: np.ndarray) -> List[Dict]:
+        """Tek sorgunun FAISS çıktısını doküman listesine çevirir"""
         results = []
-        for idx, distance in zip(indices[0], distances[0]):
-            if idx < len(self.documents):
-                doc = self.documents[idx].copy()
-                
+        for idx, distance in zip(indices, distances):
+            # ANN index'ler yeterli aday bulamazsa -1 döner
+            if 0 <= idx < len(self.documents):
+                # Hafif row view: alanlar sadece okunduğunda decode edilir
+                doc = self.documents[idx]
+
                 if self.use_cosine:
                     # Cosine similarity: 1 = aynı, 0 = farklı, -1 = tam zıt
                     # Clip to [-1, 1] range (numerical precision hatalarını düzelt)
@@ -65,43 +582,207 @@ class VectorStore:
                 else:
                     # L2 distance: 0 = aynı, yüksek = farklı
                     doc['similarity_score'] = float(distance)
-                
+
                 results.append(doc)
-        
+
         return results
-    
-    def save(self, index_path: str = "faiss_index.bin", docs_path: str = "documents.pkl"):
-        """Index ve dokümanları kaydeder"""
-        print("Vector store kaydediliyor...")
-        faiss.write_index(self.index, index_path)
-        
-        # Metadata da kaydet (hangi similarity kullanıldığını sakla)
-        metadata = {
+
+    def search(
+        self,
+        query_embedding: np.ndarray,
+        k: int = 3,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        rerank_factor: Optional[int] = None,
+        filters: Optional[Dict] = None
+    ) -> List[Dict]:
+        """
+        En benzer K dokümanı bulur
+
+        Args:
+            query_embedding: Sorgu vektörü
+            k: Döndürülecek doküman sayısı
+            nprobe: IVF index'lerde taranacak liste sayısı (None = kayıtlı değer)
+            ef_search: HNSW arama genişliği (None = kayıtlı değer)
+            rerank_factor: Sıkıştırılmış index'te exact re-ranking için aday çarpanı
+                (None = kayıtlı değer, 0 = re-ranking yok)
+            filters: Metadata filtresi, örn. {'focus_area': ['Hypertension'], 'source': 'NIHSeniorHealth'}
+                (alan içinde OR, alanlar arasında AND; source ve focus_area desteklenir)
+
+        Yüksek nprobe / ef_search = daha yüksek recall, daha yavaş arama.
+        """
+        return self.search_batch(query_embedding, k, nprobe, ef_search, rerank_factor, filters)[0]
+
+    def search_batch(
+        self,
+        query_embeddings: np.ndarray,
+        k: int = 3,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        rerank_factor: Optional[int] = None,
+        filters: Optional[Dict] = None
+    ) -> List[List[Dict]]:
+        """
+        Birden fazla sorgu için tek FAISS çağrısıyla arama yapar
+
+        Args:
+            query_embeddings: (n, d) sorgu matrisi
+            k, nprobe, ef_search, rerank_factor, filters: search() ile aynı
+
+        Returns:
+            Her sorgu için sıralı doküman listesi (girdi sırasıyla)
+        """
+        queries = self._normalize_queries(query_embeddings)
+        if len(queries) == 0:
+            return []
+
+        distances, indices = self._search_matrix(queries, k, nprobe, ef_search, rerank_factor, filters)
+        return [self._to_results(d, i) for d, i in zip(distances, indices)]
+
+    def measure_recall(self, query_embeddings: np.ndarray, k: int = 10, **search_kwargs) -> Dict:
+        """
+        Index'in top-k kalitesini flat (exact) baseline ile karşılaştırır
+
+        Ground truth, orijinal float32 vektörler üzerinde brute-force ile hesaplanır.
+        search_kwargs: nprobe, ef_search, rerank_factor
+
+        Returns:
+            recall_at_k, index_bytes, float_bytes, compression
+        """
+        if self.vectors is None:
+            raise ValueError("Recall ölçümü için orijinal vektörler gerekli (sıkıştırılmış index ile kaydedin)")
+
+        queries = self._normalize_queries(query_embeddings)
+
+        _, truth = faiss.knn(queries, np.asarray(self.vectors, dtype='float32'), k, metric=self.metric)
+        _, found = self._search_matrix(queries, k, **search_kwargs)
+
+        hits = sum(len(set(t[t >= 0]) & set(f[f >= 0])) for t, f in zip(truth, found))
+        index_bytes = len(faiss.serialize_index(self.index))
+        float_bytes = self.index.ntotal * self.dimension * 4
+
+        return {
+            'recall_at_k': hits / float(len(queries) * k),
+            'index_bytes': index_bytes,
+            'float_bytes': float_bytes,
+            'compression': float_bytes / max(index_bytes, 1)
+        }
+
+    # ==================== PERSISTENCE ====================
+
+    def _metadata(self) -> Dict:
+        """Index'i yeniden kurmak için gereken ayarlar"""
+        return {
             'use_cosine': self.use_cosine,
-            'dimension': self.dimension
+            'dimension': self.dimension,
+            'index_type': self.index_type,
+            'nlist': self.nlist,
+            'nprobe': self.nprobe,
+            'pq_m': self.pq_m,
+            'pq_nbits': self.pq_nbits,
+            'hnsw_m': self.hnsw_m,
+            'ef_construction': self.ef_construction,
+            'ef_search': self.ef_search,
+            'storage': self.storage,
+            'rerank_factor': self.rerank_factor
         }
-        
-        with open(docs_path, 'wb') as f:
-            pickle.dump({'documents': self.documents, 'metadata': metadata}, f)
-        print(f"✓ Index kaydedildi: {index_path}")
-        
-    def load(self, index_path: str = "faiss_index.bin", docs_path: str = "documents.pkl"):
-        """Kaydedilmiş index'i yükler"""
-        if os.path.exists(index_path) and os.path.exists(docs_path):
-            print("Kaydedilmiş index yükleniyor...")
-            
-            with open(docs_path, 'rb') as f:
-                data = pickle.load(f)
-            
-            # Yeni format (metadata ile)
-            if isinstance(data, dict) and 'documents' in data:
-                self.documents = data['documents']
-            else:
-                # Eski format - direkt liste
-                self.documents = data
-            
-            self.index = faiss.read_index(index_path)
-            print(f"✓ {len(self.documents)} doküman yüklendi")
-            return True
-        return False
 
+    @property
+    def config(self) -> Dict:
+        """Index tipi ve parametreleri (manifest / debug için)"""
+        return self._metadata()
+
+    def _restore_metadata(self, metadata: Dict):
+        """Kaydedilmiş ayarları geri yükler (eski kayıtlarda sadece flat vardı)"""
+        self.use_cosine = metadata.get('use_cosine', self.use_cosine)
+        self.metric = faiss.METRIC_INNER_PRODUCT if self.use_cosine else faiss.METRIC_L2
+        self.index_type = metadata.get('index_type', 'flat')
+        self.storage = metadata.get('storage', 'float')
+        for key in ('nlist', 'nprobe', 'pq_m', 'pq_nbits', 'hnsw_m', 'ef_construction', 'ef_search', 'rerank_factor'):
+            if key in metadata:
+                setattr(self, key, metadata[key])
+
+    @staticmethod
+    def _read_index(index_path: str, mmap: bool) -> faiss.Index:
+        """
+        Index'i okur; mmap=True ise dosya memory-map edilir (kopyasız, read-only)
+
+        IVF inverted list'leri IO_FLAG_MMAP ile, flat kodlar (FAISS >= 1.8)
+        IO_FLAG_MMAP_IFC ile diskten doğrudan okunur. Desteklemeyen index
+        tiplerinde normal okumaya düşülür.
+        """
+        if mmap:
+            flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+            flags |= getattr(faiss, 'IO_FLAG_MMAP_IFC', 0)
+            try:
+                return faiss.read_index(index_path, flags)
+            except RuntimeError:
+                pass
+        return faiss.read_index(index_path)
+
+    def save(
+        self,
+        index_path: str = "faiss_index.bin",
+        store_path: str = "document_store",
+        vectors_path: str = "embeddings.npy"
+    ):
+        """Index ve dokümanları kaydeder"""
+        print("Vector store kaydediliyor...")
+
+        # Dosyalar geçici isimle yazılıp yerine taşınır: memory-map ile açık
+        # eski dosyalar (bu veya diğer worker'larda) bozulmaz
+        faiss.write_index(self.index, f"{index_path}.tmp")
+        os.replace(f"{index_path}.tmp", index_path)
+
+        # Sıkıştırılmış index: orijinal vektörler diske, RAM'den çıkar
+        if self.is_compressed and self.vectors is not None:
+            vectors = np.asarray(self.vectors, dtype='float32')
+            atomic_write(vectors_path, lambda f: np.save(f, vectors))
+            self.vectors = np.load(vectors_path, mmap_mode='r')
+
+        # Dokümanlar columnar formatta, metadata ile birlikte (similarity ve index tipi/parametreleri)
+        self.documents.metadata = self._metadata()
+        self.documents.save(store_path)
+        print(f"✓ Index kaydedildi: {index_path} ({self.index_type})")
+
+    def load(
+        self,
+        index_path: str = "faiss_index.bin",
+        store_path: str = "document_store",
+        vectors_path: str = "embeddings.npy",
+        docs_path: str = "documents.pkl",
+        mmap: bool = True
+    ):
+        """
+        Kaydedilmiş index'i yükler
+
+        Columnar depo (store_path) varsa memory-map ile açılır; yoksa eski
+        pickle formatı (docs_path) bir kez columnar formata taşınır.
+        """
+        if not os.path.exists(index_path):
+            return False
+
+        if DocumentStore.exists(store_path):
+            print("Kaydedilmiş index yükleniyor (memory-mapped)...")
+            self.documents = DocumentStore.open(store_path, mmap=mmap)
+            self._restore_metadata(self.documents.metadata)
+
+        elif os.path.exists(docs_path):
+            print("Eski pickle formatı bulundu, columnar depoya taşınıyor...")
+            DocumentStore.migrate_pickle(docs_path, store_path)
+            self.documents = DocumentStore.open(store_path, mmap=mmap)
+            self._restore_metadata(self.documents.metadata)
+        else:
+            return False
+
+        self.index = self._read_index(index_path, mmap)
+        self.dimension = self.index.d
+        self._apply_search_params(self.index)
+        self._mmap_index_path = index_path if mmap else None
+
+        # Re-ranking vektörleri memory-map edilir (sadece okunan sayfalar RAM'e gelir)
+        if self.is_compressed and os.path.exists(vectors_path):
+            self.vectors = np.load(vectors_path, mmap_mode='r' if mmap else None)
+        self.version += 1
+        print(f"✓ {len(self.documents)} doküman yüklendi ({self.index_type})")
+        return True